@@ -1,4 +1,8 @@
+import Queue
+
+from asyncservice import AsyncService
 from service import Service
+from localfba import LocalFBA
 import objects
 
 class AbstractGrowthCondition:
@@ -24,6 +28,12 @@ class AbstractGrowthCondition:
     def evaluate(self, arguments):
         raise NotImplementedError()
 
+    def close(self):
+        """
+        releases what the condition keeps between evaluations. Its copies (see copy.copy) are closed separately
+        """
+        pass
+
 class SimpleCondition(AbstractGrowthCondition):
     """
     a growth conditon for absolute growth (objective > 0)
@@ -42,6 +52,87 @@ class SimpleCondition(AbstractGrowthCondition):
         return self.fba.objective > 0.0
 
 
+class LocalFBACondition(AbstractGrowthCondition):
+    """
+    a growth condition for absolute growth (objective > 0), solving FBA in process instead of in the FBA service
+
+    Sets self.fba to a localfba.FluxSolution rather than an FBA, and saves nothing in the service.
+
+    Required attributes of args:
+        - morph
+        - model
+    Optional attributes of args:
+        - knockouts: removal_ids of reactions to evaluate the model without, as if they were removed from it
+    """
+
+    def evaluate(self, arguments):
+        morph = arguments['morph']
+        model = arguments['model'] if 'model' in arguments else morph.model
+        knockouts = arguments['knockouts'] if 'knockouts' in arguments else None
+        self.fba = LocalFBA(model.stoichiometry(), morph.media.data, knockouts=knockouts).solve()
+        return self.fba.objective > 0.0
+
+
+class KnockoutCondition(LocalFBACondition):
+    """
+    a growth condition for absolute growth (objective > 0) that keeps one in-process LP for the morph's model and
+    tests a removal by knocking the reaction out of it, re-solving from the previous optimal basis
+
+    Rather than a candidate model, evaluate takes the removal_id of the reaction (or a list of reactions) to knock out.
+    Follow it with commit() to keep the knockouts in the LP (reactions removed) or rollback() to restore the reactions'
+    bounds (reactions kept). The LP is built from args['model'] (or morph.model) on the first evaluation, so use one
+    KnockoutCondition per model. Without reactions, evaluate solves the LP with the knockouts committed so far.
+
+    Required attributes of args:
+        - morph
+    Optional attributes of args:
+        - reaction
+        - reactions
+    """
+
+    def __init__(self, service=None):
+        LocalFBACondition.__init__(self, service=service)
+        self.lp = None
+        self._pending = []
+
+    def evaluate(self, arguments):
+        morph = arguments['morph']
+        if self.lp is None:
+            model = arguments['model'] if 'model' in arguments else morph.model
+            self.lp = LocalFBA(model.stoichiometry(), morph.media.data)
+        self.rollback()
+        reactions = arguments['reactions'] if 'reactions' in arguments else []
+        if 'reaction' in arguments:
+            reactions = [arguments['reaction']]
+        self._pending = [(r, self.lp.bounds(r)) for r in reactions if r in self.lp.column_index]
+        for reaction, _bounds in self._pending:
+            self.lp.set_bounds(reaction, 0.0, 0.0)
+        self.fba = self.lp.solve()
+        return self.fba.objective > 0.0
+
+    def commit(self):
+        """
+        keeps the last evaluated knockouts in the LP
+        """
+        self._pending = []
+
+    def knock_out(self, reaction):
+        """
+        commits a knockout to the LP without solving it (e.g. for a reaction known to carry no flux in the optimum)
+        """
+        self.rollback()
+        if reaction in self.lp.column_index:
+            self.lp.set_bounds(reaction, 0.0, 0.0)
+
+    def rollback(self):
+        """
+        restores the bounds of the last evaluated knockouts, if they weren't committed
+        """
+        for reaction, bounds in self._pending:
+            self.lp.set_bounds(reaction, bounds[0], bounds[1])
+        self._pending = []
+
+
 class BarkeriCondition(AbstractGrowthCondition):
     """
     a growth condition for barkeri (3 media)
@@ -55,24 +146,55 @@ class BarkeriCondition(AbstractGrowthCondition):
 
 
 class AllMedia(AbstractGrowthCondition):
+    """
+    a growth condition for growth (objective > 0) on every one of a list of media
 
-    def __init__(self, media):
-        AbstractGrowthCondition.__init__(self)
-        self.media = media
-
-    def evaluate(self, args):
-        morph = args['morph']
-        ws = morph.ws_id
-        for med in self.media:
-            morph = args['morph']
-            model = args['model'] if 'model' in args else morph.model
-            info = self.service.runfba(model, med, workspace=morph.ws_id)
-            fba = objects.FBA(info[0], info[1], service=self.service)
-            self.fba = fba
-            if not fba.objective > 0.0:
-                return False
-        return True
+    The FBAs for the media run at once, on an AsyncService the condition keeps between evaluations (close() stops it,
+    and a copy starts its own). The first FBA to show no growth decides, and the rest are cancelled. Sets self.fba to
+    the last FBA looked at.
 
+    Required attributes of args:
+        - morph
+        - model
+    """
 
+    def __init__(self, media, service=None):
+        AbstractGrowthCondition.__init__(self, service=service)
+        self.media = media
+        self._async_service = None
 
+    def __copy__(self):
+        copied = AllMedia(self.media, service=self.service)
+        copied.fba = self.fba
+        return copied
 
+    def evaluate(self, args):
+        morph = args['morph']
+        model = args['model'] if 'model' in args else morph.model
+        if self._async_service is None:
+            self._async_service = AsyncService(self.service, max_concurrent=max(1, len(self.media)))
+        finished = Queue.Queue()
+        futures = list()
+        try:
+            for i, med in enumerate(self.media):
+                future = self._async_service.runfba(model, med, workspace=morph.ws_id,
+                                                    name=model.name + '_fba_' + str(i))
+                future.add_done_callback(finished.put)
+                futures.append(future)
+            for _ in futures:
+                info = finished.get().result()
+                self.fba = objects.FBA(info[0], info[1], service=self.service)
+                if not self.fba.objective > 0.0:
+                    return False
+            return True
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        """
+        stops the AsyncService the FBAs run on, once the FBAs in flight finish
+        """
+        if self._async_service is not None:
+            self._async_service.close()
+            self._async_service = None
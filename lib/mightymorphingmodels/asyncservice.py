@@ -0,0 +1,255 @@
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+# Default bound on the calls an AsyncService has in flight at once
+DEFAULT_MAX_CONCURRENT = 8
+
+
+class Future(object):
+    """
+    the eventual result of an AsyncService call
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def __str__(self):
+        return 'Future: ' + ('done' if self.done() else 'pending')
+
+    def __repr__(self):
+        return str(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        waits for the call to finish and returns its result, or raises its exception
+
+        :param timeout: (optional) the most seconds to wait. Raises RuntimeError if the call hasn't finished by then
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        waits for the call to finish and returns its exception, or None if it succeeded
+        """
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info is not None else None
+
+    def add_done_callback(self, function):
+        """
+        calls function(future) when the call finishes (on the thread that finishes it), or now if it already has
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(function)
+                return
+        function(self)
+
+    def cancel(self):
+        """
+        stops waiting for the call, finishing this Future with a CancelledError if it hasn't finished. A call that
+        hasn't started yet is skipped. One already in flight (e.g. a submitted fba_tools job) runs on, but its result
+        is dropped and whatever was to follow it on the pool is skipped
+
+        :return: True if this Future was cancelled, False if it had already finished
+        """
+        if self.done():
+            return False
+        try:
+            raise CancelledError('call cancelled')
+        except CancelledError:
+            return self._finish(exc_info=sys.exc_info())
+
+    def then(self, function):
+        """
+        chains a call onto this one
+
+        :param function: function of this call's result. It may make other AsyncService calls and return their Future.
+            It runs on the thread that finishes this call, so it should do no blocking work itself
+        :return: Future for function's result (or the result of the Future it returns). Exceptions propagate
+        """
+        chained = Future()
+
+        def chain(future):
+            if future._exc_info is not None:
+                chained._finish(exc_info=future._exc_info)
+                return
+            try:
+                result = function(future._result)
+            except Exception:
+                chained._finish(exc_info=sys.exc_info())
+                return
+            if isinstance(result, Future):
+                result.add_done_callback(lambda f: chained._finish(f._result, f._exc_info))
+            else:
+                chained._finish(result)
+        self.add_done_callback(chain)
+        return chained
+
+    def _wait(self, timeout):
+        if timeout is None:
+            # a wait with no timeout can't be interrupted in python 2
+            while not self._done.wait(60):
+                pass
+        elif not self._done.wait(timeout):
+            raise RuntimeError('call did not finish within ' + str(timeout) + ' s')
+
+    def _finish(self, result=None, exc_info=None):
+        # a cancelled call may still finish later. The first finish wins
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._result = result
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for function in callbacks:
+            function(self)
+        return True
+
+
+class CancelledError(Exception):
+    """
+    raised by the result of a cancelled Future
+    """
+    pass
+
+
+class AsyncService(object):
+    """
+    the calls of a Service, returning Futures rather than blocking, so that many can be in flight at once
+
+    fba_tools jobs are submitted without waiting, and waited on by the fba client's job poller, so an outstanding job
+    holds no thread. Saves are queued with Service.save_object_later, so saves made around the same time go in one
+    save_objects call. Other workspace calls, and the workspace lookups that finish some jobs, block on HTTP, so they
+    run on a small pool of threads. At most max_concurrent calls (jobs or requests) are in flight at once; the rest wait
+    their turn.
+
+    Shares the Service's clients, cache and interned objects. Results are as the Service call would return them.
+    """
+
+    def __init__(self, service, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        """
+        :param service: the Service to make the calls with
+        :param max_concurrent: (optional) bound on the calls in flight at once
+        """
+        self.service = service
+        self.max_concurrent = max_concurrent
+        self._limit = threading.BoundedSemaphore(max_concurrent)
+        self._pool = ThreadPool(max_concurrent)
+
+    def __str__(self):
+        return 'AsyncService: ' + str(self.max_concurrent) + ' concurrent calls'
+
+    def __repr__(self):
+        return str(self)
+
+    def close(self):
+        """
+        waits for the calls in flight to finish and stops the pool. The AsyncService can't be used after
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        calls function(*args, **kwargs) (e.g. a blocking Service method) on the pool, as one of the calls in flight
+
+        :return: Future for its result
+        """
+        future = Future()
+
+        def call():
+            with self._limit:
+                return function(*args, **kwargs)
+        self._pool.apply_async(_run, (future, call))
+        return future
+
+    def get_object(self, objid, wsid, name=None, included=None):
+        return self.submit(self.service.get_object, objid, wsid, name=name, included=included)
+
+    def get_objects(self, object_tuples):
+        return self.submit(self.service.get_objects, object_tuples)
+
+    def get_info(self, wsid, objid=None, name=None):
+        return self.submit(self.service.get_info, wsid, objid=objid, name=name)
+
+    def save_object(self, data, type, wsid, objid=None, name=None):
+        return self.service.save_object_later(data, type, wsid, objid=objid, name=name)
+
+    def copy_object(self, from_tuple, to_tuple):
+        return self.submit(self.service.copy_object, from_tuple, to_tuple)
+
+    def list_objects(self, workspace_id, typestr=None):
+        return self.submit(self.service.list_objects, workspace_id, typestr=typestr)
+
+    def delete_objects(self, object_tuples):
+        return self.submit(self.service.delete_objects, object_tuples)
+
+    def remove_reactions(self, model, reactions_to_remove, output_id):
+        return self.service.remove_reactions_later(model, reactions_to_remove, output_id)
+
+    def runfba(self, model, media, workspace=None, name=None):
+        return self._job(self.service._runfba_job, model, media, workspace=workspace, name=name)
+
+    def runfva(self, model, media, workspace=None):
+        return self._job(self.service._runfva_job, model, media, workspace=workspace)
+
+    def translate_model(self, src_model, protcomp, workspace=None):
+        return self._job(self.service._translate_model_job, src_model, protcomp, workspace=workspace)
+
+    def reconstruct_genome(self, genome, workspace=None):
+        return self._job(self.service._reconstruct_genome_job, genome, workspace=workspace)
+
+    def gapfill_model(self, model, media, workspace=None):
+        return self._job(self.service._gapfill_model_job, model, media, workspace=workspace)
+
+    def _job(self, describe, *args, **kwargs):
+        # describe is a Service._*_job method. It may look up object names, so it runs on the pool, then the job is
+        # submitted and the pool thread let go. done runs on the pool too, as it may call the workspace
+        future = Future()
+
+        def start():
+            method, params, done = describe(*args, **kwargs)
+            self._limit.acquire()
+            if future.done():  # cancelled while waiting its turn
+                self._limit.release()
+                return
+            try:
+                job = self.service.fba_client.submit(method, params)
+            except Exception:
+                self._limit.release()
+                raise
+
+            def finished(job):
+                self._limit.release()
+                if job.exception() is not None:
+                    future._finish(exc_info=(type(job.exception()), job.exception(), None))
+                elif not future.done():  # cancelled, maybe with the AsyncService closed since
+                    self._pool.apply_async(_run, (future, done, (job.result(),)))
+            job.add_done_callback(finished)
+        self._pool.apply_async(_run, (future, start), {'finish': False})
+        return future
+
+
+def _run(future, function, args=(), finish=True):
+    # runs a call on the pool, handing its result or exception to its future. Skipped if the future was cancelled
+    if future.done():
+        return
+    try:
+        result = function(*args)
+    except Exception:
+        future._finish(exc_info=sys.exc_info())
+        return
+    if finish:
+        future._finish(result)
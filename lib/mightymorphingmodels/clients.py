@@ -0,0 +1,319 @@
+"""
+The workspace and fba_tools clients Service calls the services with. They are the generated clients (see
+Workspace.WorkspaceClient and fba_tools.fba_toolsClient), on a PooledClient in place of the generated base client:
+
+- a client's calls share one requests session, so connections to a service are kept alive and reused
+- a client's asynchronous jobs are all checked by one poller thread, so any number of jobs can be waited on without a
+  thread each (see FBAToolsClient.submit)
+
+The generated files are left as the type compiler writes them.
+"""
+import json
+import random
+import threading
+import time
+import traceback
+
+import requests
+from requests.exceptions import ConnectionError
+from urllib3.exceptions import ProtocolError
+
+from baseclient import BaseClient, ServerError, _JSONObjectEncoder, _CHECK_JOB_RETRYS
+from fba_tools.fba_toolsClient import fba_tools
+from Workspace.WorkspaceClient import Workspace
+
+# the number of connections a client keeps open to each host
+DEFAULT_POOL_SIZE = 10
+# a job's checks are never further apart than this fraction of the time it has run so far, so a finished job waits at
+# most that long to be noticed
+_MAX_CHECK_OVERSHOOT = 0.2
+
+
+class JobFuture(object):
+    """
+    The eventual result of an asynchronous SDK job, as returned by PooledClient.submit_job
+    """
+
+    def __init__(self, service_method, job_id):
+        self.service_method = service_method
+        self.job_id = job_id
+        self.submitted = time.time()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """
+        True if the job has finished (or failed)
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        waits for the job to finish and returns its result, or raises its error
+
+        :param timeout: (optional) the most seconds to wait. Raises RuntimeError if the job has not finished by then.
+            Default is to wait indefinitely
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        waits for the job to finish and returns its error, or None if it succeeded. timeout is as for result
+        """
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        calls fn(future) when the job finishes, from the poller thread, or immediately if it already has
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _wait(self, timeout):
+        if timeout is None:
+            # a wait with no timeout can't be interrupted in python 2
+            while not self._done.wait(60):
+                pass
+        elif not self._done.wait(timeout):
+            raise RuntimeError('job {} did not finish within {} s'.format(self.job_id, timeout))
+
+    def _finish(self, result=None, exception=None):
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                traceback.print_exc()
+
+
+class _Job(object):
+
+    def __init__(self, future, interval):
+        self.future = future
+        self.interval = interval
+        self.due = future.submitted + interval
+        self.failures = 0
+
+
+class _JobPoller(object):
+    """
+    Checks all of a client's outstanding jobs from one thread. Each tick checks the jobs that are due, then sleeps until
+    the next one is.
+
+    A job's checks back off geometrically as in BaseClient.run_job, but are never further apart than a fraction of the
+    time it has run, and tighten around the observed duration of earlier jobs of the same method.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._jobs = []
+        self._durations = dict()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def add(self, future):
+        job = _Job(future, self._client.async_job_check_time)
+        with self._condition:
+            self._schedule(job, future.submitted)
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='job poller')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._jobs) == 0:
+                    self._thread = None
+                    return
+                now = time.time()
+                due = [j for j in self._jobs if j.due <= now]
+                if len(due) == 0:
+                    self._condition.wait(min(j.due for j in self._jobs) - now)
+                    continue
+            for job in due:
+                self._check(job)
+
+    def _check(self, job):
+        future = job.future
+        mod, _ = future.service_method.split('.')
+        try:
+            job_state = self._client._check_job(mod, future.job_id)
+        except (ConnectionError, ProtocolError):
+            traceback.print_exc()
+            job.failures += 1
+            if job.failures < _CHECK_JOB_RETRYS:
+                with self._condition:
+                    self._schedule(job, time.time())
+                return
+            self._finish(job, exception=RuntimeError('_check_job failed {} times and exceeded limit'
+                                                     .format(job.failures)))
+            return
+        except Exception as e:
+            self._finish(job, exception=e)
+            return
+        if not job_state['finished']:
+            with self._condition:
+                self._schedule(job, time.time())
+            return
+        error = job_state.get('error')
+        if error:
+            self._finish(job, exception=ServerError(error.get('name', 'Unknown'), error.get('code', 0),
+                                                    error.get('message'), error.get('error')))
+            return
+        result = job_state.get('result')
+        if not result:
+            result = None
+        elif len(result) == 1:
+            result = result[0]
+        with self._condition:
+            duration = time.time() - future.submitted
+            previous = self._durations.get(future.service_method)
+            self._durations[future.service_method] = duration if previous is None else (previous + duration) / 2
+        self._finish(job, result=result)
+
+    def _finish(self, job, result=None, exception=None):
+        with self._condition:
+            self._jobs.remove(job)
+        job.future._finish(result=result, exception=exception)
+
+    def _schedule(self, job, now):
+        client = self._client
+        interval = job.interval
+        job.interval = min(job.interval * client.async_job_check_time_scale_percent / 100.0,
+                           client.async_job_check_max_time)
+        elapsed = now - job.future.submitted
+        interval = min(interval, max(client.async_job_check_time, elapsed * _MAX_CHECK_OVERSHOOT))
+        expected = self._durations.get(job.future.service_method)
+        if expected is not None and elapsed < expected:
+            # jobs of this method have taken about expected seconds. check again as this one should be finishing
+            interval = min(interval, max(client.async_job_check_time, expected - elapsed))
+        elif expected is not None and elapsed < 2 * expected:
+            # it's due. check often until it's well overdue
+            interval = min(interval, max(client.async_job_check_time, expected * _MAX_CHECK_OVERSHOOT / 4))
+        job.due = now + interval
+
+
+class PooledClient(BaseClient):
+    """
+    A BaseClient whose calls share one pooled requests session, and whose asynchronous jobs are checked by one poller
+    thread. Takes the arguments of BaseClient, and:
+
+    :param pool_size: (optional) the number of connections to keep open to each host
+    :param keep_alive: (optional) if False, close each connection after its call
+    """
+
+    def __init__(self, url=None, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, **kwargs):
+        BaseClient.__init__(self, url, **kwargs)
+        if not keep_alive:
+            self._headers['Connection'] = 'close'
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._poller = _JobPoller(self)
+
+    def _call(self, url, method, params, context=None):
+        # BaseClient._call, posting through the session
+        arg_hash = {'method': method, 'params': params, 'version': '1.1', 'id': str(random.random())[2:]}
+        if context:
+            if type(context) is not dict:
+                raise ValueError('context is not type dict as required.')
+            arg_hash['context'] = context
+        body = json.dumps(arg_hash, cls=_JSONObjectEncoder)
+        ret = self._session.post(url, data=body, headers=self._headers, timeout=self.timeout,
+                                 verify=not self.trust_all_ssl_certificates)
+        ret.encoding = 'utf-8'
+        if ret.status_code == 500:
+            if ret.headers.get('content-type') == 'application/json':
+                err = ret.json()
+                if 'error' in err:
+                    raise ServerError(**err['error'])
+                raise ServerError('Unknown', 0, ret.text)
+            raise ServerError('Unknown', 0, ret.text)
+        if not ret.ok:
+            ret.raise_for_status()
+        resp = ret.json()
+        if 'result' not in resp:
+            raise ServerError('Unknown', 0, 'An unknown server error occurred')
+        if not resp['result']:
+            return
+        if len(resp['result']) == 1:
+            return resp['result'][0]
+        return resp['result']
+
+    def submit_job(self, service_method, args, service_ver=None, context=None):
+        """
+        starts an SDK method asynchronously, without waiting for it. Arguments are as for run_job
+
+        :return: a JobFuture of the job's result
+        """
+        job_id = self._submit_job(service_method, args, service_ver, context)
+        future = JobFuture(service_method, job_id)
+        self._poller.add(future)
+        return future
+
+    def run_job(self, service_method, args, service_ver=None, context=None):
+        return self.submit_job(service_method, args, service_ver, context).result()
+
+
+class WorkspaceClient(Workspace):
+    """
+    The generated Workspace client, on a PooledClient. Takes the arguments of Workspace, and pool_size and keep_alive
+    (see PooledClient)
+    """
+
+    def __init__(self, url=None, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, **kwargs):
+        # as Workspace.__init__, with the base client replaced
+        if url is None:
+            raise ValueError('A url is required')
+        self._service_ver = None
+        self._client = PooledClient(url, pool_size=pool_size, keep_alive=keep_alive, **kwargs)
+
+
+class FBAToolsClient(fba_tools):
+    """
+    The generated fba_tools client, on a PooledClient. Takes the arguments of fba_tools, and pool_size and keep_alive
+    (see PooledClient).
+
+    Besides the generated methods, which wait for their job, submit starts a job and returns its JobFuture
+    """
+
+    def __init__(self, url=None, service_ver='release', pool_size=DEFAULT_POOL_SIZE, keep_alive=True, **kwargs):
+        # as fba_tools.__init__, with the base client replaced
+        if url is None:
+            raise ValueError('A url is required')
+        self._service_ver = service_ver
+        self._client = PooledClient(url, pool_size=pool_size, keep_alive=keep_alive, **kwargs)
+
+    def submit(self, method, params, context=None):
+        """
+        starts an fba_tools method, without waiting for it
+
+        :param method: name of the method, e.g. 'run_flux_balance_analysis'
+        :param params: the method's params
+        :return: a JobFuture of the method's result
+        """
+        return self._client.submit_job('fba_tools.' + method, [params], self._service_ver, context)
+
+    def run(self, method, params, context=None):
+        """
+        runs an fba_tools method, as submit, and waits for its result
+        """
+        return self.submit(method, params, context).result()
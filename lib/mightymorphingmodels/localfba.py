@@ -0,0 +1,214 @@
+import swiglpk as glp
+
+from stoichiometry import DEFAULT_MAX_FLUX
+
+# Default exchange bounds. These mirror the defaults fba_tools uses when formulating an FBA
+DEFAULT_MAX_UPTAKE = 100.0
+DEFAULT_MAX_EXCRETION = 100.0
+# the biomass pseudo-compound produced by biomass reactions. fba_tools drains it by default
+BIOMASS_COMPOUND = 'cpd11416'
+# prefixes for the columns added to a model's reactions to close the system
+EXCHANGE_PREFIX = 'EX_'
+DRAIN_PREFIX = 'DM_'
+
+
+class LocalFBA(object):
+    """
+    a Flux Balance Analysis linear program for an FBAModel, built and solved in process with GLPK
+
+    This is an alternative to Service.runfba for when only the objective (and perhaps the fluxes) of an FBA is needed.
+    The formulation follows the fba_tools defaults: reaction bounds are derived from reaction directions, compounds in
+    an extracellular compartment may be excreted, media compounds may be taken up, and the objective is to maximize
+    flux through the first biomass reaction of the model.
+    """
+
+    def __init__(self, stoichiometry, media_data, knockouts=None):
+        """
+        builds the linear program
+
+        :param stoichiometry: the Stoichiometry of an FBAModel (e.g. FBAModel.stoichiometry())
+        :param media_data: the data of a Media (e.g. Media.data)
+        :param knockouts: (optional) removal_ids of reactions whose flux should be fixed to zero
+        """
+        self.columns = []
+        self.column_index = dict()
+        self.objective_id = None
+        self._lp = glp.glp_create_prob()
+        glp.glp_set_obj_dir(self._lp, glp.GLP_MAX)
+        self._build(stoichiometry, media_data)
+        if knockouts is not None:
+            for rxn_id in knockouts:
+                self.set_bounds(rxn_id, 0.0, 0.0)
+
+    def __del__(self):
+        if self.__dict__.get('_lp') is not None:
+            glp.glp_delete_prob(self._lp)
+            self._lp = None
+
+    def _build(self, stoichiometry, media_data):
+        uptake = dict()
+        for cpd in media_data['mediacompounds']:
+            cpd_id = cpd['compound_ref'].split('/')[-1]
+            uptake[cpd_id] = (cpd.get('minFlux', -DEFAULT_MAX_EXCRETION), cpd.get('maxFlux', DEFAULT_MAX_UPTAKE))
+        # the model's reactions and biomasses, closed with exchanges for extracellular compounds and biomass drains
+        matrix = stoichiometry.matrix.tocoo()
+        entries = zip(matrix.row + 1, matrix.col + 1, matrix.data)
+        columns = [(r, stoichiometry.lower[j], stoichiometry.upper[j]) for j, r in enumerate(stoichiometry.reactions)]
+        for i, cpd_id in enumerate(stoichiometry.compounds):
+            if _compartment(cpd_id).startswith('e'):
+                lower, upper = uptake.get(cpd_id.split('_')[0], (-DEFAULT_MAX_EXCRETION, 0.0))
+                columns.append((EXCHANGE_PREFIX + cpd_id, lower, upper))
+                entries.append((i + 1, len(columns), 1.0))
+            elif cpd_id.split('_')[0] == BIOMASS_COMPOUND:
+                columns.append((DRAIN_PREFIX + cpd_id, 0.0, DEFAULT_MAX_FLUX))
+                entries.append((i + 1, len(columns), -1.0))
+
+        # mass balance: one row per compound, fixed at zero
+        glp.glp_add_rows(self._lp, len(stoichiometry.compounds))
+        for i in range(len(stoichiometry.compounds)):
+            glp.glp_set_row_bnds(self._lp, i + 1, glp.GLP_FX, 0.0, 0.0)
+        glp.glp_add_cols(self._lp, len(columns))
+        for j, (col_id, lower, upper) in enumerate(columns):
+            self.columns.append(col_id)
+            self.column_index[col_id] = j + 1
+            _set_col_bnds(self._lp, j + 1, lower, upper)
+        _load_matrix(self._lp, entries)
+        if len(stoichiometry.biomasses) > 0:
+            self.objective_id = stoichiometry.biomasses[0]
+            glp.glp_set_obj_coef(self._lp, self.column_index[self.objective_id], 1.0)
+
+    def bounds(self, col_id):
+        """
+        returns the (lower, upper) flux bounds of a column (e.g. a reaction removal_id)
+        """
+        j = self.column_index[col_id]
+        return glp.glp_get_col_lb(self._lp, j), glp.glp_get_col_ub(self._lp, j)
+
+    def set_bounds(self, col_id, lower, upper):
+        """
+        sets the flux bounds of a column (e.g. a reaction removal_id). Raises KeyError if the column is not in the LP
+        """
+        _set_col_bnds(self._lp, self.column_index[col_id], lower, upper)
+
+    def flux_range(self, col_id):
+        """
+        returns the (minimum, maximum) flux of a column over every steady state of the LP, regardless of the objective
+        (flux variability analysis for one column)
+        """
+        minimum = self._solve_for(col_id, glp.GLP_MIN).fluxes.get(col_id, 0.0)
+        maximum = self._solve_for(col_id, glp.GLP_MAX).fluxes.get(col_id, 0.0)
+        self._restore_objective()
+        return minimum, maximum
+
+    def blocked(self, col_ids=None):
+        """
+        returns the columns that can't carry flux in any steady state of the LP, regardless of the objective
+
+        Equivalent to flux variability analysis for each column (blocked columns have a flux range of (0, 0)), but
+        every solution also proves the columns with flux in it unblocked, so most columns need no LP of their own.
+
+        :param col_ids: (optional) the columns to check (e.g. reaction removal_ids), in order. Default is all columns
+        :return: list<str> the blocked columns of col_ids
+        """
+        if col_ids is None:
+            col_ids = self.columns
+        unproven = set(col_ids)
+        blocked = list()
+        for col_id in col_ids:
+            if col_id not in unproven:
+                continue
+            for direction in (glp.GLP_MAX, glp.GLP_MIN):
+                fluxes = self._solve_for(col_id, direction).fluxes
+                unproven.difference_update([c for c in fluxes if abs(fluxes[c]) > FluxSolution.TOLERANCE])
+                if col_id not in unproven:
+                    break
+            if col_id in unproven:
+                unproven.discard(col_id)
+                blocked.append(col_id)
+        self._restore_objective()
+        return blocked
+
+    def _solve_for(self, col_id, direction):
+        # optimizes the flux of a single column instead of the objective
+        if self.objective_id is not None:
+            glp.glp_set_obj_coef(self._lp, self.column_index[self.objective_id], 0.0)
+        glp.glp_set_obj_coef(self._lp, self.column_index[col_id], 1.0)
+        glp.glp_set_obj_dir(self._lp, direction)
+        solution = self.solve()
+        glp.glp_set_obj_coef(self._lp, self.column_index[col_id], 0.0)
+        return solution
+
+    def _restore_objective(self):
+        glp.glp_set_obj_dir(self._lp, glp.GLP_MAX)
+        if self.objective_id is not None:
+            glp.glp_set_obj_coef(self._lp, self.column_index[self.objective_id], 1.0)
+
+    def solve(self):
+        """
+        solves the linear program with the simplex method
+
+        :return: FluxSolution
+        """
+        params = glp.glp_smcp()
+        glp.glp_init_smcp(params)
+        params.msg_lev = glp.GLP_MSG_OFF
+        if glp.glp_simplex(self._lp, params) != 0:
+            # the basis went bad. start over from a standard basis
+            glp.glp_std_basis(self._lp)
+            glp.glp_simplex(self._lp, params)
+        status = glp.glp_get_status(self._lp)
+        if status != glp.GLP_OPT:
+            return FluxSolution(0.0, dict(), status=status)
+        fluxes = dict([(col_id, glp.glp_get_col_prim(self._lp, j + 1)) for j, col_id in enumerate(self.columns)])
+        return FluxSolution(glp.glp_get_obj_val(self._lp), fluxes, status=status)
+
+
+class FluxSolution(object):
+    """
+    the result of solving a LocalFBA. Stands in for an FBA object where only the objective and fluxes are needed
+    """
+    # objective values below this are numerical noise from the solver
+    TOLERANCE = 1e-9
+
+    def __init__(self, objective, fluxes, status=None):
+        self.objective = objective if abs(objective) > FluxSolution.TOLERANCE else 0.0
+        self.fluxes = fluxes
+        self.status = status
+
+    def __str__(self):
+        return 'FluxSolution: objective ' + str(self.objective)
+
+    def __repr__(self):
+        return str(self)
+
+    def is_optimal(self):
+        return self.status == glp.GLP_OPT
+
+    def reaction_fluxes(self):
+        """
+        returns a dictionary of column ids (reaction removal_ids, etc.) to their flux in this solution
+        """
+        return self.fluxes
+
+
+def _compartment(compound_id):
+    return compound_id.split('_')[-1]
+
+
+def _set_col_bnds(lp, j, lower, upper):
+    if lower == upper:
+        glp.glp_set_col_bnds(lp, j, glp.GLP_FX, float(lower), float(upper))
+    else:
+        glp.glp_set_col_bnds(lp, j, glp.GLP_DB, float(lower), float(upper))
+
+
+def _load_matrix(lp, entries):
+    # GLPK arrays are 1-indexed
+    ia = glp.intArray(len(entries) + 1)
+    ja = glp.intArray(len(entries) + 1)
+    ar = glp.doubleArray(len(entries) + 1)
+    for k, (i, j, coeff) in enumerate(entries):
+        ia[k + 1] = int(i)
+        ja[k + 1] = int(j)
+        ar[k + 1] = float(coeff)
+    glp.glp_load_matrix(lp, len(entries), ia, ja, ar)
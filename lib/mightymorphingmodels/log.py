@@ -110,7 +110,10 @@ class Action:
             optional[CONTEXT] = self.context
         if self.notes is not None:
             optional[NOTES] = self.notes
-        return json.dumps({TYPE_STR: self.type, MEMBERS: self.members}.update(optional))
+        data = {TYPE_STR: self.type, MEMBERS: self.members}
+        data.update(optional)
+        # members that aren't JSON (e.g. a ModelReaction, or the FluxSolution of a local FBA) are kept as their str
+        return json.dumps(data, default=str)
 
     @staticmethod
     def from_json(json_str):
@@ -137,6 +137,15 @@ CallingParams is a reference to a hash where the following keys are defined:
 	translate_media_id has a value which is a string
 	output_id has a value which is a string
 	workspace has a value which is a string
+	knockout has a value which is an int
+	local_fba has a value which is an int
+	flux_shortcut has a value which is an int
+	prescreen has a value which is an int
+	remove_blocked has a value which is an int
+	block_size has a value which is an int
+	speculate has a value which is an int
+	save_interval has a value which is an int
+	resume has a value which is an int
 CallingResults is a reference to a hash where the following keys are defined:
 	report_name has a value which is a string
 	report_ref has a value which is a string
@@ -165,6 +174,15 @@ CallingParams is a reference to a hash where the following keys are defined:
 	translate_media_id has a value which is a string
 	output_id has a value which is a string
 	workspace has a value which is a string
+	knockout has a value which is an int
+	local_fba has a value which is an int
+	flux_shortcut has a value which is an int
+	prescreen has a value which is an int
+	remove_blocked has a value which is an int
+	block_size has a value which is an int
+	speculate has a value which is an int
+	save_interval has a value which is an int
+	resume has a value which is an int
 CallingResults is a reference to a hash where the following keys are defined:
 	report_name has a value which is a string
 	report_ref has a value which is a string
@@ -347,6 +365,15 @@ translate_media_workspace has a value which is a string
 translate_media_id has a value which is a string
 output_id has a value which is a string
 workspace has a value which is a string
+knockout has a value which is an int
+local_fba has a value which is an int
+flux_shortcut has a value which is an int
+prescreen has a value which is an int
+remove_blocked has a value which is an int
+block_size has a value which is an int
+speculate has a value which is an int
+save_interval has a value which is an int
+resume has a value which is an int
 
 </pre>
 
@@ -370,6 +397,15 @@ translate_media_workspace has a value which is a string
 translate_media_id has a value which is a string
 output_id has a value which is a string
 workspace has a value which is a string
+knockout has a value which is an int
+local_fba has a value which is an int
+flux_shortcut has a value which is an int
+prescreen has a value which is an int
+remove_blocked has a value which is an int
+block_size has a value which is an int
+speculate has a value which is an int
+save_interval has a value which is an int
+resume has a value which is an int
 
 
 =end text
@@ -47,7 +47,11 @@ class mightymorphingmodels(object):
            "num_reactions_to_process" of Long, parameter
            "translate_media_workspace" of String, parameter
            "translate_media_id" of String, parameter "output_id" of String,
-           parameter "workspace" of String
+           parameter "workspace" of String, parameter "knockout" of Long,
+           parameter "local_fba" of Long, parameter "flux_shortcut" of Long,
+           parameter "prescreen" of Long, parameter "remove_blocked" of Long,
+           parameter "block_size" of Long, parameter "speculate" of Long,
+           parameter "save_interval" of Long, parameter "resume" of Long
         :returns: instance of type "CallingResults" -> structure: parameter
            "report_name" of String, parameter "report_ref" of String
         """
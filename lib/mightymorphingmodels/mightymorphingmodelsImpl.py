@@ -3,6 +3,7 @@
 from service import Service
 from objects import *
 from morph import Morph
+from GrowthConditions import LocalFBACondition, KnockoutCondition
 import uuid, sys, os, traceback
 #END_HEADER
 
@@ -27,6 +28,42 @@ class mightymorphingmodels:
     GIT_COMMIT_HASH = "7b416108e6c72e521a1d2d69974b7ebe951fe197"
 
     #BEGIN_CLASS_HEADER
+    def _prepare_morph(self, params):
+        """
+        builds the Morph for the morph_model params and prepares its supermodel
+        """
+        def _translate_obj_identity(workspace, name):
+            info = self.service.get_info(workspace, name=name)
+            return info[0], workspace
+        objid, ws = _translate_obj_identity(params['fbamodel_workspace'], params['fbamodel_name'])
+        model = FBAModel(objid, ws, service=self.service)
+        objid, ws = _translate_obj_identity(params['media_workspace'], params['media_name'])
+        media = Media(objid, ws, service=self.service)
+        objid, ws = _translate_obj_identity(params['proteincomparison_workspace'], params['proteincomparison_name'])
+        protcomp = ProteomeComparison(objid, ws, service=self.service)
+        objid, ws = _translate_obj_identity(params['genome_workspace'], params['genome_name'])
+        genome = Genome(objid, ws, service=self.service)
+        probanno = None
+        if 'rxn_probs_name' in params and 'rxn_probs_workspace' in params and \
+                params['rxn_probs_name'] is not None and len(params['rxn_probs_name']) > 0:
+            objid, ws = _translate_obj_identity(params['rxn_probs_workspace'], params['rxn_probs_name'])
+            probanno = ReactionProbabilities(objid, ws, service=self.service)
+        morph = Morph(service=self.service,
+                      src_model=model,
+                      media=media,
+                      probanno=probanno,
+                      protcomp=protcomp,
+                      genome=genome,
+                      ws_id=params['workspace'])
+        morph.prepare_supermodel(fill_src='fill_src' in params and bool(params['fill_src']))
+        if 'translate_media' in params and params['translate_media']:
+            if 'target_media_name' in params and 'target_media_workspace' in params:
+                objid, ws = _translate_obj_identity(params['target_media_workspace'], params['target_media_name'])
+                new_media = Media(objid, ws, service=self.service)
+            else:
+                new_media = morph.media
+            morph.translate_media(new_media)
+        return morph
     #END_CLASS_HEADER
 
     # config contains contents of config file in a hash or None if it couldn't
@@ -36,6 +73,12 @@ class mightymorphingmodels:
         self.callback_url = os.environ['SDK_CALLBACK_URL']
         self.workspaceURL = config['workspace-url']
         self.scratch = config['scratch']
+        # workspace objects fetched by any call are cached here, bounded to object-cache-mb megabytes
+        self.object_cache = os.path.join(self.scratch, 'object_cache')
+        self.object_cache_size = int(config.get('object-cache-mb', 1024)) * 1024 * 1024
+        # how often objects check their invariants: full, sampled (one check in validation-sample-interval) or off
+        set_validation(config.get('validation-level', DEFAULT_VALIDATION_LEVEL),
+                       config.get('validation-sample-interval', DEFAULT_SAMPLE_INTERVAL))
         #END_CONSTRUCTOR
         pass
 
@@ -54,14 +97,19 @@ class mightymorphingmodels:
            "num_reactions_to_process" of Long, parameter
            "translate_media_workspace" of String, parameter
            "translate_media_id" of String, parameter "output_id" of String,
-           parameter "workspace" of String
+           parameter "workspace" of String, parameter "knockout" of Long,
+           parameter "local_fba" of Long, parameter "flux_shortcut" of Long,
+           parameter "prescreen" of Long, parameter "remove_blocked" of Long,
+           parameter "block_size" of Long, parameter "speculate" of Long,
+           parameter "save_interval" of Long, parameter "resume" of Long
         :returns: instance of type "CallingResults" -> structure: parameter
            "report_name" of String, parameter "report_ref" of String
         """
         # ctx is the context object
         # return variables are: returnVal
         #BEGIN morph_model
-        self.service = Service(self.callback_url, self.workspaceURL, ctx)
+        self.service = Service(self.callback_url, self.workspaceURL, ctx, cache_dir=self.object_cache,
+                               cache_size=self.object_cache_size)
         required_args = ['fbamodel_name',
                          'fbamodel_workspace',
                          'media_name',
@@ -76,47 +124,48 @@ class mightymorphingmodels:
                 raise ValueError("insufficient params supplied")
 
 
-        def _translate_obj_identity(workspace, name):
-            info = self.service.get_info(workspace, name=name)
-            return info[0], workspace
-        objid, ws = _translate_obj_identity(params['fbamodel_workspace'], params['fbamodel_name'])
-        model = FBAModel(objid, ws, service=self.service)
-        objid, ws = _translate_obj_identity(params['media_workspace'], params['media_name'])
-        media = Media(objid, ws, service=self.service)
-        objid, ws = _translate_obj_identity(params['proteincomparison_workspace'], params['proteincomparison_name'])
-        protcomp = ProteomeComparison(objid, ws, service=self.service)
-        objid, ws = _translate_obj_identity(params['genome_workspace'], params['genome_name'])
-        genome = Genome(objid, ws, service=self.service)
-        probanno = None
-        if 'rxn_probs_name' in params and 'rxn_probs_workspace' in params and \
-                params['rxn_probs_name'] is not None and len(params['rxn_probs_name']) > 0:
-            objid, ws = _translate_obj_identity(params['rxn_probs_workspace'], params['rxn_probs_name'])
-            probanno = ReactionProbabilities(objid, ws, service=self.service)
-        morph = Morph(service=self.service,
-                      src_model=model,
-                      media=media,
-                      probanno=probanno,
-                      protcomp=protcomp,
-                      genome=genome,
-                      ws_id=params['workspace'])
-        if 'fill_src' in params and params['fill_src']:
-            morph.fill_src_to_media()
-        morph.translate_features()
-        morph.reconstruct_genome()
-        morph.label_reactions()
-        morph.build_supermodel()
-        if 'translate_media' in params and params['translate_media']:
-            if 'target_media_name' in params and 'target_media_workspace' in params:
-                objid, ws = self._translate_obj_identity(params['target_media_workspace'], params['target_media_name'])
-                new_media = Media(objid, ws, service=self.service)
-            else:
-                new_media = morph.media
-            morph.translate_media(new_media)
         output_name = params['output_name'] if 'output_name' in params else 'MorphedModel'
-        if 'num_reactions_to_process' in params:
-            morph.process_reactions(num_reactions=int(params['num_reactions_to_process']), name=output_name)
+        # progress of process_reactions, written at each of its save points and deleted once it finishes
+        checkpoint = os.path.join(self.scratch, output_name + '.checkpoint.json')
+        rxn_list = None
+        if 'resume' in params and params['resume'] and os.path.exists(checkpoint):
+            # continue from the last checkpoint rather than preparing the supermodel again
+            morph, rxn_list = Morph.load_checkpoint(checkpoint, self.service)
         else:
-            morph.process_reactions(name=output_name)
+            morph = self._prepare_morph(params)
+        growth_condition = None
+        if 'knockout' in params and params['knockout']:
+            growth_condition = KnockoutCondition(service=self.service)
+        elif 'local_fba' in params and params['local_fba']:
+            growth_condition = LocalFBACondition(service=self.service)
+        flux_shortcut = 'flux_shortcut' in params and bool(params['flux_shortcut'])
+        prescreen = 'prescreen' in params and bool(params['prescreen'])
+        remove_blocked = 'remove_blocked' in params and bool(params['remove_blocked'])
+        block_size = None
+        if 'block_size' in params and params['block_size']:
+            block_size = int(params['block_size'])
+        speculate = None
+        if 'speculate' in params and params['speculate']:
+            speculate = int(params['speculate'])
+        save_interval = None
+        if 'save_interval' in params and params['save_interval']:
+            save_interval = int(params['save_interval'])
+        try:
+            if 'num_reactions_to_process' in params and rxn_list is None:
+                # a resumed run's rxn_list is what was left of the reactions to process
+                morph.process_reactions(num_reactions=int(params['num_reactions_to_process']), name=output_name,
+                                        growth_condition=growth_condition, flux_shortcut=flux_shortcut,
+                                        prescreen=prescreen, block_size=block_size, speculate=speculate,
+                                        save_interval=save_interval, checkpoint=checkpoint,
+                                        remove_blocked=remove_blocked)
+            else:
+                morph.process_reactions(rxn_list=rxn_list, name=output_name, growth_condition=growth_condition,
+                                        flux_shortcut=flux_shortcut, prescreen=prescreen, block_size=block_size,
+                                        speculate=speculate, save_interval=save_interval, checkpoint=checkpoint,
+                                        remove_blocked=remove_blocked)
+        finally:
+            # the queued saves land before the report is saved, and the service's saver thread stops with the call
+            self.service.close()
 
         reportObj = {
             'objects_created':[],
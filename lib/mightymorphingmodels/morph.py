@@ -1,11 +1,24 @@
 # import necesary services
 import copy
 import json
+import os
+import threading
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 
 import GrowthConditions
+from asyncservice import AsyncService, Future, DEFAULT_MAX_CONCURRENT
+from localfba import LocalFBA
 from log import Log
 from objects import *
+from pipeline import Pipeline
 
+# fluxes smaller than this (in magnitude) are considered zero
+ZERO_FLUX = 1e-9
+# the Morph properties saved (by reference) in a checkpoint, and their types
+CHECKPOINT_OBJECTS = {'src_model': FBAModel, 'model': FBAModel, 'trans_model': FBAModel, 'recon_model': FBAModel,
+                      'genome': Genome, 'probanno': ReactionProbabilities, 'protcomp': ProteomeComparison,
+                      'media': Media}
 
 
 
@@ -18,7 +31,7 @@ class Morph:
     # morphed from source import to target, and the set of
     properties = {'src_model', 'genome', 'probanno', 'protcomp', 'model', 'rxn_labels', 'ws_id', 'ws_name',
                   'trans_model',
-                  'recon_model', 'media', 'probhash', 'log', 'merge_conflicts', 'service'}
+                  'recon_model', 'media', 'probhash', 'log', 'merge_conflicts', 'service', 'knockout_objectives'}
 
     def __init__(self, *arg_hash, **kwargs):
         """
@@ -49,6 +62,9 @@ class Morph:
         self.essential_ids = None
         self.removed_ids = None
         self.service = None
+        self.knockout_objectives = None
+        # (filename, removal list) while process_reactions is checkpointing
+        self._checkpoint_file = None
 
         for dictionary in arg_hash:
             for key in dictionary:
@@ -128,6 +144,75 @@ class Morph:
         with open(filename, 'r') as f:
             return Morph.from_json(f.read())
 
+    def save_checkpoint(self, filename, rxn_list, name, unsaved=None):
+        """
+        writes the progress of process_reactions through rxn_list to filename, for load_checkpoint
+
+        The checkpoint is compact JSON: references to the morph's objects, the reactions in rxn_list not yet processed
+        (as [reaction_id, removal_id] pairs, in order), the removal_ids in morph.essential_ids and morph.removed_ids,
+        the removals made to morph.model in memory but not yet saved, and morph.log.
+
+        :param filename: path of the checkpoint file. Replaced atomically
+        :param rxn_list: list of tuples (reaction_id, ModelReaction) being processed
+        :param name: name of morph.model
+        :param unsaved: (optional) list<str> removals applied to morph.model in memory only
+        """
+        essential_ids = sorted(self.essential_ids or [])
+        removed_ids = sorted(self.removed_ids or [])
+        processed = set(essential_ids + removed_ids)
+        remaining = list()
+        for reaction_id, reaction in rxn_list:
+            removal_id = reaction.get_removal_id()
+            if removal_id not in processed and not removal_id.startswith('rxn00000'):
+                remaining.append([reaction_id, removal_id])
+        objects = dict()
+        for prop in CHECKPOINT_OBJECTS:
+            if self.__dict__[prop] is not None:
+                objects[prop] = self.__dict__[prop].to_json()
+        state = {'name': name,
+                 'remaining': remaining,
+                 'unsaved': list(unsaved or []),
+                 'ws_id': self.ws_id,
+                 'objects': objects,
+                 'essential_ids': essential_ids,
+                 'removed_ids': removed_ids,
+                 'log': self.log.to_json() if self.log is not None else None}
+        # write then rename, so a crash mid write leaves the last checkpoint intact
+        with open(filename + '.tmp', 'w') as f:
+            f.write(json.dumps(state))
+        os.rename(filename + '.tmp', filename)
+
+    @staticmethod
+    def load_checkpoint(filename, service):
+        """
+        rebuilds a Morph from a checkpoint written by save_checkpoint, to resume process_reactions
+
+        The reactions still to process are looked up by removal_id in the checkpointed morph.model, rather than
+        labeled again, so the list is the one the run was processing. Removals that weren't saved in morph.model when
+        the checkpoint was written are saved now.
+
+        :param filename: path of the checkpoint file
+        :param service: the Service for the morph and its objects
+        :return: tuple (Morph, list) the morph, and the rxn_list of tuples (reaction_id, ModelReaction) to resume
+            process_reactions with
+        """
+        with open(filename, 'r') as f:
+            state = json.loads(f.read())
+        args = {'service': service, 'ws_id': state['ws_id']}
+        if state.get('log') is not None:
+            args['log'] = Log.from_json(state['log'])
+        for prop in state['objects']:
+            obj = CHECKPOINT_OBJECTS[prop].from_json(state['objects'][prop])
+            obj.service = service
+            args[prop] = obj
+        morph = Morph(args)
+        reactions = dict([(r.get_removal_id(), r) for r in morph.model.get_reactions()])
+        morph.essential_ids = dict([(r, reactions.get(r)) for r in state['essential_ids']])
+        morph.removed_ids = dict([(r, reactions.get(r)) for r in state['removed_ids']])
+        morph._save_model(state['name'], list(state['unsaved']))
+        rxn_list = [(r[0], reactions[r[1]]) for r in state['remaining'] if r[1] in reactions]
+        return morph, rxn_list
+
 
     # Overridden Functions to produce unique output
     def __str__(self):
@@ -289,7 +374,8 @@ class Morph:
     >>>'rxn10316_c0' in morph.rxn_labels['no-gene']
     True
     """
-        # get reaction sets
+        # get reaction sets, fetching the three models in one request
+        StoredObject.prefetch([self.recon_model, self.trans_model, self.src_model])
         recon_dict = dict([(r.rxn_id(), r) for r in self.recon_model.get_reactions()])
         trans_dict = dict([(r.rxn_id(), r) for r in self.trans_model.get_reactions()])
         model_dict = dict([(r.rxn_id(), r) for r in self.src_model.get_reactions()])
@@ -370,6 +456,8 @@ class Morph:
     """
         if self.merge_conflicts is None:
             self.merge_conflicts = []
+        # usually loaded already by label_reactions
+        StoredObject.prefetch([self.src_model])
         src_rxns = dict([(r.rxn_id(), r) for r in self.src_model.get_reactions()])
         super_rxns = dict()
         specials = list()
@@ -381,12 +469,13 @@ class Morph:
         # necessary:
         reactions_to_remove = []
         adjustments = []
-        for rxn_id in self.rxn_labels['common']:
-            trans_rxn = self.rxn_labels['common'][rxn_id][0]  # MR
-            recon_rxn = self.rxn_labels['common'][rxn_id][1]  # MR
-            merge_gpr = trans_rxn.gpr.merge(recon_rxn.gpr)
+        common = self.rxn_labels['common'].items()
+        merged_gprs, gpr_conflicts = Gpr.merge_all([(trans.gpr, recon.gpr) for _, (trans, recon) in common])
+        gpr_conflicts = set(gpr_conflicts)
+        for i, (rxn_id, (trans_rxn, recon_rxn)) in enumerate(common):
+            merge_gpr = merged_gprs[i]
             direction = _general_direction(trans_rxn, recon_rxn)
-            if trans_rxn.gpr != merge_gpr or trans_rxn.get_direction() != direction:
+            if i in gpr_conflicts or trans_rxn.get_direction() != direction:
                 self.merge_conflicts.append(rxn_id)
                 super_rxns[rxn_id] = recon_rxn
                 adjustments.append((recon_rxn.get_removal_id(), direction, merge_gpr))
@@ -426,7 +515,7 @@ class Morph:
         result = self.service.add_reactions_manually(self.model, specials, name='super_modelspc')
         self.model = FBAModel(result[0], result[1], service=self.service)
 
-    def prepare_supermodel(self, fill_src=False):
+    def prepare_supermodel(self, fill_src=False, processes=None):
         """
         Composition of the first several steps in the algorithm
 
@@ -436,6 +525,8 @@ class Morph:
         4) label reactions in the morph (populates morph.rxn_labels)
         5) Builds a super_model and puts it in the morph.model field. The model is now ready for the process_reactions function
 
+        Steps 2 and 3 are independent jobs, so they run concurrently (as a Pipeline). Labeling waits for both.
+
         Note
         ----
         Function Requirements:
@@ -458,6 +549,9 @@ class Morph:
         fill_src: boolean,optional
             a boolean indicating that the src_model should first be filled using probabilistic gapfilling
             Optional, default is true.
+        processes: int,optional
+            the number of steps to run at once. Optional, default is as many as can run (processes=1 runs the steps
+            one after another)
 
         Returns
         -------
@@ -532,14 +626,20 @@ class Morph:
 
         This functions post condition preps the morph for the Client.process_reactions(morph) function
         """
+        pipeline = Pipeline()
+        translate_requires = None
         if fill_src:
-            self.fill_src_to_media()
-        self.translate_features()
-        self.reconstruct_genome()
-        self.label_reactions()
-        self.build_supermodel()
-
-    def process_reactions(self, rxn_list=None, name=None, growth_condition=None, num_reactions=-1):
+            pipeline.add('fill_src', self.fill_src_to_media)
+            translate_requires = ['fill_src']
+        pipeline.add('translate', self.translate_features, requires=translate_requires)
+        pipeline.add('reconstruct', self.reconstruct_genome)
+        pipeline.add('label', self.label_reactions, requires=['translate', 'reconstruct'])
+        pipeline.add('supermodel', self.build_supermodel, requires=['label'])
+        pipeline.run(processes=processes)
+
+    def process_reactions(self, rxn_list=None, name=None, growth_condition=None, num_reactions=-1, flux_shortcut=False,
+                          prescreen=False, block_size=None, speculate=None, save_interval=None, checkpoint=None,
+                          remove_blocked=False, processes=None):
         if growth_condition is None:
             growth_condition = GrowthConditions.SimpleCondition(service=self.service)
         """
@@ -577,6 +677,31 @@ class Morph:
         process_count: int, optional
             A number indicating how many reactions have been processed so far, used in nameing output models. Default is 0.
             output models are named as follows: str(name) + '-' + str(process_count)
+        flux_shortcut: Boolean, optional
+            A Boolean flag indicating that reactions carrying no flux in the current optimum should be removed without
+            evaluating growth. Default is False
+        prescreen: Boolean, optional
+            A Boolean flag indicating that the reactions should be screened as single deletions, in parallel, before
+            the removal loop. Default is False
+        block_size: int, optional
+            If set, the number of reactions to attempt removing with each growth evaluation, bisecting on failure.
+            Default is None (one at a time)
+        speculate: int, optional
+            If set, the number of reactions to evaluate concurrently, speculating that earlier ones are removed.
+            Default is None (one at a time)
+        save_interval: int, optional
+            If set, the number of removals to make in memory between saves of morph.model. Default is None (saved
+            once, at the end)
+        checkpoint: String, optional
+            If set, a file to write the progress of the run to (see save_checkpoint) after each reaction is removed
+            or kept, and after each block or window, whether or not morph.model is saved then. The file is deleted once the run finishes.
+            To resume, pass the rxn_list from load_checkpoint. Default is None
+        remove_blocked: Boolean, optional
+            A Boolean flag indicating that reactions which can't carry flux should all be removed before the removal
+            loop. Default is False
+        processes: int, optional
+            The size of the pools prescreen and speculate evaluate on (see screen_reactions and _process_speculative).
+            Default is theirs
         get_count: Boolean, optional
             A Boolean flag indicating whether the process_count should be returned with the morph (as a tuple). Used when not processing all
             reactions at once. Deafault is False
@@ -611,6 +736,32 @@ class Morph:
 
         where removal of one of the reactions given by a key in morph.essential_ids would result in a model that has an objective value of 0.000 in FBA simulation
 
+        Removals are made to morph.model in memory. The model with the removals is saved (as name) every save_interval
+        removals, if set, and at the end. If growth_condition is local (a GrowthConditions.LocalFBACondition), candidates
+        are evaluated in process with nothing saved. With a KnockoutCondition they are tested by knocking them out of
+        one in-process LP. Otherwise one candidate model is saved for the FBA service to evaluate. growth_condition is
+        closed (see AbstractGrowthCondition.close) when the run ends.
+
+        If flux_shortcut is set, candidates that carry no flux in the last FBA of the current model to grow are removed
+        without evaluating growth_condition (removing them can't change the optimum). These are logged as 'Removed
+        Reaction' with 'flux shortcut' notes.
+
+        If remove_blocked is set, the reactions that can't carry flux in morph.model (see blocked_reactions) are removed
+        up front, in one edit, without evaluating growth_condition. These are logged as 'Removed Reaction' with
+        'blocked' notes.
+
+        If prescreen is set, the reactions are first screened as single deletions (see screen_reactions) and those whose
+        lone deletion stops growth are kept without evaluating them in the loop. The screen only reproduces growth on
+        morph.media, so it can't be combined with other growth conditions (see screen_reactions).
+
+        If block_size is set, the reactions are attempted in blocks of block_size, each with one growth evaluation, and
+        blocks that fail are bisected (see _remove_block). This makes the same decisions as attempting them one at a
+        time, with far fewer evaluations when most reactions are removed. Can't be combined with flux_shortcut.
+
+        If speculate is set, up to speculate reactions are evaluated concurrently, each assuming the ones before it are
+        removed (see _process_speculative). This makes the same decisions as attempting them one at a time. Can't be
+        combined with flux_shortcut or block_size.
+
         :param get_count:
         :param process_count:
         :param name:
@@ -619,18 +770,9 @@ class Morph:
         :param growth_condition:
         """
         ws = self.ws_id
-        # Sort by probanno. items() returns (K, V=(model_index, prob))
-
-        def get_key(item):
-            return self.get_prob(item[0])
-
         # label argument behavior
         if rxn_list is None:
-            rxn_dict = self.rxn_labels['gene-no-match']
-            removal_list = sorted(rxn_dict.items(), key=get_key)
-            rxn_dict = self.rxn_labels['no-gene']
-            removal_list += sorted(rxn_dict.items(), key=get_key)
-            removal_list = [r for r in removal_list if r[0] not in self.rxn_labels['common']]
+            removal_list = self._removal_list()
         else:
             removal_list = rxn_list
         # instantiate lists only if needed
@@ -641,34 +783,459 @@ class Morph:
         # Give objs a general name if none is provided
         if name is None:
             name = 'MorphedModel'
-        max = num_reactions >= 0 and num_reactions or len(removal_list)
-        for i in range(max):
-            removal_id = removal_list[i][1].get_removal_id()
-            rxn = removal_list[i][0]
-            if removal_id.startswith('rxn00000'):
-                self.log.add('skip', [self.model, removal_list[i][1]], [None], context='process_reactions')
-                continue
-            print '\nReaction to remove: ' + str(removal_id) + " / " + str(rxn)
-            # TODO Find someway to fix the behavior bug if model_id is not in ws, etc.
-            info = self.service.remove_reaction(self.model, removal_id, output_id='morph_candidate')
-            candidate_model = FBAModel(info[0], info[1], service=self.service)
-            if growth_condition.evaluate({'morph': self, 'model': candidate_model}):
-                # removed successfully
-                self.log.add('Removed Reaction', [self.model, growth_condition.fba], [candidate_model],
-                             context='process reactions')
-                # overwrite current morph with candidate
-                info = self.service.copy_object((candidate_model.object_id, candidate_model.workspace_id),
-                                                (name, self.model.workspace_id))
-                self.model = FBAModel(info[0], info[1], service=self.service)
-                self.removed_ids[removal_id] = removal_list[i][1]
-            else:
-                # essential
-                self.log.add('Kept Reaction', [self.model, growth_condition.fba], [candidate_model],
-                             context='process reactions')
-                self.essential_ids[removal_id] = removal_list[i][1]
-            print self.log.actions[-1].type + ' ' + str(removal_id) + ', FBA was ' + str(growth_condition.fba.objective)
+        max = num_reactions >= 0 and min(num_reactions, len(removal_list)) or len(removal_list)
+        if block_size is not None and flux_shortcut:
+            raise ValueError("flux_shortcut can't be combined with block_size")
+        if speculate is not None and (flux_shortcut or block_size is not None):
+            raise ValueError("speculate can't be combined with flux_shortcut or block_size")
+        if prescreen:
+            _check_screened(growth_condition)
+        if checkpoint is not None:
+            self._checkpoint_file = (checkpoint, removal_list[:max], name)
+            self.save_checkpoint(*self._checkpoint_file)
+        try:
+            knockout = isinstance(growth_condition, GrowthConditions.KnockoutCondition)
+            # removals applied to self.model in memory but not yet saved to the service
+            unsaved = []
+            if remove_blocked:
+                self._remove_blocked(removal_list[:max], growth_condition, unsaved)
+                self._checkpoint(name, unsaved, save_interval)
+            if prescreen:
+                self.screen_reactions([r for r in removal_list[:max] if r[1].get_removal_id() not in self.removed_ids],
+                                      growth_condition=growth_condition, processes=processes)
+            if block_size is not None:
+                candidates = [r for r in removal_list[:max] if not self._precheck(r, prescreen)]
+                for offset in range(0, len(candidates), block_size):
+                    self._remove_block(candidates[offset:offset + block_size], growth_condition, unsaved)
+                    self._checkpoint(name, unsaved, save_interval)
+                max = 0
+            if speculate is not None:
+                candidates = [r for r in removal_list[:max] if not self._precheck(r, prescreen)]
+                self._process_speculative(candidates, growth_condition, name, unsaved, speculate, processes=processes,
+                                          save_interval=save_interval)
+                max = 0
+            # fluxes of the last FBA of self.model to grow (flux_shortcut only)
+            fluxes = None
+            if flux_shortcut:
+                if growth_condition.evaluate({'morph': self, 'model': self.model}):
+                    fluxes = growth_condition.fba.reaction_fluxes()
+            for i in range(max):
+                removal_id = removal_list[i][1].get_removal_id()
+                if self._precheck(removal_list[i], prescreen):
+                    continue
+                if fluxes is not None and abs(fluxes.get(removal_id, 1.0)) < ZERO_FLUX:
+                    # the current optimum doesn't use this reaction, so removing it can't stop growth
+                    if knockout:
+                        growth_condition.knock_out(removal_id)
+                    unsaved.append(removal_id)
+                    self.log.add('Removed Reaction', [self.model, removal_list[i][1]], [None],
+                                 context='process reactions', notes='flux shortcut ' + str(removal_id))
+                    self.removed_ids[removal_id] = removal_list[i][1]
+                    print self.log.actions[-1].type + ' ' + str(removal_id) + ', flux shortcut'
+                    self._checkpoint(name, unsaved, save_interval)
+                    continue
+                model = self.model
+                removed, candidate_model = self._try_removal([removal_id], growth_condition, unsaved)
+                notes = 'knockout ' + str(removal_id) if knockout else None
+                if removed:
+                    self.log.add('Removed Reaction', [model, growth_condition.fba], [candidate_model],
+                                 context='process reactions', notes=notes)
+                    self.removed_ids[removal_id] = removal_list[i][1]
+                    if fluxes is not None:
+                        fluxes = growth_condition.fba.reaction_fluxes()
+                else:
+                    # essential
+                    self.log.add('Kept Reaction', [model, growth_condition.fba], [candidate_model],
+                                 context='process reactions', notes=notes)
+                    self.essential_ids[removal_id] = removal_list[i][1]
+                print self.log.actions[-1].type + ' ' + str(removal_id) + ', FBA was ' + str(growth_condition.fba.objective)
+                self._checkpoint(name, unsaved, save_interval)
+            self._save_model(name, unsaved)
+        finally:
+            growth_condition.close()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            # the run finished. A later run starts over
+            os.remove(checkpoint)
+        self._checkpoint_file = None
         return self
 
+    def blocked_reactions(self, rxn_list=None):
+        """
+        returns the removal_ids of the reactions in rxn_list that can't carry flux in morph.model with morph.media
+
+        Found in process by flux variability analysis of a localfba.LocalFBA for morph.model, with no FBA service calls.
+        A blocked reaction carries no flux in any steady state of the model, so removing it can't change growth and it
+        is never essential.
+
+        :param rxn_list: (optional) list of tuples (reaction_id, ModelReaction), as in process_reactions. Default is the
+            gene-no-match and no-gene reactions
+        :return: list<str> removal_ids of the blocked reactions
+        """
+        if rxn_list is None:
+            rxn_list = self._removal_list()
+        lp = LocalFBA(self.model.stoichiometry(), self.media.data)
+        removal_ids = [r[1].get_removal_id() for r in rxn_list]
+        return lp.blocked([r for r in removal_ids if r in lp.column_index])
+
+    def _remove_blocked(self, rxn_list, growth_condition, unsaved):
+        """
+        removes the blocked reactions (see blocked_reactions) of rxn_list from morph.model in memory, without evaluating
+        growth_condition
+
+        :param rxn_list: list of tuples (reaction_id, ModelReaction) being processed
+        :param growth_condition: AbstractGrowthCondition of the run. A KnockoutCondition's LP gets the knockouts too
+        :param unsaved: list<str> removals applied to morph.model in memory only. Mutated
+        """
+        candidates = list()
+        for reaction in rxn_list:
+            removal_id = reaction[1].get_removal_id()
+            if not removal_id.startswith('rxn00000') and removal_id not in self.essential_ids and \
+                    removal_id not in self.removed_ids:
+                candidates.append(reaction)
+        blocked = set(self.blocked_reactions(candidates))
+        for reaction in candidates:
+            removal_id = reaction[1].get_removal_id()
+            if removal_id not in blocked:
+                continue
+            if isinstance(growth_condition, GrowthConditions.KnockoutCondition) and growth_condition.lp is not None:
+                growth_condition.knock_out(removal_id)
+            unsaved.append(removal_id)
+            self.log.add('Removed Reaction', [self.model, reaction[1]], [None],
+                         context='process reactions', notes='blocked ' + str(removal_id))
+            self.removed_ids[removal_id] = reaction[1]
+        print 'Removed ' + str(len(blocked)) + ' blocked reactions'
+
+    def _checkpoint(self, name, unsaved, save_interval):
+        """
+        a save point of process_reactions: saves morph.model (see _save_model) if there are at least save_interval
+        unsaved removals (never if save_interval is None), and writes the checkpoint, if process_reactions has one
+        """
+        if save_interval is not None and len(unsaved) >= save_interval:
+            self._save_model(name, unsaved)
+        elif self._checkpoint_file is not None:
+            self.save_checkpoint(*self._checkpoint_file, unsaved=unsaved)
+
+    def _save_model(self, name, unsaved):
+        """
+        saves morph.model with the unsaved removals as name, which becomes morph.model (emptying unsaved)
+
+        :param name: name for morph.model
+        :param unsaved: list<str> removals applied to morph.model in memory only. Mutated
+        """
+        if len(unsaved) == 0:
+            return
+        # FBAModel.save keeps the saved data, so the new model isn't downloaded again
+        self.model = FBAModel.save(self.service.without_reactions(self.model, unsaved), self.model.workspace_id,
+                                   self.service, name=name)
+        del unsaved[:]
+        if self._checkpoint_file is not None:
+            self.save_checkpoint(*self._checkpoint_file)
+
+    def _precheck(self, reaction, prescreen):
+        """
+        handles a candidate of process_reactions that needs no growth evaluation. Special (rxn00000) reactions and
+        reactions processed before a resume are skipped, and with prescreen, reactions whose lone deletion stops growth
+        are kept
+
+        :param reaction: tuple (reaction_id, ModelReaction) from the removal list
+        :param prescreen: whether the reactions were screened with screen_reactions
+        :return: True if the candidate was handled (and logged), False if it needs to be evaluated
+        """
+        removal_id = reaction[1].get_removal_id()
+        if removal_id.startswith('rxn00000'):
+            self.log.add('skip', [self.model, reaction[1]], [None], context='process_reactions')
+            return True
+        if removal_id in self.essential_ids or removal_id in self.removed_ids:
+            # processed before the run was resumed
+            return True
+        print '\nReaction to remove: ' + str(removal_id) + " / " + str(reaction[0])
+        if prescreen and removal_id in self.knockout_objectives and not self.knockout_objectives[removal_id] > 0.0:
+            # removing it alone from the larger model already stops growth
+            self.log.add('Kept Reaction', [self.model, reaction[1]], [None],
+                         context='process reactions', notes='single deletion screen ' + str(removal_id))
+            self.essential_ids[removal_id] = reaction[1]
+            print self.log.actions[-1].type + ' ' + str(removal_id) + ', single deletion screen'
+            return True
+        return False
+
+    def _try_removal(self, removal_ids, growth_condition, unsaved):
+        """
+        evaluates growth_condition for morph.model without the reactions (and without the unsaved removals), appending
+        them to unsaved if it passes
+
+        With a KnockoutCondition the removal is applied to its LP. With another LocalFBACondition the model is evaluated
+        in process with the removals knocked out. Otherwise a candidate model is saved for the condition to evaluate.
+
+        :param removal_ids: list<str> removal_ids of the reactions to remove
+        :param growth_condition: AbstractGrowthCondition to evaluate
+        :param unsaved: list<str> removals applied to morph.model in memory only. Mutated
+        :return: tuple (bool, FBAModel) whether the reactions were removed, and the candidate model (None if local)
+        """
+        if isinstance(growth_condition, GrowthConditions.KnockoutCondition):
+            if growth_condition.evaluate({'morph': self, 'model': self.model, 'reactions': removal_ids}):
+                growth_condition.commit()
+                unsaved.extend(removal_ids)
+                return True, None
+            growth_condition.rollback()
+            return False, None
+        if isinstance(growth_condition, GrowthConditions.LocalFBACondition):
+            if growth_condition.evaluate({'morph': self, 'model': self.model, 'knockouts': unsaved + removal_ids}):
+                unsaved.extend(removal_ids)
+                return True, None
+            return False, None
+        # TODO Find someway to fix the behavior bug if model_id is not in ws, etc.
+        info = self.service.remove_reactions(self.model, unsaved + removal_ids, 'morph_candidate')
+        candidate_model = FBAModel(info[0], info[1], service=self.service)
+        if not growth_condition.evaluate({'morph': self, 'model': candidate_model}):
+            return False, candidate_model
+        unsaved.extend(removal_ids)
+        return True, candidate_model
+
+    def _remove_block(self, block, growth_condition, unsaved):
+        """
+        attempts removal of a block of candidates with one growth evaluation, bisecting the block if it fails
+
+        Removing reactions can only shrink the space of fluxes, so if the model grows without the whole block it grows
+        without any prefix of it, and removing the candidates one at a time (in order) would have removed them all. This
+        makes the same decisions as that one at a time order, using about E * log(len(block)) evaluations for E
+        essential reactions instead of len(block).
+
+        :param block: list of tuples (reaction_id, ModelReaction) to attempt removal of, in order
+        :param growth_condition: AbstractGrowthCondition to evaluate
+        :param unsaved: list<str> removals applied to morph.model in memory only. Mutated
+        """
+        if len(block) == 0:
+            return
+        removal_ids = [r[1].get_removal_id() for r in block]
+        model = self.model
+        removed, candidate_model = self._try_removal(removal_ids, growth_condition, unsaved)
+        if removed:
+            # one entry per reaction, as the one at a time loop logs them
+            for i in range(len(block)):
+                self.log.add('Removed Reaction', [model, growth_condition.fba], [candidate_model],
+                             context='process reactions', notes='block of ' + str(len(block)) + ' ' + removal_ids[i])
+                self.removed_ids[removal_ids[i]] = block[i][1]
+            print 'Removed ' + str(len(block)) + ' Reactions ' + ', '.join(removal_ids)
+        elif len(block) == 1:
+            # essential
+            self.log.add('Kept Reaction', [model, growth_condition.fba], [candidate_model],
+                         context='process reactions', notes='block of 1 ' + removal_ids[0])
+            self.essential_ids[removal_ids[0]] = block[0][1]
+            print 'Kept Reaction ' + str(removal_ids[0]) + ', FBA was ' + str(growth_condition.fba.objective)
+        else:
+            half = len(block) / 2
+            self._remove_block(block[:half], growth_condition, unsaved)
+            self._remove_block(block[half:], growth_condition, unsaved)
+
+    def _process_speculative(self, candidates, growth_condition, name, unsaved, window, processes=None,
+                             save_interval=None):
+        """
+        attempts removal of candidates in order, evaluating up to window of them at a time concurrently
+
+        Most candidates are removed, so each evaluation in a window speculates that every candidate before it in the
+        window is removed too. Results are committed in order up to the first candidate that is kept, which is
+        essential either way. The evaluations after it assumed it was removed, so they are discarded and the next window
+        starts right after it. This makes the same decisions as attempting the candidates one at a time.
+
+        A LocalFBACondition or KnockoutCondition is solved on a pool of worker processes, each with its own LP for
+        morph.model. Other conditions are evaluated with their evaluate method on a pool of threads, each slot of the
+        window with its own copy of growth_condition (closed when the run ends): subclasses of LocalFBACondition with
+        the removals knocked out, others with a candidate model saved for them (one name per slot). Subclasses of KnockoutCondition, which
+        share one LP, can't be evaluated concurrently and raise ValueError. Either way the removals are appended to
+        unsaved, which is saved (see _checkpoint) between windows.
+
+        :param candidates: list of tuples (reaction_id, ModelReaction) to attempt removal of, in order
+        :param growth_condition: AbstractGrowthCondition to evaluate
+        :param name: name for morph.model
+        :param unsaved: list<str> removals applied to morph.model in memory only. Mutated
+        :param window: the number of candidates to evaluate at once
+        :param processes: (optional) size of the pool. Default is the number of CPUs for local, window for service FBA
+        :param save_interval: (optional) the number of unsaved removals to save morph.model at. Default is at the end
+        """
+        local = growth_condition.__class__ in (GrowthConditions.LocalFBACondition, GrowthConditions.KnockoutCondition)
+        if not local and isinstance(growth_condition, GrowthConditions.KnockoutCondition):
+            raise ValueError("speculate can't evaluate a subclass of KnockoutCondition concurrently")
+        if local:
+            pool = Pool(processes or cpu_count(), _init_worker, (self.model.stoichiometry(), self.media.data))
+            # the worker LPs are for morph.model as it is now, which is saved with fewer reactions as the loop goes
+            removed = list(unsaved)
+            conditions = []
+        else:
+            # the threads read the model's data to save candidates. Load it once, up front
+            self.model.data
+            pool = ThreadPool(processes or window)
+            conditions = [copy.copy(growth_condition) for _ in range(window)]
+        try:
+            i = 0
+            while i < len(candidates):
+                batch = candidates[i:i + window]
+                removal_ids = [r[1].get_removal_id() for r in batch]
+                tasks = []
+                for k in range(len(batch)):
+                    if local:
+                        tasks.append(pool.apply_async(_knockout_objective, (removed + removal_ids[:k + 1],)))
+                    else:
+                        # each slot of the window saves under its own name, so concurrent FBAs can't read each other's
+                        # candidates
+                        output_id = 'morph_candidate-' + str(k)
+                        tasks.append(pool.apply_async(self._speculate, (conditions[k], self.model,
+                                                                        unsaved + removal_ids[:k + 1], output_id)))
+                model = self.model
+                for k in range(len(batch)):
+                    if local:
+                        objective = tasks[k].get()
+                        grows, fba, candidate_model = objective > 0.0, None, None
+                        notes = 'speculative, objective ' + str(objective)
+                    else:
+                        grows, fba, candidate_model = tasks[k].get()
+                        objective = fba.objective
+                        notes = 'speculative'
+                    if grows:
+                        self.log.add('Removed Reaction', [model, fba or batch[k][1]], [candidate_model],
+                                     context='process reactions', notes=notes)
+                        self.removed_ids[removal_ids[k]] = batch[k][1]
+                        unsaved.append(removal_ids[k])
+                        if local:
+                            removed.append(removal_ids[k])
+                            if isinstance(growth_condition, GrowthConditions.KnockoutCondition) and \
+                                    growth_condition.lp is not None:
+                                growth_condition.knock_out(removal_ids[k])
+                    else:
+                        # essential
+                        self.log.add('Kept Reaction', [model, fba or batch[k][1]], [candidate_model],
+                                     context='process reactions', notes=notes)
+                        self.essential_ids[removal_ids[k]] = batch[k][1]
+                    print self.log.actions[-1].type + ' ' + str(removal_ids[k]) + ', FBA was ' + str(objective)
+                    if not grows:
+                        break
+                # the discarded evaluations still hold their slots' names. Let them finish before the next window reuses
+                # them
+                for task in tasks[k + 1:]:
+                    task.wait()
+                self._checkpoint(name, unsaved, save_interval)
+                i += k + 1
+        finally:
+            pool.close()
+            pool.join()
+            for condition in conditions:
+                condition.close()
+
+    def _speculate(self, growth_condition, model, removal_ids, output_id):
+        """
+        saves model without the reactions as output_id and evaluates growth_condition for it (for _process_speculative).
+        A LocalFBACondition evaluates model with the reactions knocked out instead, and nothing is saved
+
+        :return: tuple (bool, FBA, FBAModel) the evaluation, the condition's FBA and the candidate model (None if local)
+        """
+        if isinstance(growth_condition, GrowthConditions.LocalFBACondition):
+            grows = growth_condition.evaluate({'morph': self, 'model': model, 'knockouts': removal_ids})
+            return grows, growth_condition.fba, None
+        info = self.service.remove_reactions(model, removal_ids, output_id)
+        candidate_model = FBAModel(info[0], info[1], service=self.service)
+        grows = growth_condition.evaluate({'morph': self, 'model': candidate_model})
+        return grows, growth_condition.fba, candidate_model
+
+    def screen_reactions(self, rxn_list=None, growth_condition=None, processes=None):
+        """
+        Evaluates each reaction in rxn_list as a single deletion from morph.model, in parallel
+
+        Populates morph.knockout_objectives with a dictionary of removal_ids to the objective value of morph.model with
+        only that reaction removed. Removing reactions can only shrink the space of fluxes, so a reaction whose removal
+        alone stops growth here is essential to morph.model and to every model process_reactions makes from it.
+        process_reactions(prescreen=True) uses this to mark those reactions essential up front.
+
+        :param rxn_list: (optional) list of tuples (reaction_id, ModelReaction) to screen, as in process_reactions.
+            Default is the gene-no-match and no-gene reactions
+        :param growth_condition: (optional) if a GrowthConditions.LocalFBACondition or KnockoutCondition, deletions are
+            solved in process on a pool of worker processes. If None or a SimpleCondition, each deletion is saved and
+            run through the FBA service, many at once (with an AsyncService). The deletions are split among slots, each
+            screening its share one after another under one name ('screen_candidate-<slot>'). The screen tests growth
+            on morph.media, so other conditions (including subclasses of these) raise ValueError
+        :param processes: (optional) size of the pool, or the number of slots. Default is the number of CPUs for local,
+            8 for service FBA
+        :return: dict<str, float> morph.knockout_objectives
+        """
+        _check_screened(growth_condition)
+        if rxn_list is None:
+            rxn_list = self._removal_list()
+        removal_ids = [r[1].get_removal_id() for r in rxn_list]
+        removal_ids = [r for r in removal_ids if not r.startswith('rxn00000')]
+        if isinstance(growth_condition, GrowthConditions.LocalFBACondition):
+            processes = processes or cpu_count()
+            pool = Pool(processes, _init_worker, (self.model.stoichiometry(), self.media.data))
+            objectives = pool.map(_knockout_objective, [[r] for r in removal_ids],
+                                  max(1, len(removal_ids) / (4 * processes)))
+            pool.close()
+            pool.join()
+            results = zip(removal_ids, objectives)
+        else:
+            slots = processes or DEFAULT_MAX_CONCURRENT
+            service = AsyncService(self.service, max_concurrent=slots)
+            objectives = dict()
+            # set once screening fails, so the other slots stop after the deletion they're screening
+            stop = threading.Event()
+
+            def screen(slot_ids, output_id):
+                # screens slot_ids one after another, each saved as output_id. Returns a Future for when all are done
+                finished = Future()
+
+                def step(i):
+                    if i == len(slot_ids):
+                        finished._finish()
+                        return
+                    saved = service.remove_reactions(self.model, [slot_ids[i]], output_id)
+                    ran = saved.then(lambda info: service.runfba(FBAModel(info[0], info[1], service=self.service),
+                                                                 self.media, workspace=self.ws_id,
+                                                                 name=output_id + '_fba'))
+                    objective = ran.then(lambda info: service.submit(_objective, info, self.service))
+
+                    def record(future):
+                        if future.exception() is not None:
+                            stop.set()
+                            finished._finish(exc_info=future._exc_info)
+                            return
+                        objectives[slot_ids[i]] = future.result()
+                        if stop.is_set():
+                            finished._finish()
+                            return
+                        step(i + 1)
+                    objective.add_done_callback(record)
+                step(0)
+                return finished
+            # the calls read the model's data to save candidates. Load it once, up front
+            self.model.data
+            futures = list()
+            try:
+                for slot in range(slots):
+                    futures.append(screen(removal_ids[slot::slots], 'screen_candidate-' + str(slot)))
+                for future in futures:
+                    future.result()
+            finally:
+                stop.set()
+                for future in futures:
+                    future.exception()
+                service.close()
+            results = [(r, objectives[r]) for r in removal_ids]
+        if self.knockout_objectives is None:
+            self.knockout_objectives = dict()
+        self.knockout_objectives.update(results)
+        return self.knockout_objectives
+
+    def _removal_list(self):
+        """
+        returns the default reactions for process_reactions: gene-no-match then no-gene reactions (not also common), each
+        in low to high probability order, as tuples (reaction_id, ModelReaction)
+        """
+        # Sort by probanno. items() returns (K, V=(model_index, prob))
+        def get_key(item):
+            return self.get_prob(item[0])
+
+        rxn_dict = self.rxn_labels['gene-no-match']
+        removal_list = sorted(rxn_dict.items(), key=get_key)
+        rxn_dict = self.rxn_labels['no-gene']
+        removal_list += sorted(rxn_dict.items(), key=get_key)
+        return [r for r in removal_list if r[0] not in self.rxn_labels['common']]
+
     def get_prob(self, rxn_id):
         '''
         returns the probanno likelihood for a reaction in a morph
@@ -719,6 +1286,41 @@ class Morph:
         return result
 
 
+def _objective(info, service):
+    # an FBA fetches its objective from the workspace when constructed, so this runs on an AsyncService's pool
+    return FBA(info[0], info[1], service=service).objective
+
+
+def _check_screened(growth_condition):
+    # screen_reactions tests growth (objective > 0) on morph.media, which is what these conditions evaluate
+    if growth_condition is not None and growth_condition.__class__ not in (
+            GrowthConditions.SimpleCondition, GrowthConditions.LocalFBACondition, GrowthConditions.KnockoutCondition):
+        raise ValueError("screen_reactions can't screen for " + growth_condition.__class__.__name__ +
+                         ', only growth on morph.media (SimpleCondition, LocalFBACondition or KnockoutCondition)')
+
+
+# The LP of a worker process in Morph.screen_reactions and speculative process_reactions
+_worker_lp = None
+
+
+def _init_worker(stoichiometry, media_data):
+    global _worker_lp
+    _worker_lp = LocalFBA(stoichiometry, media_data)
+
+
+def _knockout_objective(removal_ids):
+    """
+    returns the objective of the worker's LP with the reactions knocked out, leaving the LP as it was
+    """
+    bounds = [(r, _worker_lp.bounds(r)) for r in removal_ids if r in _worker_lp.column_index]
+    for r, _bounds in bounds:
+        _worker_lp.set_bounds(r, 0.0, 0.0)
+    objective = _worker_lp.solve().objective
+    for r, (lower, upper) in bounds:
+        _worker_lp.set_bounds(r, lower, upper)
+    return objective
+
+
 def _general_direction(model_rxn1, model_rxn2):
     """
     picks the more general of the two directions from reactions passed in
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Default bound on the size of a cache directory, in bytes
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+class ObjectCache(object):
+    """
+    an on disk cache of workspace objects, keyed by (workspace_id, object_id, version) and, for subsets of objects, the
+    included paths
+
+    A version of a workspace object never changes, so an entry never goes stale. It only needs to be evicted for space,
+    least recently used first, once the directory grows past max_bytes. Entries are gzipped JSON, one file per object
+    version, written atomically so that a crash or a concurrent reader never sees a partial entry.
+
+    The sizes and order of use of the entries are kept in memory, seeded from the directory (by modification time) when
+    the cache is created, so a put doesn't list the directory.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param directory: the directory to keep the cache in (e.g. under the scratch directory). Created if needed
+        :param max_bytes: (optional) bound on the total size of the entries
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # entry filename -> size, least recently used first, and their total size
+        self._entries = OrderedDict()
+        self._total = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        entries = list()
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json.gz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        for mtime, size, filename in sorted(entries):
+            self._entries[filename] = size
+            self._total += size
+
+    def __str__(self):
+        return 'ObjectCache: ' + str(self.directory)
+
+    def __repr__(self):
+        return str(self)
+
+    def _path(self, workspace_id, object_id, version, included=None):
+        key = '/'.join([str(workspace_id), str(object_id), str(version)])
+        if included is not None:
+            key += '|' + '|'.join(included)
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + '.json.gz')
+
+    def get(self, workspace_id, object_id, version, included=None):
+        """
+        returns the cached (data, info) of an object version, or None if it isn't cached
+
+        :param included: (optional) the paths of a subset of the object, as passed to put
+        """
+        path = self._path(workspace_id, object_id, version, included=included)
+        try:
+            with gzip.open(path, 'rb') as f:
+                entry = json.load(f)
+            # mark it recently used, here and for the next cache on the directory
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        with self._lock:
+            filename = os.path.basename(path)
+            if filename in self._entries:
+                self._entries[filename] = self._entries.pop(filename)
+        return entry['data'], entry['info']
+
+    def put(self, workspace_id, object_id, version, data, info, included=None):
+        """
+        caches the data and info of an object version, evicting least recently used entries to stay under max_bytes
+
+        :param included: (optional) the paths of the subset of the object that data is
+        """
+        path = self._path(workspace_id, object_id, version, included=included)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                json.dump({'data': data, 'info': info}, f)
+            size = os.path.getsize(tmp_path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            # the cache is an optimization. a failed write just leaves the object uncached
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            filename = os.path.basename(path)
+            self._total += size - self._entries.pop(filename, 0)
+            self._entries[filename] = size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # removes least recently used entries until the rest fit in max_bytes, keeping the newest. Called with _lock
+        # held
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            filename, size = self._entries.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+            self._total -= size
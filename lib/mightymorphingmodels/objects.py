@@ -1,6 +1,10 @@
 from service import types
-import copy
+from stoichiometry import Stoichiometry
+import collections
+import itertools
 import json
+import threading
+import weakref
 
 # Some repeated string constants
 OBJECT_ID = 'object_id'
@@ -8,10 +12,77 @@ WORKSPACE_ID = 'workspace_id'
 TYPE_STR = 'type'
 STORED_OBJECT = 'StoredObject'
 
+# How thoroughly objects check their rep invariants (_check_rep): every time, one time in a sample interval, or never
+VALIDATION_FULL = 'full'
+VALIDATION_SAMPLED = 'sampled'
+VALIDATION_OFF = 'off'
+# the level unless set_validation sets another, e.g. from deploy.cfg's validation-level: the full checks cost more than
+# the work they check on large models, and one in DEFAULT_SAMPLE_INTERVAL still catches a broken invariant early
+DEFAULT_VALIDATION_LEVEL = VALIDATION_SAMPLED
+DEFAULT_SAMPLE_INTERVAL = 100
+
+_validation_level = DEFAULT_VALIDATION_LEVEL
+_sample_interval = DEFAULT_SAMPLE_INTERVAL
+_checks = itertools.count()
+
+
+def set_validation(level, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    sets how thoroughly the objects of this process check their rep invariants (deploy.cfg's validation-level)
+
+    :param level: 'full' checks on every call of _check_rep, 'sampled' on one call in sample_interval, 'off' never
+    :param sample_interval: (optional) for 'sampled', the calls of _check_rep per check made
+    """
+    global _validation_level, _sample_interval, _checks
+    if level not in (VALIDATION_FULL, VALIDATION_SAMPLED, VALIDATION_OFF):
+        raise ValueError('validation level must be full, sampled or off, not ' + str(level))
+    if int(sample_interval) < 1:
+        raise ValueError('sample interval must be at least 1, not ' + str(sample_interval))
+    _validation_level = level
+    _sample_interval = int(sample_interval)
+    _checks = itertools.count()
+
+
+def validation_level():
+    """
+    returns the current validation level (see set_validation)
+    """
+    return _validation_level
+
+
+def _validating():
+    # true if this call of a _check_rep should check
+    if _validation_level == VALIDATION_FULL:
+        return True
+    if _validation_level == VALIDATION_OFF:
+        return False
+    return next(_checks) % _sample_interval == 0
+
+
+class _Interned(type):
+    """
+    metaclass interning StoredObjects per Service. Constructing a StoredObject with a service returns the instance the
+    service already has for that class and identity (if any), with its loaded data. See Service.intern
+    """
+
+    def __call__(cls, object_id, workspace_id, service=None, *args, **kwargs):
+        if service is None:
+            return type.__call__(cls, object_id, workspace_id, *args, **kwargs)
+        obj = service.interned(cls, object_id, workspace_id)
+        if obj is None:
+            obj = type.__call__(cls, object_id, workspace_id, service=service, *args, **kwargs)
+            service.intern(obj)
+        return obj
+
+
 class StoredObject(object):
     """
     A class representing any object stored in our environment (D.o.E. KBase), having an object_id and a workspace_id
+
+    StoredObjects constructed with a service are interned: there is one instance per class and identity for a service,
+    until the service saves over that identity.
     """
+    __metaclass__ = _Interned
     # Class Variables
     storedType = None
 
@@ -22,6 +93,7 @@ class StoredObject(object):
         self._name = None
         self._data = None  # BE MINDFUL OF THIS. IF YOU FIND A BUG CAUSED BY THIS NAMING, CHANGE IT
         self._ver = None
+        self._subsets = dict()  # included paths -> data with only those paths. see get_subset
         self._check_rep()
         self.service = service  # Ugly. The service managing this object (has ws client). A refactor can remove this
 
@@ -38,7 +110,7 @@ class StoredObject(object):
                 return self.__dict__['_data']
         elif item is 'name':
             if self.__dict__['_name'] is None:
-                self.get_object()
+                self.get_info()
                 return self.__dict__['_name']
             else:
                 return self.__dict__['_name']
@@ -54,7 +126,6 @@ class StoredObject(object):
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.identity == other.identity
-        # TODO: THIS ILLUSTRATES WHY YOU SHOULD USE AN INTERNING DESIGN PATTERN
 
     def __hash__(self):
         return hash(self.identity)
@@ -93,9 +164,63 @@ class StoredObject(object):
         return self.data
         # TODO: Clone/Copy
 
+    def get_subset(self, included):
+        """
+        Returns the data of our object with only the included paths (a projection), fetching only those from the stored
+        environment. Returns the whole data if it is loaded already. Subclasses declare the projections they use
+        (e.g. FBA.objective_only)
+
+        :param included: list<str> paths into the object, e.g. ['objectiveValue'] or ['modelreactions/[*]/id']
+        :return dict: the data, with at least the included paths
+        """
+        if self._data is not None:
+            return self._data
+        key = tuple(included)
+        if key not in self._subsets:
+            self._check_rep()
+            data, info = self.service.get_object(self.object_id, self.workspace_id, included=list(included))
+            self._subsets[key] = data
+            self._name = info[1]
+            self._ver = info[4]
+        return self._subsets[key]
+
+    @staticmethod
+    def prefetch(objects):
+        """
+        Loads the data of many StoredObjects with one request per service (see Service.get_objects), for objects that
+        will be read soon. Objects whose data is already loaded (and None entries) are skipped
+
+        :param objects: list of StoredObjects
+        """
+        by_service = dict()
+        for obj in objects:
+            if obj is not None and obj._data is None:
+                by_service.setdefault(obj.service, []).append(obj)
+        for service, service_objects in by_service.items():
+            results = service.get_objects([obj.identity for obj in service_objects])
+            for obj, (data, info) in zip(service_objects, results):
+                obj._data = data
+                obj._name = info[1]
+                obj._ver = info[4]
+
+    def get_info(self):
+        """
+        Returns the info of our object (name, version, type, etc.) from its stored environment, without its data
+        :return list: the object_info of the object, as from the workspace service's get_object_info_new
+
+        Sets the name and, if the data isn't loaded, the version, so name and reference() don't need the data.
+        """
+        self._check_rep()
+        info = self.service.get_info(self.workspace_id, objid=self.object_id)
+        self._name = info[1]
+        if self._data is None:
+            # a version loaded with the data stays the version of that data
+            self._ver = info[4]
+        return info
+
     def reference(self):
         if self._ver is None:
-            self.get_object()
+            self.get_info()
         return {OBJECT_ID: self.object_id,
                 WORKSPACE_ID: self.workspace_id,
                 'version': self._ver,
@@ -103,7 +228,8 @@ class StoredObject(object):
     @classmethod
     def save(cls, stored_data, workspace_id, service, objid=None, name=None, typestr=None):
         """
-        Saves data into the service and returns a StoredObject representing that data
+        Saves data into the service and returns a StoredObject representing that data. The object keeps stored_data as
+        its data (and is interned with it), so reading it doesn't download what was just saved
 
         :param stored_data: the data representing the object to be saved
         :param stored_type: the string type of the object to be saved
@@ -118,7 +244,10 @@ class StoredObject(object):
         if typestr is not None:
             argtype = typestr
         info = service.save_object(stored_data, argtype, workspace_id, objid=objid, name=name)
-        return cls(info[0], info[1])
+        obj = cls(info[0], info[1], service=service)
+        if obj._data is None:
+            obj._data = stored_data
+        return obj
 
     @classmethod
     def construct(cls, arguments):
@@ -135,6 +264,8 @@ class StoredObject(object):
         return self.__class__(object_id, workspace_id, service=service)  # TODO: more pragmatic way than unpacking the KBase info_list?
 
     def _check_rep(self):
+        if not _validating():
+            return
         a = self.object_id
         b = self.workspace_id
         if not (a is not None and b is not None):
@@ -166,15 +297,41 @@ class FBAModel(StoredObject):
     Parent Classes: StoredObject -> FBAModel
     """
     storedType = types()['FBAModel']
+    # projections (see get_subset)
+    reactions_only = ['modelreactions']
 
     DEFAULT_BIOCHEM = Biochemistry(6, 489)
 
+    def __init__(self, object_id, workspace_id, service=None):
+        super(FBAModel, self).__init__(object_id, workspace_id, service=service)
+        self._stoichiometry = None
+
+    def stoichiometry(self):
+        """
+        Returns the Stoichiometry (sparse stoichiometric matrix, index maps and flux bounds) of this model
+
+        Built once per object version. Call invalidate_stoichiometry() after editing self.data in place
+        :return: Stoichiometry
+        """
+        data = self.data
+        if self._stoichiometry is None or self._stoichiometry[0] != self._ver:
+            self._stoichiometry = (self._ver, Stoichiometry(data))
+        return self._stoichiometry[1]
+
+    def invalidate_stoichiometry(self):
+        """
+        Drops the cached Stoichiometry of this model, so the next call to stoichiometry() rebuilds it
+        """
+        self._stoichiometry = None
+
     def get_reactions(self):
         """
         Returns a list of ModelReaction objects representing this model's reactions
+
+        Uses the model's data if it is already loaded (e.g. by prefetch), otherwise fetches only the reactions. Each ModelReaction gets its own copy of its
+        reaction, so setting its fields doesn't change the model's data
         """
-        model_obj = self.get_object()
-        return [ModelReaction(r) for r in model_obj['modelreactions']]  # Potentially Wasteful but maintains D.R.Y.
+        return [ModelReaction(dict(r)) for r in self.get_subset(FBAModel.reactions_only)['modelreactions']]
 
     def get_features(self):
         """
@@ -188,7 +345,7 @@ class FBAModel(StoredObject):
         return features
 
 
-class ModelReaction:
+class ModelReaction(object):
     """
     a class representing a reaction in an FBAModel. Has a GPR, Compounds, etc.
     """
@@ -199,8 +356,21 @@ class ModelReaction:
         :param reaction_obj: the dictionary representing the reaction as it is in the FBAModel
         :return:
         """
-        self.gpr = Gpr(reaction_obj)
         self.data = reaction_obj
+        self._gpr = None
+
+    @property
+    def gpr(self):
+        """
+        the Gpr of the reaction, read from its data on first use
+        """
+        if self._gpr is None:
+            self._gpr = Gpr(self.data)
+        return self._gpr
+
+    @gpr.setter
+    def gpr(self, gpr):
+        self._gpr = gpr
 
     # TODO add features from Reactions Module
 
@@ -355,25 +525,201 @@ class Compound(object):
         return self.get_info()['name']
 
 
-class Gpr:
+class FeatureRegistry(object):
+    """
+    interns the features of a genome as bit positions, so that sets of features can be integer bitmasks (see Gpr)
+
+    Features are only ever added, so a mask stays valid for the life of its registry. Get the registry for a genome
+    with FeatureRegistry.get rather than constructing one. A registry lives as long as the gprs that use it: once none
+    do, it's freed, and the next get for its genome starts a new one.
+    """
+    # registries by key, weakly referenced so that the features of genomes no longer in use don't accumulate
+    _registries = weakref.WeakValueDictionary()
+    _registries_lock = threading.Lock()
+
+    def __init__(self, key=None):
+        self.key = key
+        self.features = list()
+        self.bits = dict()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return 'FeatureRegistry: ' + str(self.key) + ' (' + str(len(self.features)) + ' features)'
+
+    def __repr__(self):
+        return str(self)
+
+    def __deepcopy__(self, memo):
+        # masks are only meaningful against the registry that made them, so copies of gprs share it
+        return self
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get(key=None):
+        """
+        returns the registry for a genome
+
+        :param key: (optional) identifies the genome, e.g. the genome reference of its feature_refs. Default is the
+            registry shared by features of unknown genomes
+        """
+        registry = FeatureRegistry._registries.get(key)
+        if registry is None:
+            with FeatureRegistry._registries_lock:
+                registry = FeatureRegistry._registries.setdefault(key, FeatureRegistry(key))
+        return registry
+
+    def bit(self, feature):
+        """
+        returns the mask of a single feature, interning the feature if it's new
+        """
+        bit = self.bits.get(feature)
+        if bit is None:
+            with self._lock:
+                bit = self.bits.get(feature)
+                if bit is None:
+                    bit = 1 << len(self.features)
+                    self.features.append(feature)
+                    self.bits[feature] = bit
+        return bit
+
+    def mask(self, features):
+        """
+        returns the mask of a collection of features, interning any that are new
+        """
+        mask = 0
+        for f in features:
+            mask |= self.bit(f)
+        return mask
+
+    def known_mask(self, features):
+        """
+        returns the mask of a collection of features, or None if any of them has never been interned
+        """
+        mask = 0
+        for f in features:
+            bit = self.bits.get(f)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def unmask(self, mask):
+        """
+        returns the frozenset of the features in a mask
+        """
+        return frozenset([self.features[bit.bit_length() - 1] for bit in _bits(mask)])
+
+
+def _genome_key(feature_ref):
+    # the genome part of a feature reference, e.g. '1/2/3' of '1/2/3/features/id/kb|g.587.peg.1'
+    i = feature_ref.rfind('/features/')
+    return feature_ref[:i] if i >= 0 else None
+
+
+def _protein(subunits):
+    # the canonical form of a protein: a sorted tuple of distinct subunit masks
+    return tuple(sorted(set(subunits)))
+
+
+def _protein_mask(protein):
+    mask = 0
+    for sub in protein:
+        mask |= sub
+    return mask
+
+
+# the proteins of a gpr with no features: one protein of one empty subunit
+_NO_FEATURES = frozenset([(0,)])
+# gprs with more proteins than this find redundant proteins through an index of proteins by feature
+_INDEXED_PROTEINS = 8
+# parsed gprs, least recently used first: (registry ref, _proteins_key) -> (registry ref, proteins, gpr_type). Registries
+# are weakly referenced, so the memo doesn't keep them alive, and entries whose registry is gone are parsed again
+_parsed = collections.OrderedDict()
+_parsed_lock = threading.Lock()
+# the most entries _parsed keeps
+_PARSED_SIZE = 100000
+
+
+def _ref(registry):
+    return None if registry is None else weakref.ref(registry)
+
+
+def _deref(ref):
+    return None if ref is None else ref()
+
+
+def _get_parsed(key):
+    # the (registry, proteins, gpr_type) memoized for key, or None
+    with _parsed_lock:
+        parsed = _parsed.pop(key, None)
+        if parsed is None:
+            return None
+        registry = _deref(parsed[0])
+        if registry is None:
+            return None
+        _parsed[key] = parsed
+    return registry, parsed[1], parsed[2]
+
+
+def _put_parsed(key, registry, proteins, gpr_type):
+    with _parsed_lock:
+        _parsed.pop(key, None)
+        _parsed[key] = (_ref(registry), proteins, gpr_type)
+        while len(_parsed) > _PARSED_SIZE:
+            _parsed.popitem(last=False)
+
+
+def _proteins_key(rxn_proteins):
+    # a hashable copy of a reaction's modelReactionProteins, of everything Gpr reads from them
+    return tuple([(p['note'], tuple([tuple(u['feature_refs']) for u in p['modelReactionProteinSubunits']]))
+                  for p in rxn_proteins])
+
+
+class Gpr(object):
     """
     a class representing the Gene -> Protein -> Reaction relationship for a ModelReaction in a model
+
+    Features are interned in a FeatureRegistry, a subunit is the bitmask of its features (any one of which fills it),
+    a protein is a tuple of its subunit masks (all of which it needs) and the gpr is a frozenset of proteins (any one of
+    which catalyzes the reaction), so that the set checks of merging are integer operations. self.gpr, the same as a
+    frozenset of proteins, each a frozenset of subunits, each a frozenset of features, is built on first use.
     """
 
-    def __init__(self, reaction=None):
+    def __init__(self, reaction=None, registry=None):
         """
         creates a GPR object that represent the gene-protein-reaction relationship for a ModelReaction
+
+        :param reaction: (optional) the ModelReaction data to read the gpr of
+        :param registry: (optional) the FeatureRegistry to intern features in. Default is the one for the genome of
+            the reaction's features
         """
+        self.registry = registry
+        self.gpr_type = None
+        self._set_proteins(None)
         if reaction is not None:
-            self.gpr, self.gpr_type = self._gpr_set(reaction)
-            self.ftrs = self._feature_set()
-            if self.gpr_type is None:
-                if len(self.ftrs) > 0:
-                    self.gpr_type = 'genes'
-                else:
-                    self.gpr_type = 'no-gene'
-        else:
-            self.gpr = None
+            # reactions with the same proteins (e.g. in the source, translated and reconstructed models) parse once
+            key = (_ref(registry), _proteins_key(reaction['modelReactionProteins']))
+            parsed = _get_parsed(key)
+            if parsed is None:
+                proteins, self.gpr_type = self._parse(reaction)
+                self._set_proteins(proteins)
+                if self.gpr_type is None:
+                    if self._mask != 0:
+                        self.gpr_type = 'genes'
+                    else:
+                        self.gpr_type = 'no-gene'
+                _put_parsed(key, self.registry, proteins, self.gpr_type)
+            else:
+                self.registry, proteins, self.gpr_type = parsed
+                self._set_proteins(proteins)
         self._check_rep()
 
     def __str__(self):
@@ -410,6 +756,8 @@ class Gpr:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
+            if self.registry is other.registry:
+                return self._proteins == other._proteins
             return self.gpr == other.gpr
         else:
             return False
@@ -420,31 +768,74 @@ class Gpr:
     def __unicode__(self):
         return unicode(str(self))
 
-    @staticmethod
-    def _gpr_set(rxn_object):
+    @property
+    def gpr(self):
         """
-        creates the gpr set for the self.gpr field. Intended to only be called once
+        the gpr as a frozenset of proteins, each a frozenset of subunits, each a frozenset of features
 
         A gpr with no features is a frozenset(frozenset(frozenset()))
         """
-        reaction = rxn_object
-        rxn_proteins = reaction['modelReactionProteins']
+        if self._gpr is None and self._proteins is not None:
+            unmask = self.registry.unmask
+            self._gpr = frozenset([frozenset([unmask(sub) for sub in protein]) for protein in self._proteins])
+        return self._gpr
+
+    @gpr.setter
+    def gpr(self, gpr_set):
+        if gpr_set is None:
+            self._set_proteins(None)
+            return
+        if self.registry is None:
+            self.registry = FeatureRegistry.get()
+        mask = self.registry.mask
+        self._set_proteins(frozenset([_protein([mask(sub) for sub in protein]) for protein in gpr_set]))
+
+    @property
+    def ftrs(self):
+        """
+        the frozenset of the features in the gpr
+        """
+        if self._ftrs is None and self._proteins is not None:
+            self._ftrs = self.registry.unmask(self._mask)
+        return self._ftrs
+
+    def _set_proteins(self, proteins):
+        # replaces the proteins, dropping the views built from the old ones
+        self._proteins = proteins
+        self._mask = 0
+        if proteins is not None:
+            for protein in proteins:
+                self._mask |= _protein_mask(protein)
+        self._gpr = None
+        self._ftrs = None
+
+    def _parse(self, rxn_object):
+        """
+        reads the proteins of a ModelReaction, for self._proteins. Intended to only be called once
+        """
+        rxn_proteins = rxn_object['modelReactionProteins']
         prots = set()
-        for i in range(0, len(rxn_proteins)):
+        for rxn_protein in rxn_proteins:
+            if rxn_protein['note'] == u'spontaneous' or rxn_protein['note'] == u'universal':
+                prots = set()
+                note = rxn_protein['note']
+                break
             prot = set()
-            if rxn_proteins[i]['note'] == u'spontaneous' or rxn_proteins[i]['note'] == u'universal':
-                return frozenset([frozenset([frozenset([])])]), rxn_proteins[i]['note']
-            subunits = rxn_proteins[i]['modelReactionProteinSubunits']
-            for j in range(0, len(subunits)):
-                unit = subunits[j]
-                ftrs = [f.split('/')[-1] for f in unit['feature_refs']]
-                if len(ftrs) > 0:
-                    prot.add(frozenset(ftrs))
+            for unit in rxn_protein['modelReactionProteinSubunits']:
+                refs = unit['feature_refs']
+                if len(refs) > 0:
+                    if self.registry is None:
+                        self.registry = FeatureRegistry.get(_genome_key(refs[0]))
+                    prot.add(self.registry.mask([f.split('/')[-1] for f in refs]))
             if len(prot) > 0:
-                prots.add(frozenset(prot))
+                prots.add(_protein(prot))
+        else:
+            note = None
+        if self.registry is None:
+            self.registry = FeatureRegistry.get()
         if len(prots) > 0:
-            return frozenset(prots), None
-        return frozenset([frozenset([frozenset([])])]), None
+            return frozenset(prots), note
+        return _NO_FEATURES, note
 
     def __iter__(self):
         """
@@ -453,14 +844,6 @@ class Gpr:
         if self.gpr is not None:
             return self.gpr.__iter__()
 
-    def _feature_set(self):
-        features = set()
-        for protein in self.gpr:
-            for sub in protein:
-                for f in sub:
-                    features.add(f)
-        return frozenset(features)
-
     def features(self):
         """
         returns a set of the features in this gpr
@@ -474,7 +857,8 @@ class Gpr:
         returns true if the feature is somewhere in the gpr (features of the string form 'kb|g.587.peg.1234')
         :param feature: the feature in question. e.g: 'kb|g.587.peg.123'
         """
-        return feature in self.ftrs
+        bit = self.registry.bits.get(feature)
+        return bit is not None and self._mask & bit != 0
 
     def contains_protein(self, protein):
         """
@@ -482,32 +866,35 @@ class Gpr:
         of features)
         :param protein: the protein in question e.g. frozenset(frozenset('kb|g.587.peg.1234'))
         """
-        return protein in self.gpr
+        subunits = [self.registry.known_mask(sub) for sub in protein]
+        return None not in subunits and _protein(subunits) in self._proteins
 
     def contains_subunit(self, subunit):
         """
         returns true if the subunit is in a protein in the gpr (subunits are frozen sets of features)
         :param subunit:
         """
-        for protein in self.gpr:
-            if subunit in protein:
+        sub = self.registry.known_mask(subunit)
+        if sub is None:
+            return False
+        for protein in self._proteins:
+            if sub in protein:
                 return True
         return False
 
     def merge(self, other_gpr):
         # if at least one is None, attempt to return a possibly non-None one
-        gpr_set1 = self.gpr
-        gpr_set2 = other_gpr.gpr
-        if gpr_set1 is None or gpr_set2 is None:
-            if gpr_set1 is None:
-                return gpr_set2
-            return gpr_set1
-        g1 = gpr_set1
-        g2 = set(gpr_set2)
+        if self._proteins is None or other_gpr._proteins is None:
+            if self._proteins is None:
+                return other_gpr.gpr
+            return self.gpr
+        g1 = self._proteins
+        g2 = set(other_gpr._proteins_in(self.registry))
         examine_gpr = False
         # enclosing set is the set of proteins
         for protein in g1:
             if protein not in g2:
+                protein_mask = _protein_mask(protein)
                 matched_protein = False
                 proteins_to_remove = set()
                 proteins_to_add = set()
@@ -515,8 +902,7 @@ class Gpr:
                 for g2_protein in g2:
                     # if they share a subunit or any feature (catches homolog and subunit cases)
                     # AND they are equal in number of subunits
-                    if len(protein) == len(g2_protein) and len(self._unnest_sets(protein) &
-                                                                       self._unnest_sets(g2_protein)) != 0:
+                    if len(protein) == len(g2_protein) and protein_mask & _protein_mask(g2_protein) != 0:
                         proteins_to_remove.add(g2_protein)
                         prot = set(g2_protein)
                         matched_protein = True
@@ -525,16 +911,15 @@ class Gpr:
                         for subunit in protein:
                             if subunit not in g2_protein:
                                 for other in g2_protein:
-                                    if len(subunit & other) != 0:
+                                    if subunit & other != 0:
                                         matched_sub = True
-                                        prot.remove(other)
-                                        new_sub = subunit.union(other)
+                                        prot.discard(other)
+                                        new_sub = subunit | other
                                         if new_sub in prot:
                                             examine_gpr = True
                                         else:
-                                            prot.add(frozenset(subunit.union(other)))
-                                        if frozenset(prot) not in proteins_to_add:
-                                            proteins_to_add.add(frozenset(prot))
+                                            prot.add(new_sub)
+                                        proteins_to_add.add(_protein(prot))
                         if not matched_sub:
                             proteins_to_remove.remove(g2_protein)
                             # do nothing, but better other solutions should be
@@ -544,12 +929,12 @@ class Gpr:
                             # stronger/weaker
 
                 assert (len(proteins_to_remove) > 0 or not matched_protein or (matched_protein and not matched_sub))
-                g2 = g2 - set(proteins_to_remove)
-                g2 |= set(proteins_to_add)
+                g2 -= proteins_to_remove
+                g2 |= proteins_to_add
                 # Simple Case, proteins don't conflict
                 if not matched_protein or not matched_sub:
                     g2.add(protein)
-        return_gpr = self.new_gpr(frozenset(g2))
+        return_gpr = Gpr._of(frozenset(g2), self.registry)
         return_gpr.remove_redundancy()
         if examine_gpr:
             return_gpr.gpr_type = u'potential merge conflict'
@@ -559,74 +944,134 @@ class Gpr:
         return_gpr._check_rep()
         return return_gpr
 
+    @staticmethod
+    def merge_all(pairs, registry=None):
+        """
+        merges the gprs of many pairs of reactions (e.g. of every reaction a translated and a reconstructed model have
+        in common), as gpr1.merge(gpr2) for each (gpr1, gpr2) would
+
+        The gprs are merged in one registry, each distinct pair of gprs is merged once, and a pair of identical gprs
+        isn't merged at all (the merge of a gpr with itself is the gpr, less its redundant proteins)
+
+        :param pairs: list of (Gpr, Gpr) e.g. [(trans_rxn.gpr, recon_rxn.gpr), ...]
+        :param registry: (optional) the FeatureRegistry to merge in. Default is that of the first gpr with features
+        :return: (list of the merged Gprs, in the order of pairs; list of the indices of the pairs whose merged gpr
+            isn't the same as their first gpr)
+        """
+        merged = list()
+        conflicts = list()
+        merges = dict()  # (proteins1, proteins2) -> (proteins, gpr_type) of their merge
+        for i, (gpr1, gpr2) in enumerate(pairs):
+            if gpr1._proteins is None or gpr2._proteins is None:
+                merged.append(gpr1.merge(gpr2))
+                if gpr1 != merged[-1]:
+                    conflicts.append(i)
+                continue
+            if registry is None:
+                registry = next((g.registry for pair in pairs for g in pair if g._mask != 0), gpr1.registry)
+            proteins1 = gpr1._proteins_in(registry)
+            proteins2 = gpr2._proteins_in(registry)
+            key = (proteins1, proteins2)
+            if key in merges:
+                result = Gpr._of(merges[key][0], registry)
+                result.gpr_type = merges[key][1]
+            else:
+                if proteins1 == proteins2:
+                    result = Gpr._of(proteins1, registry)
+                    result.remove_redundancy()
+                    result.gpr_type = u'merge'
+                else:
+                    first = gpr1 if gpr1.registry is registry else Gpr._of(proteins1, registry)
+                    result = first.merge(gpr2)
+                merges[key] = (result._proteins, result.gpr_type)
+            result.parents = (gpr1, gpr2)
+            merged.append(result)
+            if result._proteins != proteins1:
+                conflicts.append(i)
+        return merged, conflicts
+
     def remove_redundancy(self):
         """
         finds proteins that are subsets of each other and removes the smaller one
 
         e.g. ((a or b)) or ((a or b or c or d)) ==> ((a or b or c or d))
         performing this check prevents redundancy and helps ensure symmetry in T.merge(R) == R.merge(T)
-        """
-        matches = dict()
-        for protein in self.gpr:
-            for protein2 in self.gpr:
-                if protein != protein2 and self._unnest_sets(protein).issubset(self._unnest_sets(protein2)):
-                    matches[protein] = protein2
-        for protein in matches:
-            # we know that all features in prot are in protein2
-            protein2 = copy.deepcopy(matches[protein])
-            matched_subs = set()
-            for sub in protein:
-                # sub should be a subset of a sub in p2
-                for sub2 in protein2:
-                    if sub.issubset(sub2):
-                        matched_subs.add(sub2)
-                        protein2 = protein2 - sub2
-            if len(matched_subs) == len(matches[protein]):
-                assert matched_subs == matches[protein]
-                i = len(self.gpr)
-                self.gpr = self.gpr - frozenset([protein])
-                assert len(self.gpr) == i - 1
+
+        A protein is removed when another has all of its features and each of the other's subunits holds one of its
+        subunits. Of proteins that would remove each other, one is kept. Only proteins sharing a feature can have all
+        of a protein's features, so candidates are looked up in an index of the proteins with each feature.
+        """
+        proteins = list(self._proteins)
+        if len(proteins) < 2:
+            return
+        masks = [_protein_mask(p) for p in proteins]
+        everything = range(len(proteins))
+        index = None  # feature bit -> indices of the proteins with that feature. Small gprs just check every pair
+        if len(proteins) > _INDEXED_PROTEINS:
+            index = dict()
+            for i, mask in enumerate(masks):
+                for bit in _bits(mask):
+                    index.setdefault(bit, []).append(i)
+        kept = set(everything)
+        for i, protein in enumerate(proteins):
+            candidates = everything
+            if index is not None:
+                # any protein with all of this one's features has its rarest one
+                candidates = min([index[bit] for bit in _bits(masks[i])] or [everything], key=len)
+            for j in candidates:
+                if i != j and j in kept and masks[i] & ~masks[j] == 0 and _covers(proteins[j], protein):
+                    kept.remove(i)
+                    break
+        if len(kept) < len(proteins):
+            self._set_proteins(frozenset([proteins[i] for i in kept]))
 
     def is_empty(self):
         self._check_rep()
-        return len(self.ftrs) == 0
+        return self._mask == 0
 
     @staticmethod
-    def new_gpr(gpr_set):
+    def new_gpr(gpr_set, registry=None):
         """
         returns a new gpr with the given gpr_set
         :param gpr_set: the gpr_set to make a gpr from
+        :param registry: (optional) the FeatureRegistry to intern its features in
         """
-        newgpr = Gpr()
+        newgpr = Gpr(registry=registry)
         newgpr.gpr = gpr_set
-        newgpr.ftrs = newgpr._feature_set()
         newgpr._check_rep()
         return newgpr
 
+    @staticmethod
+    def _of(proteins, registry):
+        # a gpr of proteins already encoded in registry
+        gpr = Gpr(registry=registry)
+        gpr._set_proteins(proteins)
+        gpr._check_rep()
+        return gpr
+
+    def _proteins_in(self, registry):
+        # the proteins of this gpr, encoded in registry
+        if registry is self.registry or self._mask == 0:
+            return self._proteins
+        mask = registry.mask
+        return frozenset([_protein([mask(sub) for sub in protein]) for protein in self.gpr])
+
     def _check_rep(self):
         # check rep invariant
-
-        if self.gpr is not None and self.ftrs is None:
+        if self._proteins is None or not _validating():
+            return
+        if self.registry is None:
             raise RepresentationError(self)
-        if hasattr(self, 'ftrs'):
-            feature_set = self._unnest_sets(self.gpr)
-            if len(self.ftrs) == 0 and self.gpr != frozenset([frozenset([frozenset([])])]):
+        mask = 0
+        for protein in self._proteins:
+            if type(protein) is not tuple or len(protein) == 0:
                 raise RepresentationError(self)
-            for f in self.ftrs:
-                if f not in feature_set:
-                    raise RepresentationError(self)
-            for f in feature_set:
-                if not self.contains_feature(f):
-                    raise RepresentationError(self)
-        # verify structure
-        if hasattr(self, 'gpr') and self.gpr is not None:
-            assert type(self.gpr) is frozenset
-            for protein in self.gpr:
-                assert type(protein) is frozenset
-                for sub in protein:
-                    assert type(sub) is frozenset
-                    for ftr in sub:
-                        assert type(ftr) is str or type(ftr) is unicode
+            for sub in protein:
+                mask |= sub
+        if mask != self._mask or mask >> len(self.registry.features) != 0:
+            raise RepresentationError(self)
+        if mask == 0 and self._proteins != _NO_FEATURES:
+            raise RepresentationError(self)
 
     def _unnest_sets(self, nested_set):
         """
@@ -643,6 +1088,25 @@ class Gpr:
         return single_set
 
 
+def _bits(mask):
+    # the single bit masks of the bits set in mask
+    while mask:
+        low = mask & -mask
+        yield low
+        mask ^= low
+
+
+def _covers(protein2, protein):
+    # true if each subunit of protein2 holds all the features of some subunit of protein
+    for sub2 in protein2:
+        for sub in protein:
+            if sub & ~sub2 == 0:
+                break
+        else:
+            return False
+    return True
+
+
 class Genome(StoredObject):
     """
     a class representing a genome in the stored environment
@@ -707,6 +1171,9 @@ class FBA(StoredObject):
     a class representing an FBA result in the stored environment
     """
     storedType = types()['FBA']
+    # projections (see get_subset)
+    objective_only = ['objectiveValue']
+    fluxes_only = ['FBAReactionVariables/[*]/modelreaction_ref', 'FBAReactionVariables/[*]/value']
 
     def __init__(self, object_id, workspace_id, service=None):
         super(FBA, self).__init__(object_id, workspace_id, service=service)
@@ -714,10 +1181,10 @@ class FBA(StoredObject):
 
     def get_objective(self):
         """
-        returns the objective value from the FBA Run
+        returns the objective value from the FBA Run. Fetches only the objective, unless the data is loaded
         :return:
         """
-        return self.data['objectiveValue']
+        return self.get_subset(FBA.objective_only)['objectiveValue']
 
     def get_model(self):
         """
@@ -748,6 +1215,14 @@ class FBA(StoredObject):
                 result.append(r['modelreaction_ref'].split('/')[-1])
         return result
 
+    def reaction_fluxes(self):
+        """
+        returns a dictionary of the model reactions' ids (removal_ids, e.g. rxn00001_c0) to their flux in the FBA
+        :return: dict<str, float>
+        """
+        variables = self.get_subset(FBA.fluxes_only)['FBAReactionVariables']
+        return dict([(r['modelreaction_ref'].split('/')[-1], r['value']) for r in variables])
+
     def primary_exchanges(self):
         """
         Returns the 10
@@ -0,0 +1,89 @@
+import Queue
+import sys
+from multiprocessing.pool import ThreadPool
+
+
+class Pipeline(object):
+    """
+    a set of named stages and their dependencies, run with each stage as soon as the stages it requires have finished
+
+    Stages that don't depend on each other (e.g. translating the source model and reconstructing the target genome,
+    which are independent fba_tools jobs) run concurrently on a thread pool. Stages must be added after the stages they
+    require, so the dependencies always form a DAG.
+    """
+
+    def __init__(self):
+        self.stages = list()
+        self._requires = dict()
+        self._functions = dict()
+
+    def __str__(self):
+        return 'Pipeline: ' + ', '.join(self.stages)
+
+    def __repr__(self):
+        return str(self)
+
+    def add(self, name, function, requires=None):
+        """
+        adds a stage
+
+        :param name: a unique name for the stage
+        :param function: the work of the stage, called with no arguments
+        :param requires: (optional) the names of the stages that must finish before this one starts
+        """
+        if name in self._functions:
+            raise ValueError('Pipeline already has a stage ' + str(name))
+        requires = list(requires) if requires is not None else []
+        for r in requires:
+            if r not in self._functions:
+                raise ValueError('stage ' + str(name) + ' requires ' + str(r) + ', which must be added first')
+        self.stages.append(name)
+        self._requires[name] = requires
+        self._functions[name] = function
+
+    def run(self, processes=None):
+        """
+        runs every stage, in dependency order, concurrently where the dependencies allow
+
+        If a stage raises, no further stages are started, the running ones are finished, and the first exception is
+        re-raised.
+
+        :param processes: (optional) the number of threads to run stages on. Default is one per stage
+        """
+        if len(self.stages) == 0:
+            return
+        pending = list(self.stages)
+        done = set()
+        finished = Queue.Queue()
+        running = 0
+        error = None
+        pool = ThreadPool(processes if processes is not None else len(self.stages))
+        try:
+            while len(pending) > 0 or running > 0:
+                if error is None:
+                    for name in [n for n in pending if all(r in done for r in self._requires[n])]:
+                        pending.remove(name)
+                        pool.apply_async(_run_stage, (name, self._functions[name]), callback=finished.put)
+                        running += 1
+                if running == 0:
+                    break
+                name, exc_info = finished.get()
+                running -= 1
+                if exc_info is None:
+                    done.add(name)
+                elif error is None:
+                    error = exc_info
+        finally:
+            pool.close()
+            pool.join()
+        if error is not None:
+            raise error[0], error[1], error[2]
+
+
+def _run_stage(name, function):
+    # exceptions are handed back to Pipeline.run, with their tracebacks, rather than lost in the pool
+    try:
+        function()
+    except Exception:
+        return name, sys.exc_info()
+    return name, None
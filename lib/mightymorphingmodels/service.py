@@ -1,8 +1,12 @@
+import Queue
 import random
+import sys
+import threading
+import weakref
 
-from fba_tools.fba_toolsClient import fba_tools
-from Workspace.WorkspaceClient import Workspace
-from Workspace.baseclient import ServerError
+from asyncservice import Future
+from clients import FBAToolsClient, ServerError, WorkspaceClient
+from objectcache import ObjectCache, DEFAULT_MAX_BYTES
 
 # =====================================================================================================================
 # Type Strings From KBase
@@ -21,12 +25,66 @@ def types():
 # TODO: More pragmatic approach, have these stored in some sort of XML or plain text file that can be read in
 # =====================================================================================================================
 
+# Default thresholds for saving the objects queued by Service.save_object_later: objects per workspace, and seconds
+DEFAULT_SAVE_BATCH_SIZE = 20
+DEFAULT_SAVE_DELAY = 0.5
+
+
 class Service:
-    def __init__(self, fba_url, ws_url, ctx):
-        self.ws_client = Workspace(ws_url, token=ctx['token'])
-        self.fba_client = fba_tools(fba_url)
+    def __init__(self, fba_url, ws_url, ctx, cache_dir=None, cache_size=DEFAULT_MAX_BYTES,
+                 save_batch_size=DEFAULT_SAVE_BATCH_SIZE, save_delay=DEFAULT_SAVE_DELAY):
+        """
+        :param fba_url: url of the fba_tools service
+        :param ws_url: url of the workspace service
+        :param ctx: the call context, holding the user's token
+        :param cache_dir: (optional) directory for an on disk ObjectCache of fetched objects (e.g. under scratch).
+            Default is no cache
+        :param cache_size: (optional) bound on the size of the cache, in bytes
+        :param save_batch_size: (optional) the number of queued saves to a workspace to save at once (see
+            save_object_later)
+        :param save_delay: (optional) the most seconds a queued save waits for others to join it
+        """
+        self.ws_client = WorkspaceClient(ws_url, token=ctx['token'])
+        self.fba_client = FBAToolsClient(fba_url)
+        self.cache = ObjectCache(cache_dir, max_bytes=cache_size) if cache_dir is not None else None
+        self._interned = weakref.WeakValueDictionary()
+        self.save_batch_size = save_batch_size
+        self.save_delay = save_delay
+        self._saves = dict()
+        self._saves_lock = threading.Lock()
+        self._save_timer = None
+        # the queue of batches for the thread that saves them, and the thread, while it runs
+        self._batches = None
+        self._saver = None
+
+    def __deepcopy__(self, memo):
+        # a Service (its clients, cache and interned objects) is shared by everything copied from it, e.g. the copy of
+        # a Morph that starts its Log
+        return self
+
+    def interned(self, cls, objid, wsid):
+        """
+        returns the interned StoredObject of class cls for (objid, wsid), or None if there isn't one
+        """
+        return self._interned.get((cls, str(objid), str(wsid)))
 
-    def get_object(self, objid, wsid, name=None):
+    def intern(self, obj):
+        """
+        interns a StoredObject, so that constructing another of its class and identity with this service returns it
+        (and its loaded data) instead. Interned objects are dropped when they are saved over, or no longer referenced
+        """
+        self._interned[(obj.__class__, str(obj.object_id), str(obj.workspace_id))] = obj
+
+    def forget(self, objid, wsid):
+        """
+        drops the interned StoredObjects for (objid, wsid), e.g. after saving a new version of it. Existing instances
+        keep the data they loaded
+        """
+        for key in self._interned.keys():
+            if key[1:] == (str(objid), str(wsid)):
+                self._interned.pop(key, None)
+
+    def get_object(self, objid, wsid, name=None, included=None):
         """
         Returns an object and it's associated KBase information
 
@@ -72,15 +130,60 @@ class Service:
         :param name: (optional) the name for the object to be retrieved. if included, favored over ID
         :param wsid: the workspace to retrieve the object from
         :param objid: the id of the object to be retrieved
-
-        """
-        if name is None:
-            result = self.ws_client.get_objects2({'objects': [{'objid': objid, 'workspace': wsid}]})['data'][0]
+        :param included: (optional) list of paths into the object (e.g. 'objectiveValue' or 'modelreactions/[*]/id')
+            to fetch, rather than the whole object. The data returned has only these paths
+
+        With a cache, the object's current version is looked up first (see get_info), and the data is only downloaded
+        if that version isn't cached.
+        """
+        if self.cache is not None:
+            info = self.get_info(wsid, objid=objid, name=name)
+            cached = self.cache.get(info[6], info[0], info[4], included=included)
+            if cached is not None:
+                return cached
+            # fetch exactly the version that was looked up
+            spec = {'ref': '/'.join([str(info[6]), str(info[0]), str(info[4])])}
+        elif name is None:
+            spec = {'objid': objid, 'workspace': wsid}
         else:
-            result = self.ws_client.get_objects2({'objects': [{'name': name, 'workspace': wsid}]})[0]
+            spec = {'name': name, 'workspace': wsid}
+        if included is not None:
+            spec['included'] = included
+        result = self.ws_client.get_objects2({'objects': [spec]})['data'][0]
+        if self.cache is not None:
+            self.cache.put(info[6], info[0], info[4], result['data'], result['info'], included=included)
         return result['data'], result['info']
 
 
+    def get_objects(self, object_tuples):
+        """
+        Returns many objects and their associated KBase information, fetched in one request
+
+        With a cache, the objects' current versions are looked up in one request, and those not cached are downloaded in
+        one more.
+
+        :param object_tuples: list of (objid, wsid) identities of the objects to retrieve
+        :return: list of (data, info) tuples, in the order of object_tuples
+        """
+        if len(object_tuples) == 0:
+            return []
+        specs = [{'objid': o[0], 'workspace': o[1]} for o in object_tuples]
+        if self.cache is None:
+            results = self.ws_client.get_objects2({'objects': specs})['data']
+            return [(r['data'], r['info']) for r in results]
+        infos = self.ws_client.get_object_info_new({'objects': specs})
+        objects = [self.cache.get(info[6], info[0], info[4]) for info in infos]
+        missing = [k for k in range(len(objects)) if objects[k] is None]
+        if len(missing) > 0:
+            # fetch exactly the versions that were looked up
+            refs = [{'ref': '/'.join([str(infos[k][6]), str(infos[k][0]), str(infos[k][4])])} for k in missing]
+            results = self.ws_client.get_objects2({'objects': refs})['data']
+            for k, result in zip(missing, results):
+                self.cache.put(infos[k][6], infos[k][0], infos[k][4], result['data'], result['info'])
+                objects[k] = (result['data'], result['info'])
+        return objects
+
+
     def get_info(self, wsid, objid=None, name=None):
         if name is None:
             return self.ws_client.get_object_info_new({'objects': [{'objid': objid, 'workspace': wsid}]})[0]
@@ -99,15 +202,130 @@ class Service:
             discretion).
         :param name: (optional) string name for the pbject to be saved
         :return: a list of information about the object as it is stored in KBase
+
+        The object is saved on the calling thread, after the saves queued for the workspace (see save_object_later), so
+        versions of an object are saved in order.
         """
-        sv = {u'data': data, u'type': type, u'name': name}
-        if objid is not None:
-            sv[u'objid'] = objid
-        if name is not None:
-            sv[u'name'] = name
-        info = self.ws_client.save_objects({u'workspace': wsid, u'objects': [sv]})[0]
+        with self._saves_lock:
+            self._send_batch(wsid)
+            batches = self._batches
+        if batches is not None:
+            batches.join()
+        info = self._save(wsid, [_save_spec(data, type, objid, name)])[0]
         return info[0], info[7]
 
+    def save_object_later(self, data, type, wsid, objid=None, name=None):
+        """
+        Queues an object to be saved in KBase, with other queued saves to the same workspace in one save_objects call
+
+        A workspace's queue is saved once it holds save_batch_size objects, save_delay seconds after the first was
+        queued, or on flush_saves(), whichever comes first. Arguments are as for save_object.
+
+        :return: Future for what save_object would return
+        """
+        future = Future()
+        with self._saves_lock:
+            queue = self._queue_save(wsid, _save_spec(data, type, objid, name), future)
+            if len(queue) >= self.save_batch_size:
+                self._send_batch(wsid)
+            elif self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self._save_timeout)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+        return future
+
+    def flush_saves(self, wsid=None):
+        """
+        Starts saving the objects queued by save_object_later now, rather than waiting for a threshold. Their futures
+        have the results
+
+        :param wsid: (optional) the workspace to save the queue of. Default is every workspace
+        """
+        with self._saves_lock:
+            for batch_wsid in ([wsid] if wsid is not None else self._saves.keys()):
+                self._send_batch(batch_wsid)
+
+    def close(self):
+        """
+        saves the objects queued by save_object_later, waits for them, and stops the thread that saves them. The
+        Service can still be used; a later save_object_later starts the thread again
+        """
+        with self._saves_lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer is not None:
+                timer.cancel()
+            for wsid in self._saves.keys():
+                self._send_batch(wsid)
+            batches, saver = self._batches, self._saver
+            self._batches = self._saver = None
+        if timer is not None:
+            timer.join()
+        if batches is not None:
+            batches.put(None)
+            saver.join()
+
+    def _save_timeout(self):
+        with self._saves_lock:
+            if self._save_timer is not threading.current_thread():
+                # close() took over, as this timer fired
+                return
+            self._save_timer = None
+        self.flush_saves()
+
+    def _queue_save(self, wsid, sv, future):
+        # queues a save and returns the workspace's queue. Called with _saves_lock held
+        queue = self._saves.setdefault(wsid, [])
+        if (sv.get(u'objid') is not None or sv.get(u'name') is not None) and \
+                any(q[0].get(u'objid') == sv.get(u'objid') and q[0].get(u'name') == sv.get(u'name') for q in queue):
+            # versions of one object go in separate calls. Batches are saved in order
+            self._send_batch(wsid)
+            queue = self._saves.setdefault(wsid, [])
+        queue.append((sv, future))
+        return queue
+
+    def _send_batch(self, wsid):
+        # hands a workspace's queue to the thread that saves batches, one at a time in the order they're sent. Called
+        # with _saves_lock held
+        batch = self._saves.pop(wsid, [])
+        if len(batch) == 0:
+            return
+        if self._batches is None:
+            self._batches = Queue.Queue()
+            self._saver = threading.Thread(target=self._save_batches, args=(self._batches,), name='save batches')
+            self._saver.daemon = True
+            self._saver.start()
+        self._batches.put((wsid, batch))
+
+    def _save_batches(self, batches):
+        # until close() puts None
+        while True:
+            item = batches.get()
+            try:
+                if item is None:
+                    return
+                self._save_batch(*item)
+            finally:
+                batches.task_done()
+
+    def _save_batch(self, wsid, batch):
+        try:
+            infos = self._save(wsid, [b[0] for b in batch])
+        except Exception:
+            exc_info = sys.exc_info()
+            for sv, future in batch:
+                future._finish(exc_info=exc_info)
+            return
+        for info, (sv, future) in zip(infos, batch):
+            future._finish((info[0], info[7]))
+
+    def _save(self, wsid, svs):
+        # saves objects in one call, dropping their interned instances. Returns their infos
+        infos = self.ws_client.save_objects({u'workspace': wsid, u'objects': svs})
+        for info in infos:
+            self.forget(info[0], info[7])
+            self.forget(info[0], info[6])
+        return infos
+
 
     def list_objects(self, workspace_id, typestr=None):
         """
@@ -161,6 +379,8 @@ class Service:
         info = self.ws_client.copy_object({'from': {'workspace': from_tuple[1],
                                                'objid': from_tuple[0]},
                                       'to': {'workspace': to_tuple[1], 'name': to_tuple[0]}})
+        self.forget(info[0], info[7])
+        self.forget(info[0], info[6])
         return info[0], info[7]
 
 
@@ -173,6 +393,9 @@ class Service:
         :param name: (optional) name for new model. KBase will overwrite original if left unspecified.
         :return: the information for a new gap-filled model
         """
+        return self._wait(self._gapfill_model_job(model, media, workspace=workspace))
+
+    def _gapfill_model_job(self, model, media, workspace=None):
         if workspace is None:
             workspace = model.workspace_id
         params = {u'fbamodel_id': str(model.object_id),
@@ -182,8 +405,21 @@ class Service:
                   u'media_id': media.object_id,
                   u'media_workspace': media.workspace_id,
                   u'comprehensive_gapfill': False}
-        self.fba_client.gapfill_metabolic_model(params)
-        return model.object_id, model.workspace_id
+
+        def done(info):
+            self.forget(model.object_id, model.workspace_id)
+            return model.object_id, model.workspace_id
+        return 'gapfill_metabolic_model', params, done
+
+    def _wait(self, job):
+        """
+        runs an fba_tools job, as described by a _*_job method, and waits for it
+
+        :param job: tuple (method, params, done) the fba_tools method, its params, and a function of the method's result
+            returning the result of the Service call
+        """
+        method, params, done = job
+        return done(self.fba_client.run(method, params))
 
 
     def _gapfill_solution(self, fba):
@@ -209,15 +445,20 @@ class Service:
         return {u'media': str(media.object_id), u'media_workspace': str(media.workspace_id)}
 
 
-    def runfba(self, model, media, workspace=None):
+    def runfba(self, model, media, workspace=None, name=None):
         """
         runs Flux Balance Analysis on an FBAModel in the fba modeling service
 
         :param model: FBAModel to run flux balance analysis on
         :param media: Media to run FBA with
         :param workspace: (optional) workspace for the FBA object to be left in, default is model workspace
+        :param name: (optional) name for the FBA object, default is the model name + '_fba'. FBAs run at the same time
+            need different names
         :return: tuple identity of the FBA stored in the service
         """
+        return self._wait(self._runfba_job(model, media, workspace=workspace, name=name))
+
+    def _runfba_job(self, model, media, workspace=None, name=None):
         if workspace is None:
             workspace = model.workspace_id
         fba_params = {u'workspace': workspace,
@@ -225,10 +466,13 @@ class Service:
                       u'fbamodel_workspace': model.workspace_id,
                       u'media_workspace': str(media.workspace_id),
                       u'media_id': str(media.object_id),
-                      u'fba_output_id': model.name + '_fba'}
-        info = self.fba_client.run_flux_balance_analysis(fba_params)
-        obj_id = info['new_fba_ref'].split('/')[1]
-        return obj_id, workspace
+                      u'fba_output_id': name if name is not None else model.name + '_fba'}
+
+        def done(info):
+            obj_id = info['new_fba_ref'].split('/')[1]
+            self.forget(obj_id, workspace)
+            return obj_id, workspace
+        return 'run_flux_balance_analysis', fba_params, done
 
 
     def runfva(self, model, media, workspace=None):
@@ -240,13 +484,19 @@ class Service:
         :param workspace: (optional) workspace for the FBA object to be left in, default is model workspace
         :return: tuple identity of the FBA stored in the service
         """
+        return self._wait(self._runfva_job(model, media, workspace=workspace))
+
+    def _runfva_job(self, model, media, workspace=None):
         if workspace is None:
             workspace = model.workspace_id
         fba_params = {u'workspace': workspace, u'model': model.object_id, u'model_workspace': model.workspace_id,
                       u'formulation': self.fba_formulation(media), u'fva': True}
-        info = self.fba_client.runfba(fba_params)
-        obj_id = info['new_fba_ref'].split('/')[1]
-        return obj_id, workspace
+
+        def done(info):
+            obj_id = info['new_fba_ref'].split('/')[1]
+            self.forget(obj_id, workspace)
+            return obj_id, workspace
+        return 'runfba', fba_params, done
 
 
     def translate_model(self, src_model, protcomp, workspace=None):
@@ -256,6 +506,9 @@ class Service:
         :param src_model: FBAModel of source
         return: tuple identity of the translated model stored in the service
         """
+        return self._wait(self._translate_model_job(src_model, protcomp, workspace=workspace))
+
+    def _translate_model_job(self, src_model, protcomp, workspace=None):
         if workspace is None:
             workspace = src_model.workspace_id
         trans_params = {u'keep_nogene_rxn': 1,
@@ -265,9 +518,12 @@ class Service:
                         u'fbamodel_output_id': 'translated_' + src_model.name,
                         u'fbamodel_workspace': src_model.workspace_id,
                         u'workspace': workspace}
-        info = self.fba_client.propagate_model_to_new_genome(trans_params)
-        obj_id = info['new_fbamodel_ref'].split('/')[1]
-        return obj_id, workspace
+
+        def done(info):
+            obj_id = info['new_fbamodel_ref'].split('/')[1]
+            self.forget(obj_id, workspace)
+            return obj_id, workspace
+        return 'propagate_model_to_new_genome', trans_params, done
 
 
     def reconstruct_genome(self, genome, workspace=None):
@@ -277,6 +533,9 @@ class Service:
         :param genome: Genome to draft a reconstruction for
         :return: tuple identity of the draft model stored in the service (FBAModel)
         """
+        return self._wait(self._reconstruct_genome_job(genome, workspace=workspace))
+
+    def _reconstruct_genome_job(self, genome, workspace=None):
         if workspace is None:
             workspace = genome.workspace_id
         recon_params = {u'genome_id': genome.object_id,
@@ -284,14 +543,20 @@ class Service:
                         u'fbamodel_output_id': 'recon_' + genome.name,
                         u'gapfill_model': False,  # TODO parameterize as option
                         u'workspace': workspace}
-        info = self.fba_client.build_metabolic_model(recon_params)
-        # references returned here are sometimes inconsistent from other fba_tools APIs. Fetch obj info from ws service
-        obj_name = info['new_fbamodel_ref'].split('/')[1]
-        try:
-            return int(obj_name), workspace
-        except ValueError:
-            ws_object_info = self.ws_client.get_object_info_new({'objects': [{'name': obj_name, 'workspace': workspace}]})[0]
-            return ws_object_info[0], workspace
+
+        def done(info):
+            # references returned here are sometimes inconsistent from other fba_tools APIs. Fetch obj info from ws
+            # service
+            obj_name = info['new_fbamodel_ref'].split('/')[1]
+            try:
+                obj_id = int(obj_name)
+            except ValueError:
+                ws_object_info = self.ws_client.get_object_info_new(
+                    {'objects': [{'name': obj_name, 'workspace': workspace}]})[0]
+                obj_id = ws_object_info[0]
+            self.forget(obj_id, workspace)
+            return obj_id, workspace
+        return 'build_metabolic_model', recon_params, done
 
 
     def remove_reactions_in_place(self, model, reactions_to_remove):
@@ -317,6 +582,43 @@ class Service:
         return self.save_object(model_data, model_info[2], model.workspace_id, name=model.name)
 
 
+    def remove_reactions(self, model, reactions_to_remove, output_id):
+        """
+        Removes reactions from an FBAModel, saving the result as a new model
+
+        Works from model.data, so a model whose data is already loaded is not fetched again. model.data is not changed.
+
+        :param model: FBAModel to remove reactions from
+        :param reactions_to_remove: reactions to remove (removal_id's)
+        :param output_id: (str) name for the output model
+        :return: info tuple for the new FBAModel in the stored environment
+        """
+        return self.save_object(self.without_reactions(model, reactions_to_remove), types()['FBAModel'],
+                                model.workspace_id, name=output_id)
+
+    def remove_reactions_later(self, model, reactions_to_remove, output_id):
+        """
+        remove_reactions, with the new model queued to be saved (see save_object_later)
+
+        :return: Future for what remove_reactions would return
+        """
+        return self.save_object_later(self.without_reactions(model, reactions_to_remove), types()['FBAModel'],
+                                      model.workspace_id, name=output_id)
+
+    def without_reactions(self, model, reactions_to_remove):
+        """
+        Returns the data of an FBAModel without some reactions, as remove_reactions would save it, without saving it
+
+        :param model: FBAModel to remove the reactions from
+        :param reactions_to_remove: list<str> removal_ids of the reactions to remove
+        :return: dict a shallow copy of the model's data. Only the reaction list is replaced
+        """
+        model_data = dict(model.data)
+        rxns_to_remove = set(reactions_to_remove)
+        model_data['modelreactions'] = [r for r in model_data['modelreactions'] if r['id'] not in rxns_to_remove]
+        return model_data
+
+
     def remove_reaction(self, model, reaction, output_id=None, in_place=False):
         """
 
@@ -368,7 +670,9 @@ class Service:
                         'workspace': workspace or model.workspace_id,
                         'reactions_to_add': reactions_to_add}
         info = self.fba_client.edit_metabolic_model(add_rxn_args)
-        return self._parse_objid_from_ref(info['new_fbamodel_ref']), model.workspace_id
+        obj_id = self._parse_objid_from_ref(info['new_fbamodel_ref'])
+        self.forget(obj_id, model.workspace_id)
+        return obj_id, model.workspace_id
 
 
 
@@ -400,6 +704,7 @@ class Service:
                                 }
                     obj['modelcompounds'].append(compound)
                     cpds = dict([(c['id'], c) for c in obj['modelcompounds']])
+        model.invalidate_stoichiometry()
         if name is not None:
             return self.save_object(obj, types()['FBAModel'], workspace, name=name)
         return self.save_object(obj, types()['FBAModel'], workspace, objid=model.object_id)
@@ -417,6 +722,7 @@ class Service:
                         'workspace': model.workspace_id,
                         'reactions_to_change': reactions_to_change}
         self.fba_client.edit_metabolic_model(change_rxn_args)
+        self.forget(model.object_id, model.workspace_id)
 
     def adjust_directions(self, model, adjustments):
         """
@@ -431,6 +737,7 @@ class Service:
                         'direction': [str(r[1]) for r in adjustments]
                         }
         self.fba_client.adjust_model_reaction(adjust_args)
+        self.forget(model.object_id, model.workspace_id)
 
     def _integrate_gapfill(self, model, solution_fba, workspace=None):
         changes = self._gapfill_solution(solution_fba)
@@ -476,4 +783,12 @@ class Service:
         return ws_id, ws_name
 
     def _parse_objid_from_ref(self, ref):
-        return ref.split('/')[1]
\ No newline at end of file
+        return ref.split('/')[1]
+
+
+def _save_spec(data, type, objid=None, name=None):
+    # an ObjectSaveData for save_objects
+    sv = {u'data': data, u'type': type, u'name': name}
+    if objid is not None:
+        sv[u'objid'] = objid
+    return sv
@@ -0,0 +1,92 @@
+import numpy as np
+from scipy import sparse
+
+# Default bound on the magnitude of a reaction's flux. Mirrors the default fba_tools uses
+DEFAULT_MAX_FLUX = 100.0
+
+
+class Stoichiometry(object):
+    """
+    a sparse stoichiometric matrix for the reactions of an FBAModel
+
+    Rows are compounds and columns are reactions. The model's reactions come first (in the order they are in the
+    model), followed by its biomass reactions. Build one with FBAModel.stoichiometry(), which caches it per object
+    version, rather than directly.
+
+    Attributes:
+        - matrix: (scipy.sparse.csc_matrix) compounds x reactions stoichiometric coefficients
+        - reactions: list<str> column ids, reaction removal_ids (e.g. 'rxn00001_c0') then biomass ids (e.g. 'bio1')
+        - compounds: list<str> row ids, model compound ids (e.g. 'cpd00001_c0')
+        - reaction_index: dict<str, int> reaction id -> column
+        - compound_index: dict<str, int> compound id -> row
+        - lower, upper: (numpy.ndarray) flux bounds per column, derived from reaction directions
+        - biomasses: list<str> ids of the biomass columns
+    """
+
+    def __init__(self, model_data):
+        """
+        :param model_data: the data of an FBAModel (e.g. FBAModel.data)
+        """
+        columns = list()
+        for rxn in model_data['modelreactions']:
+            lower, upper = direction_bounds(rxn['direction'])
+            columns.append((rxn['id'], lower, upper, rxn['modelReactionReagents']))
+        self.biomasses = list()
+        for biomass in model_data.get('biomasses', []):
+            self.biomasses.append(biomass['id'])
+            columns.append((biomass['id'], 0.0, DEFAULT_MAX_FLUX, biomass['biomasscompounds']))
+
+        self.compounds = [c['id'] for c in model_data['modelcompounds']]
+        self.compound_index = dict([(c, i) for i, c in enumerate(self.compounds)])
+        self.reactions = [c[0] for c in columns]
+        self.reaction_index = dict([(r, j) for j, r in enumerate(self.reactions)])
+        self.lower = np.array([c[1] for c in columns], dtype=float)
+        self.upper = np.array([c[2] for c in columns], dtype=float)
+        rows, cols, coefficients = list(), list(), list()
+        for j, column in enumerate(columns):
+            for reagent in column[3]:
+                rows.append(self._row(reagent['modelcompound_ref'].split('/')[-1]))
+                cols.append(j)
+                coefficients.append(reagent['coefficient'])
+        # duplicate entries are summed on conversion
+        self.matrix = sparse.coo_matrix((np.array(coefficients, dtype=float), (rows, cols)),
+                                        shape=(len(self.compounds), len(self.reactions))).tocsc()
+        self.matrix.eliminate_zeros()
+
+    def _row(self, compound_id):
+        # reagents may reference compounds the model doesn't list. give them a row anyway
+        if compound_id not in self.compound_index:
+            self.compound_index[compound_id] = len(self.compounds)
+            self.compounds.append(compound_id)
+        return self.compound_index[compound_id]
+
+    def __str__(self):
+        return 'Stoichiometry: ' + str(len(self.compounds)) + ' compounds x ' + str(len(self.reactions)) + ' reactions'
+
+    def __repr__(self):
+        return str(self)
+
+    def csr(self):
+        """
+        returns the matrix in compressed sparse row form, for compound-wise (row) access
+        """
+        return self.matrix.tocsr()
+
+    def column(self, rxn_id):
+        """
+        returns the (compound_id, coefficient) pairs of a reaction
+        """
+        j = self.reaction_index[rxn_id]
+        start, end = self.matrix.indptr[j], self.matrix.indptr[j + 1]
+        return [(self.compounds[i], c) for i, c in zip(self.matrix.indices[start:end], self.matrix.data[start:end])]
+
+
+def direction_bounds(direction):
+    """
+    returns (lower, upper) flux bounds for a reaction direction as it is in an FBAModel ('>', '<' or '=')
+    """
+    if direction == '>':
+        return 0.0, DEFAULT_MAX_FLUX
+    if direction == '<':
+        return -DEFAULT_MAX_FLUX, 0.0
+    return -DEFAULT_MAX_FLUX, DEFAULT_MAX_FLUX
@@ -22,6 +22,15 @@ module mightymorphingmodels {
       string translate_media_id;
       string output_id;
       string workspace;
+      int knockout;
+      int local_fba;
+      int flux_shortcut;
+      int prescreen;
+      int remove_blocked;
+      int block_size;
+      int speculate;
+      int save_interval;
+      int resume;
     } CallingParams;
 
     typedef structure {
@@ -0,0 +1,189 @@
+"""
+Tests of Future and AsyncService, on a stand in for the Service whose fba_tools jobs finish when the test says so. Run
+from the repository root:
+
+    python -m unittest discover -s test -p 'asyncservice_test.py'
+"""
+import copy
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+from asyncservice import AsyncService, CancelledError, Future
+from clients import JobFuture
+from GrowthConditions import AllMedia
+
+# seconds a test waits for a call before giving up on it
+TIMEOUT = 5.0
+
+
+class _FBAClient(object):
+    """
+    the fba client of _Service: jobs lists the (method, params, JobFuture) of each submitted job, for the test to finish
+    """
+
+    def __init__(self):
+        self.jobs = list()
+
+    def submit(self, method, params):
+        job = JobFuture('fba_tools.' + method, str(len(self.jobs)))
+        self.jobs.append((method, params, job))
+        return job
+
+
+class _Service(object):
+    # the Service calls AsyncService makes for runfba
+    def __init__(self):
+        self.fba_client = _FBAClient()
+
+    def _runfba_job(self, model, media, workspace=None, name=None):
+        def done(result):
+            return 'fba of ' + model, result
+        return 'run_flux_balance_analysis', {'fbamodel_id': model, 'media_id': media}, done
+
+
+class FutureTest(unittest.TestCase):
+
+    def test_result(self):
+        future = Future()
+        self.assertRaises(RuntimeError, future.result, 0.01)
+        called = list()
+        future.add_done_callback(called.append)
+        self.assertTrue(future._finish(5))
+        self.assertEqual((future.result(), future.exception(), called), (5, None, [future]))
+        # the first finish wins
+        self.assertFalse(future._finish(6))
+        self.assertEqual(future.result(), 5)
+
+    def test_exception(self):
+        future = Future()
+        try:
+            raise KeyError('model')
+        except KeyError:
+            future._finish(exc_info=sys.exc_info())
+        self.assertRaises(KeyError, future.result)
+        self.assertEqual(future.exception().args, ('model',))
+        # with the traceback of where it was raised
+        try:
+            future.result()
+        except KeyError:
+            self.assertEqual(sys.exc_info()[2].tb_next.tb_frame.f_code.co_name, 'test_exception')
+
+    def test_then(self):
+        first = Future()
+        second = first.then(lambda x: x + 1)
+        # a function returning a Future chains onto it
+        inner = Future()
+        third = second.then(lambda x: inner)
+        first._finish(1)
+        self.assertEqual(second.result(TIMEOUT), 2)
+        self.assertFalse(third.done())
+        inner._finish('inner')
+        self.assertEqual(third.result(TIMEOUT), 'inner')
+
+    def test_then_exception(self):
+        # an exception anywhere in a chain is the exception of the rest of it
+        calls = list()
+        first = Future()
+        last = first.then(lambda x: x / 0).then(calls.append)
+        first._finish(1)
+        self.assertRaises(ZeroDivisionError, last.result, TIMEOUT)
+        self.assertEqual(calls, [])
+        first = Future()
+        last = first.then(calls.append)
+        first._finish(exc_info=(IOError, IOError('saving'), None))
+        self.assertRaises(IOError, last.result, TIMEOUT)
+        self.assertEqual(calls, [])
+
+    def test_cancel(self):
+        future = Future()
+        chained = future.then(lambda x: x)
+        self.assertTrue(future.cancel())
+        self.assertRaises(CancelledError, future.result)
+        self.assertRaises(CancelledError, chained.result, TIMEOUT)
+        # a finished call can't be cancelled, and a cancelled one keeps its CancelledError
+        self.assertFalse(future.cancel())
+        self.assertFalse(future._finish('late'))
+        self.assertIsInstance(future.exception(), CancelledError)
+
+
+class AsyncServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = _Service()
+        self.async_service = AsyncService(self.service, max_concurrent=2)
+
+    def tearDown(self):
+        for _, _, job in self.service.fba_client.jobs:
+            if not job.done():
+                job._finish()
+        self.async_service.close()
+
+    def _job(self, i):
+        # waits for the i-th job to be submitted
+        for _ in range(int(TIMEOUT / 0.01)):
+            if len(self.service.fba_client.jobs) > i:
+                return self.service.fba_client.jobs[i]
+            threading.Event().wait(0.01)
+        self.fail('job ' + str(i) + ' was not submitted')
+
+    def test_submit(self):
+        self.assertEqual(self.async_service.submit(lambda x, y=0: x + y, 1, y=2).result(TIMEOUT), 3)
+        self.assertRaises(ZeroDivisionError, self.async_service.submit(lambda: 1 / 0).result, TIMEOUT)
+
+    def test_runfba(self):
+        future = self.async_service.runfba('model', 'media')
+        method, params, job = self._job(0)
+        self.assertEqual((method, params), ('run_flux_balance_analysis', {'fbamodel_id': 'model', 'media_id': 'media'}))
+        self.assertFalse(future.done())
+        job._finish(result={'new_fba_ref': '1/2/1'})
+        self.assertEqual(future.result(TIMEOUT), ('fba of model', {'new_fba_ref': '1/2/1'}))
+
+    def test_runfba_exception(self):
+        future = self.async_service.runfba('model', 'media')
+        self._job(0)[2]._finish(exception=IOError('job failed'))
+        self.assertRaisesRegexp(IOError, 'job failed', future.result, TIMEOUT)
+
+    def test_max_concurrent(self):
+        # the third job waits for one of the first two to finish
+        futures = [self.async_service.runfba('model' + str(i), 'media') for i in range(3)]
+        self._job(1)
+        threading.Event().wait(0.05)
+        self.assertEqual(len(self.service.fba_client.jobs), 2)
+        self._job(0)[2]._finish(result='fba')
+        self.assertEqual(futures[0].result(TIMEOUT), ('fba of model0', 'fba'))
+        self._job(2)[2]._finish(result='fba')
+        self.assertEqual(futures[2].result(TIMEOUT), ('fba of model2', 'fba'))
+
+    def test_cancel(self):
+        # a cancelled call that hasn't started is never submitted, and one in flight has its result dropped
+        futures = [self.async_service.runfba('model' + str(i), 'media') for i in range(3)]
+        self._job(1)
+        self.assertTrue(futures[2].cancel())
+        self.assertTrue(futures[0].cancel())
+        self._job(0)[2]._finish(result='fba')
+        self.assertRaises(CancelledError, futures[0].result, TIMEOUT)
+        self._job(1)[2]._finish(result='fba')
+        self.assertEqual(futures[1].result(TIMEOUT), ('fba of model1', 'fba'))
+        threading.Event().wait(0.05)
+        self.assertEqual(len(self.service.fba_client.jobs), 2)
+
+
+class AllMediaTest(unittest.TestCase):
+
+    def test_copy(self):
+        # a copy evaluates on its own AsyncService, so closing one leaves the other's
+        condition = AllMedia(['media'], service=_Service())
+        condition._async_service = AsyncService(condition.service)
+        copied = copy.copy(condition)
+        self.assertEqual((copied.media, copied.service), (condition.media, condition.service))
+        self.assertIsNone(copied._async_service)
+        condition.close()
+        self.assertIsNone(condition._async_service)
+
+
+if __name__ == '__main__':
+    unittest.main()
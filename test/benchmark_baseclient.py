@@ -0,0 +1,97 @@
+"""
+Benchmarks the per call latency of PooledClient against a local JSON RPC server, with and without keep alive
+connections. Against a local server a new connection costs little; the difference grows with the round trip time and
+TLS handshake of a real service.
+
+The server is a stand in for a KBase service: it echoes the params of each call, gzipping the response when the
+client accepts it. Run from the repository root:
+
+    python test/benchmark_baseclient.py [calls] [payload_kb]
+"""
+import gzip
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from mightymorphingmodels.clients import PooledClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # the headers and body go out in separate writes. don't let them wait on delayed acks
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length')))
+        call = json.loads(body)
+        response = json.dumps({'version': '1.1', 'id': call['id'], 'result': [call['params']]}).encode('utf-8')
+        headers = [('Content-Type', 'application/json')]
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(response)
+            response = buf.getvalue()
+            headers.append(('Content-Encoding', 'gzip'))
+        self.send_response(200)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(response)))
+        if (self.headers.get('Connection') or '').lower() == 'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _time_calls(client, calls, payload):
+    start = time.time()
+    for _ in range(calls):
+        client.call_method('Echo.echo', [payload])
+    return (time.time() - start) / calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    payload_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    server = _Server(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:' + str(server.server_address[1])
+    # model-like payload: repetitive json, as workspace objects are
+    payload = {'modelreactions': [{'id': 'rxn%05d_c0' % i, 'direction': '>'}
+                                  for i in range(payload_kb * 1024 // 40)]}
+
+    print('%d calls, %d KB payload' % (calls, payload_kb))
+    for label, kwargs in [('no keep-alive', {'keep_alive': False}),
+                          ('keep-alive', {})]:
+        client = PooledClient(url, ignore_authrc=True, **kwargs)
+        client.call_method('Echo.echo', [payload])  # warm up
+        print('%-14s %8.2f ms/call' % (label, 1000 * _time_calls(client, calls, payload)))
+        client._session.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmarks Gpr.remove_redundancy on synthetic gprs of hundreds of proteins, like those of merged translated and
+reconstructed models with many isozymes, against the same rule checking every pair of proteins (_pairwise). Both give
+the same result. test/gpr_test.py compares the result with the set-based remove_redundancy the indexed one replaced.
+
+Each gpr has proteins of one to three subunits of one to three features, a third of them copies of others with features
+left out (so redundant). Run from the repository root:
+
+    python test/benchmark_gpr.py [repeats]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+from objects import Gpr, FeatureRegistry, _covers, _protein_mask
+
+
+def _gpr_set(proteins, rand):
+    features = ['fig|83333.1.peg.%d' % i for i in range(4 * proteins)]
+    gpr = list()
+    for _ in range(proteins - proteins // 3):
+        gpr.append([rand.sample(features, rand.randint(1, 3)) for _ in range(rand.randint(1, 3))])
+    for _ in range(proteins // 3):
+        # a copy of a protein with a feature left out of each subunit that has more than one
+        gpr.append([sub[1:] if len(sub) > 1 else sub for sub in rand.choice(gpr)])
+    return frozenset([frozenset([frozenset(sub) for sub in protein]) for protein in gpr])
+
+
+def _pairwise(gpr):
+    # remove_redundancy's rule, comparing every protein with every other instead of looking candidates up in an index
+    proteins = list(gpr._proteins)
+    masks = [_protein_mask(p) for p in proteins]
+    kept = set(range(len(proteins)))
+    for i, protein in enumerate(proteins):
+        for j, protein2 in enumerate(proteins):
+            if i != j and j in kept and masks[i] & ~masks[j] == 0 and _covers(protein2, protein):
+                kept.remove(i)
+                break
+    gpr._set_proteins(frozenset([proteins[i] for i in kept]))
+
+
+def _time(remove, gpr_set, registry, repeats):
+    gprs = [Gpr.new_gpr(gpr_set, registry=registry) for _ in range(repeats)]
+    start = time.time()
+    for gpr in gprs:
+        remove(gpr)
+    return (time.time() - start) / repeats, gprs[0]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rand = random.Random(0)
+    print('%9s %9s %14s %14s' % ('proteins', 'kept', 'index ms', 'pairwise ms'))
+    for proteins in [100, 300, 1000, 3000]:
+        gpr_set = _gpr_set(proteins, rand)
+        registry = FeatureRegistry('benchmark %d' % proteins)
+        indexed, result = _time(Gpr.remove_redundancy, gpr_set, registry, repeats)
+        pairwise, expected = _time(_pairwise, gpr_set, registry, max(1, repeats // 5))
+        assert result == expected
+        print('%9d %9d %14.2f %14.2f' % (len(gpr_set), len(result.gpr), 1000 * indexed, 1000 * pairwise))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmarks FBAModel.get_reactions, and the Gpr calls label_reactions makes on each reaction, at each validation level
+(see objects.set_validation).
+
+The model is synthetic, loaded straight into an FBAModel without a service: reactions with a few isozymes of a few
+subunits each, drawn from a genome-sized pool of features. Run from the repository root:
+
+    python test/benchmark_validation.py [reactions] [repeats]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+import objects
+from objects import FBAModel, DEFAULT_VALIDATION_LEVEL, VALIDATION_FULL, VALIDATION_SAMPLED, VALIDATION_OFF
+
+
+def _model_data(reactions, rand):
+    features = ['1/2/3/features/id/fig|83333.1.peg.%d' % i for i in range(4000)]
+    rxns = list()
+    for i in range(reactions):
+        proteins = list()
+        for _ in range(rand.randint(1, 4)):
+            subunits = [{'feature_refs': rand.sample(features, rand.randint(1, 3))} for _ in range(rand.randint(1, 3))]
+            proteins.append({'note': '', 'modelReactionProteinSubunits': subunits})
+        rxns.append({'id': 'rxn%05d_c0' % i, 'direction': '=', 'modelReactionProteins': proteins})
+    return {'modelreactions': rxns}
+
+
+def _time_get_reactions(model, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        for r in model.get_reactions():
+            if not r.gpr.is_empty():
+                r.gpr.features()
+    return (time.time() - start) / repeats
+
+
+def main():
+    reactions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    model = FBAModel(1, 1)
+    model._data = _model_data(reactions, random.Random(0))
+
+    print('%d reactions, %d repeats' % (reactions, repeats))
+    for level in [VALIDATION_FULL, VALIDATION_SAMPLED, VALIDATION_OFF]:
+        objects.set_validation(level)
+        _time_get_reactions(model, 1)  # warm up (interns the features)
+        seconds = _time_get_reactions(model, repeats)
+        print('%-8s %8.1f ms/call %10.0f reactions/s' % (level, 1000 * seconds, reactions / seconds))
+    objects.set_validation(DEFAULT_VALIDATION_LEVEL)
+
+
+if __name__ == '__main__':
+    main()
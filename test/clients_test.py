@@ -0,0 +1,130 @@
+"""
+Tests of the job poller of PooledClient, on a client whose jobs are run by the test rather than a service. Run from the
+repository root:
+
+    python -m unittest discover -s test -p 'clients_test.py'
+"""
+import os
+import sys
+import threading
+import unittest
+
+from requests.exceptions import ConnectionError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+from clients import FBAToolsClient, PooledClient, ServerError
+
+# seconds a test waits for a job before giving up on it
+TIMEOUT = 5.0
+
+
+class _JobClient(PooledClient):
+    """
+    a PooledClient whose jobs finish when the test says so. states maps job ids to the job state _check_job returns
+    (unfinished until set), or to an exception it raises
+    """
+
+    def __init__(self):
+        PooledClient.__init__(self, 'http://localhost/fba', ignore_authrc=True, async_job_check_time_ms=10,
+                              async_job_check_max_time_ms=20)
+        self.submitted = list()
+        self.states = dict()
+        self.check_threads = set()
+        self._lock = threading.Lock()
+
+    def _submit_job(self, service_method, args, service_ver=None, context=None):
+        with self._lock:
+            self.submitted.append((service_method, args, service_ver))
+            return 'job%d' % len(self.submitted)
+
+    def _check_job(self, service, job_id):
+        with self._lock:
+            self.check_threads.add(threading.current_thread())
+            state = self.states.get(job_id, {'finished': 0})
+        if isinstance(state, Exception):
+            raise state
+        return state
+
+
+class JobPollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = _JobClient()
+
+    def test_result(self):
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{'fba_output_id': 'fba'}], 'release')
+        self.assertEqual(self.client.submitted,
+                         [('fba_tools.run_flux_balance_analysis', [{'fba_output_id': 'fba'}], 'release')])
+        self.assertRaises(RuntimeError, future.result, 0.05)
+        self.assertFalse(future.done())
+        self.client.states[future.job_id] = {'finished': 1, 'result': [{'new_fba_ref': '1/2/1'}]}
+        self.assertEqual(future.result(TIMEOUT), {'new_fba_ref': '1/2/1'})
+        self.assertEqual(future.exception(), None)
+        # a job with no result, and one with several
+        for result, expected in [(None, None), ([1, 2], [1, 2])]:
+            future = self.client.submit_job('fba_tools.compare_models', [{}])
+            self.client.states[future.job_id] = {'finished': 1, 'result': result}
+            self.assertEqual(future.result(TIMEOUT), expected)
+
+    def test_callback(self):
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{}])
+        finished = threading.Event()
+        future.add_done_callback(lambda f: finished.set())
+        self.client.states[future.job_id] = {'finished': 1, 'result': [1]}
+        self.assertTrue(finished.wait(TIMEOUT))
+        # added once the job is done, it runs at once
+        called = list()
+        future.add_done_callback(called.append)
+        self.assertEqual(called, [future])
+
+    def test_job_error(self):
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{}])
+        self.client.states[future.job_id] = {'finished': 1, 'error': {'name': 'JSONRPCError', 'code': -32000,
+                                                                      'message': 'no growth', 'error': 'trace'}}
+        self.assertRaises(ServerError, future.result, TIMEOUT)
+        error = future.exception()
+        self.assertEqual((error.name, error.code, error.message, error.data),
+                         ('JSONRPCError', -32000, 'no growth', 'trace'))
+
+    def test_check_error(self):
+        # an error checking a job fails it, unless it's a connection error, which is retried a few times
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{}])
+        self.client.states[future.job_id] = KeyError('job1')
+        self.assertRaises(KeyError, future.result, TIMEOUT)
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{}])
+        self.client.states[future.job_id] = ConnectionError('down')
+        self.assertRaisesRegexp(RuntimeError, 'exceeded limit', future.result, TIMEOUT)
+
+    def test_one_thread(self):
+        futures = [self.client.submit_job('fba_tools.run_flux_balance_analysis', [{'fba_output_id': str(i)}])
+                   for i in range(20)]
+        for i, future in enumerate(futures):
+            self.client.states[future.job_id] = {'finished': 1, 'result': [i]}
+        self.assertEqual([f.result(TIMEOUT) for f in futures], range(20))
+        self.assertEqual(len(self.client.check_threads), 1)
+        self.assertNotIn(threading.current_thread(), self.client.check_threads)
+        # the poller stops when it has no jobs, and starts again for the next one
+        self.client.check_threads.clear()
+        future = self.client.submit_job('fba_tools.run_flux_balance_analysis', [{}])
+        self.client.states[future.job_id] = {'finished': 1, 'result': ['again']}
+        self.assertEqual(future.result(TIMEOUT), 'again')
+        self.assertEqual(len(self.client.check_threads), 1)
+
+
+class FBAToolsClientTest(unittest.TestCase):
+
+    def test_submit(self):
+        client = FBAToolsClient('http://localhost/fba', service_ver='dev', ignore_authrc=True)
+        client._client = _JobClient()
+        future = client.submit('run_flux_balance_analysis', {'fba_output_id': 'fba'})
+        self.assertEqual(client._client.submitted, [('fba_tools.run_flux_balance_analysis',
+                                                     [{'fba_output_id': 'fba'}], 'dev')])
+        client._client.states[future.job_id] = {'finished': 1, 'result': ['fba']}
+        self.assertEqual(future.result(TIMEOUT), 'fba')
+        client._client.states['job2'] = {'finished': 1, 'result': ['compared']}
+        self.assertEqual(client.run('compare_models', {}), 'compared')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,404 @@
+"""
+Tests of Gpr.merge and Gpr.remove_redundancy against the set-based versions they replaced, of Gpr.merge_all against
+Gpr.merge, of the memo Gpr parses reactions through, of the validation levels of _check_rep, and of the lifetime of
+FeatureRegistry instances.
+
+Gprs here are frozensets of proteins, each a frozenset of subunits, each a frozenset of features. The set-based versions
+depended on the order they iterated sets in, so they're run over several orders, and only gprs they give one result for
+are compared. Gprs that remove_redundancy's rule is meant to treat differently (see _rule_differs) are pinned by hand
+instead. Run from the repository root:
+
+    python -m unittest discover -s test -p 'gpr_test.py'
+"""
+import gc
+import os
+import random
+import sys
+import unittest
+import weakref
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+import objects
+from objects import Gpr, FeatureRegistry, ModelReaction
+
+# orders each set-based result is taken over
+ORDERS = 12
+
+
+def _gpr(*proteins):
+    # e.g. _gpr([['a', 'b']], [['a'], ['c']]) is ((a or b)) or ((a) and (c))
+    return frozenset([frozenset([frozenset(sub) for sub in protein]) for protein in proteins])
+
+
+def _features(protein):
+    return frozenset().union(*protein)
+
+
+def _orders(seed):
+    # functions listing a set in a shuffled, but repeatable, order
+    orders = list()
+    for k in range(ORDERS):
+        rand = random.Random(seed * ORDERS + k)
+        orders.append(lambda s, rand=rand: rand.sample(sorted(s, key=sorted), len(s)))
+    return orders
+
+
+def _set_remove_redundancy(gpr_set, order):
+    # the set-based remove_redundancy: each protein is checked against the last protein with all its features only
+    matches = dict()
+    for protein in order(gpr_set):
+        for protein2 in order(gpr_set):
+            if protein != protein2 and _features(protein).issubset(_features(protein2)):
+                matches[protein] = protein2
+    for protein in matches:
+        matched_subs = set()
+        for sub in protein:
+            for sub2 in matches[protein]:
+                if sub.issubset(sub2):
+                    matched_subs.add(sub2)
+        if len(matched_subs) == len(matches[protein]):
+            gpr_set = gpr_set - frozenset([protein])
+    return gpr_set
+
+
+def _set_merge(gpr_set1, gpr_set2, order):
+    # the set-based merge, less its remove_redundancy: (gpr_set, examine_gpr)
+    g2 = set(gpr_set2)
+    examine_gpr = False
+    for protein in order(gpr_set1):
+        if protein not in g2:
+            matched_protein = False
+            proteins_to_remove = set()
+            proteins_to_add = set()
+            for g2_protein in order(g2):
+                if len(protein) == len(g2_protein) and len(_features(protein) & _features(g2_protein)) != 0:
+                    proteins_to_remove.add(g2_protein)
+                    prot = set(g2_protein)
+                    matched_protein = True
+                    matched_sub = False
+                    for subunit in order(protein):
+                        if subunit not in g2_protein:
+                            for other in order(g2_protein):
+                                if len(subunit & other) != 0:
+                                    matched_sub = True
+                                    prot.remove(other)
+                                    new_sub = subunit.union(other)
+                                    if new_sub in prot:
+                                        examine_gpr = True
+                                    else:
+                                        prot.add(frozenset(new_sub))
+                                    proteins_to_add.add(frozenset(prot))
+                    if not matched_sub:
+                        proteins_to_remove.remove(g2_protein)
+            g2 = g2 - proteins_to_remove
+            g2 |= proteins_to_add
+            if not matched_protein or not matched_sub:
+                g2.add(protein)
+    return frozenset(g2), examine_gpr
+
+
+def _covers(protein2, protein):
+    # true if the set-based remove_redundancy removes protein when protein2 is the protein it's checked against
+    return _features(protein).issubset(_features(protein2)) and \
+        all([any([sub.issubset(sub2) for sub in protein]) for sub2 in protein2])
+
+
+def _rule_differs(gpr_set):
+    # true if remove_redundancy may not give the set-based result for gpr_set: a protein has all its features in both
+    # proteins that cover it and ones that don't, or two proteins cover each other
+    for protein in gpr_set:
+        supersets = [p for p in gpr_set if p != protein and _features(protein).issubset(_features(p))]
+        covered = [_covers(p, protein) for p in supersets]
+        if any(covered) and not all(covered):
+            return True
+        if any([_covers(p, protein) and _covers(protein, p) for p in supersets]):
+            return True
+    return False
+
+
+def _one_result(results):
+    # the result the set-based version gives over every order, or None if it gives several or fails
+    try:
+        results = set([result() for result in results])
+    except KeyError:
+        return None
+    if len(results) != 1:
+        return None
+    return results.pop()
+
+
+def _random_gpr(rand, features, proteins):
+    return _gpr(*[[rand.sample(features, rand.randint(1, 3)) for _ in range(rand.randint(1, 3))]
+                  for _ in range(proteins)])
+
+
+class GprTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = FeatureRegistry('gpr_test')
+
+    def _new(self, gpr_set):
+        return Gpr.new_gpr(gpr_set, registry=self.registry)
+
+    def _removed(self, gpr_set):
+        gpr = self._new(gpr_set)
+        gpr.remove_redundancy()
+        return gpr.gpr
+
+    def test_remove_redundancy_subset(self):
+        # the docstring example
+        self.assertEqual(self._removed(_gpr([['a', 'b']], [['a', 'b', 'c', 'd']])), _gpr([['a', 'b', 'c', 'd']]))
+
+    def test_remove_redundancy_merged_subunits(self):
+        # (a) and (b) is redundant with (a or b), which either of them fills
+        self.assertEqual(self._removed(_gpr([['a'], ['b']], [['a', 'b']])), _gpr([['a', 'b']]))
+
+    def test_remove_redundancy_keeps_unrelated(self):
+        gpr_set = _gpr([['a'], ['b']], [['c', 'd']], [['a', 'e']])
+        self.assertEqual(self._removed(gpr_set), gpr_set)
+        self.assertEqual(self._removed(gpr_set), _set_remove_redundancy(gpr_set, sorted))
+
+    def test_remove_redundancy_any_superset(self):
+        # (a) is covered by (a or b), but not by (a) and (c). It's removed whichever of the two is found last, where
+        # the set-based version only removed it when (a or b) was the last
+        gpr_set = _gpr([['a']], [['a', 'b']], [['a'], ['c']])
+        self.assertEqual(self._removed(gpr_set), _gpr([['a', 'b']], [['a'], ['c']]))
+        results = set([_set_remove_redundancy(gpr_set, order) for order in _orders(0)])
+        self.assertIn(self._removed(gpr_set), results)
+
+    def test_remove_redundancy_mutual(self):
+        # each of these is redundant with the other: one of them is kept, where the set-based version dropped both
+        gpr_set = _gpr([['a'], ['b'], ['a', 'b']], [['a'], ['b']])
+        self.assertEqual(_set_remove_redundancy(gpr_set, sorted), frozenset())
+        removed = self._removed(gpr_set)
+        self.assertEqual(len(removed), 1)
+        self.assertTrue(removed < gpr_set)
+
+    def test_merge(self):
+        gpr1 = self._new(_gpr([['a'], ['b']], [['c']]))
+        gpr2 = self._new(_gpr([['a', 'd'], ['b']]))
+        merged = gpr1.merge(gpr2)
+        self.assertEqual(merged.gpr, _gpr([['a', 'd'], ['b']], [['c']]))
+        self.assertEqual(merged.gpr_type, u'merge')
+        self.assertEqual(merged.parents, (gpr1, gpr2))
+
+    def test_merge_same(self):
+        gpr = self._new(_gpr([['a', 'b']], [['a']]))
+        self.assertEqual(gpr.merge(gpr).gpr, _gpr([['a', 'b']]))
+
+    def test_remove_redundancy_as_set_based(self):
+        rand = random.Random(0)
+        features = ['f%d' % i for i in range(8)]
+        compared = 0
+        for seed in range(500):
+            gpr_set = _random_gpr(rand, features, rand.randint(1, 6))
+            if _rule_differs(gpr_set):
+                continue
+            expected = _one_result([lambda order=order: _set_remove_redundancy(gpr_set, order)
+                                    for order in _orders(seed)])
+            if expected is None:
+                continue
+            self.assertEqual(self._removed(gpr_set), expected, gpr_set)
+            compared += 1
+        self.assertGreater(compared, 300)
+
+    def test_remove_redundancy_indexed_as_set_based(self):
+        # gprs with more than objects._INDEXED_PROTEINS proteins look up the proteins to check in an index
+        rand = random.Random(2)
+        features = ['f%d' % i for i in range(16)]
+        compared = 0
+        for seed in range(300):
+            gpr_set = _random_gpr(rand, features, rand.randint(objects._INDEXED_PROTEINS + 1, 20))
+            if len(gpr_set) <= objects._INDEXED_PROTEINS or _rule_differs(gpr_set):
+                continue
+            expected = _one_result([lambda order=order: _set_remove_redundancy(gpr_set, order)
+                                    for order in _orders(seed)])
+            if expected is None:
+                continue
+            self.assertEqual(self._removed(gpr_set), expected, gpr_set)
+            compared += 1
+        self.assertGreater(compared, 100)
+
+    def test_remove_redundancy_indexed_as_unindexed(self):
+        rand = random.Random(3)
+        features = ['f%d' % i for i in range(24)]
+        indexed = objects._INDEXED_PROTEINS
+        for _ in range(100):
+            gpr_set = _random_gpr(rand, features, rand.randint(indexed + 1, 60))
+            try:
+                objects._INDEXED_PROTEINS = len(gpr_set)
+                expected = self._removed(gpr_set)
+            finally:
+                objects._INDEXED_PROTEINS = indexed
+            self.assertEqual(self._removed(gpr_set), expected, gpr_set)
+
+    def test_merge_as_set_based(self):
+        rand = random.Random(1)
+        features = ['f%d' % i for i in range(8)]
+        compared = 0
+        for seed in range(1000):
+            gpr_set1 = _random_gpr(rand, features, rand.randint(1, 4))
+            gpr_set2 = _random_gpr(rand, features, rand.randint(1, 4))
+
+            def result(order):
+                gpr_set, examine_gpr = _set_merge(gpr_set1, gpr_set2, order)
+                if _rule_differs(gpr_set):
+                    return None
+                return _set_remove_redundancy(gpr_set, order), examine_gpr
+            expected = _one_result([lambda order=order: result(order) for order in _orders(seed)])
+            if expected is None:
+                continue
+            merged = self._new(gpr_set1).merge(self._new(gpr_set2))
+            gpr_type = u'potential merge conflict' if expected[1] else u'merge'
+            self.assertEqual((merged.gpr, merged.gpr_type), (expected[0], gpr_type), (gpr_set1, gpr_set2))
+            compared += 1
+        self.assertGreater(compared, 300)
+
+    def test_merge_all_as_merge(self):
+        rand = random.Random(6)
+        features = ['f%d' % i for i in range(8)]
+        gprs = [self._new(_random_gpr(rand, features, rand.randint(1, 4))) for _ in range(20)]
+        # gprs of another genome are merged in the registry of the first
+        others = [Gpr.new_gpr(_random_gpr(rand, features, rand.randint(1, 4)), registry=FeatureRegistry('other'))
+                  for _ in range(5)]
+        # pairs repeat, and some are of a gpr with itself, as in the common reactions of two models
+        pairs = [(rand.choice(gprs), rand.choice(gprs + others)) for _ in range(100)] + [(g, g) for g in gprs[:5]]
+        merged, conflicts = Gpr.merge_all(pairs)
+        expected = [gpr1.merge(gpr2) for gpr1, gpr2 in pairs]
+        self.assertEqual([(m.gpr, m.gpr_type, m.parents) for m in merged],
+                         [(m.gpr, m.gpr_type, m.parents) for m in expected])
+        self.assertEqual(conflicts, [i for i in range(len(pairs)) if pairs[i][0] != expected[i]])
+
+
+def _reaction(rand, features):
+    # ModelReaction data with a random gpr over features, sometimes spontaneous and sometimes with empty subunits
+    proteins = list()
+    for _ in range(rand.randint(0, 3)):
+        subunits = [{'feature_refs': ['1/2/3/features/id/' + f for f in rand.sample(features, rand.randint(0, 2))]}
+                    for _ in range(rand.randint(1, 3))]
+        proteins.append({'note': rand.choice(['', '', '', 'spontaneous']), 'modelReactionProteinSubunits': subunits})
+    return {'id': 'rxn', 'modelReactionProteins': proteins}
+
+
+class ParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parsed = objects._parsed.copy()
+        self.size = objects._PARSED_SIZE
+
+    def tearDown(self):
+        objects._parsed.clear()
+        objects._parsed.update(self.parsed)
+        objects._PARSED_SIZE = self.size
+
+    def _eager(self, data):
+        # a Gpr parsed from scratch, as ModelReaction made before its gpr was lazy and memoized
+        objects._parsed.clear()
+        return Gpr(data)
+
+    def test_lazy_as_eager(self):
+        rand = random.Random(4)
+        features = ['f%d' % i for i in range(6)]
+        reactions = [_reaction(rand, features) for _ in range(300)]
+        # parsed twice, so that most of the second round are memo hits
+        for _ in range(2):
+            lazy = [ModelReaction(dict(data)).gpr for data in reactions]
+        for data, gpr in zip(reactions, lazy):
+            eager = self._eager(data)
+            self.assertEqual((gpr.gpr, gpr.gpr_type, gpr.ftrs), (eager.gpr, eager.gpr_type, eager.ftrs), data)
+
+    def test_changed_before_access(self):
+        data = {'id': 'rxn', 'modelReactionProteins': []}
+        rxn = ModelReaction(data)
+        data['modelReactionProteins'] = [{'note': '', 'modelReactionProteinSubunits': [{'feature_refs': ['a']}]}]
+        self.assertEqual(rxn.gpr.gpr, _gpr([['a']]))
+
+    def test_memo_bounded(self):
+        objects._PARSED_SIZE = 10
+        rand = random.Random(5)
+        features = ['f%d' % i for i in range(12)]
+        for _ in range(50):
+            Gpr(_reaction(rand, features))
+        self.assertEqual(len(objects._parsed), 10)
+        # the most recently used are kept
+        data = _reaction(rand, features)
+        first = Gpr(data)
+        for _ in range(9):
+            Gpr(_reaction(rand, features))
+        Gpr(data)
+        Gpr(_reaction(rand, features))
+        self.assertIs(Gpr(data)._proteins, first._proteins)
+
+    def test_memo_registry(self):
+        # the memo doesn't keep the registries of the gprs it parsed
+        registry = FeatureRegistry('parse_test')
+        data = {'id': 'rxn', 'modelReactionProteins': [{'note': '', 'modelReactionProteinSubunits': [
+            {'feature_refs': ['1/2/3/features/id/a']}]}]}
+        gpr = Gpr(data, registry=registry)
+        self.assertIs(Gpr(data, registry=registry)._proteins, gpr._proteins)
+        ref = weakref.ref(registry)
+        del gpr, registry
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(Gpr(data).gpr, _gpr([['a']]))
+
+
+class ValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.level = objects.validation_level()
+        self.interval = objects._sample_interval
+        # a gpr whose mask is wrong for its proteins, so that every check it makes fails
+        self.gpr = Gpr.new_gpr(_gpr([['a'], ['b']]), registry=FeatureRegistry('validation_test'))
+        self.gpr._mask = 0
+
+    def tearDown(self):
+        objects.set_validation(self.level, self.interval)
+
+    def _failed_checks(self, calls):
+        failed = 0
+        for _ in range(calls):
+            try:
+                self.gpr._check_rep()
+            except objects.RepresentationError:
+                failed += 1
+        return failed
+
+    def test_full(self):
+        objects.set_validation(objects.VALIDATION_FULL)
+        self.assertEqual(self._failed_checks(10), 10)
+
+    def test_sampled(self):
+        objects.set_validation(objects.VALIDATION_SAMPLED, 4)
+        self.assertEqual(self._failed_checks(10), 3)
+
+    def test_off(self):
+        objects.set_validation(objects.VALIDATION_OFF)
+        self.assertEqual(self._failed_checks(10), 0)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, objects.set_validation, 'some')
+        self.assertRaises(ValueError, objects.set_validation, objects.VALIDATION_SAMPLED, 0)
+
+
+class FeatureRegistryTest(unittest.TestCase):
+
+    def test_get(self):
+        registry = FeatureRegistry.get('feature_registry_test')
+        self.assertIs(FeatureRegistry.get('feature_registry_test'), registry)
+        # kept while a gpr uses it
+        gpr = Gpr.new_gpr(_gpr([['a']]), registry=registry)
+        ref = weakref.ref(registry)
+        del registry
+        gc.collect()
+        self.assertIs(FeatureRegistry.get('feature_registry_test'), ref())
+        # and freed once none do
+        del gpr
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(FeatureRegistry.get('feature_registry_test').features, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
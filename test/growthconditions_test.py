@@ -0,0 +1,66 @@
+"""
+Tests of the in process growth conditions on the toy model of toy_models.py. Run from the repository root:
+
+    python -m unittest discover -s test -p 'growthconditions_test.py'
+"""
+import unittest
+
+import toy_models
+from GrowthConditions import KnockoutCondition
+
+
+class KnockoutConditionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.morph = toy_models.morph()
+        self.condition = KnockoutCondition()
+
+    def _grows(self, **arguments):
+        arguments['morph'] = self.morph
+        return self.condition.evaluate(arguments)
+
+    def test_evaluate(self):
+        self.assertTrue(self._grows())
+        self.assertAlmostEqual(self.condition.fba.objective, toy_models.TOY_OBJECTIVE)
+        self.assertFalse(self._grows(reaction='rxn00001_c0'))
+        self.assertTrue(self._grows(reaction='rxn00002_c0'))
+        self.assertFalse(self._grows(reactions=['rxn00002_c0', 'rxn00004_c0']))
+
+    def test_rollback(self):
+        self.assertFalse(self._grows(reaction='rxn00001_c0'))
+        self.condition.rollback()
+        self.assertEqual(self.condition.lp.bounds('rxn00001_c0'), (0.0, 100.0))
+        self.assertTrue(self._grows())
+
+    def test_evaluate_rolls_back(self):
+        # evaluating without committing restores the last knockouts first
+        self.assertTrue(self._grows(reaction='rxn00002_c0'))
+        self.assertTrue(self._grows(reaction='rxn00004_c0'))
+        self.assertEqual(self.condition.lp.bounds('rxn00002_c0'), (0.0, 100.0))
+
+    def test_commit(self):
+        self.assertTrue(self._grows(reaction='rxn00002_c0'))
+        self.condition.commit()
+        self.condition.rollback()
+        self.assertEqual(self.condition.lp.bounds('rxn00002_c0'), (0.0, 0.0))
+        # with rxn00002_c0 gone, rxn00004_c0 is the only way to ATP
+        self.assertFalse(self._grows(reaction='rxn00004_c0'))
+        self.condition.rollback()
+        self.assertTrue(self._grows())
+
+    def test_knock_out(self):
+        self.assertFalse(self._grows(reaction='rxn00001_c0'))
+        self.condition.knock_out('rxn00005_c0')
+        self.assertEqual(self.condition.lp.bounds('rxn00001_c0'), (0.0, 100.0))
+        self.assertEqual(self.condition.lp.bounds('rxn00005_c0'), (0.0, 0.0))
+        self.assertTrue(self._grows())
+
+    def test_unknown_reaction(self):
+        # reactions the LP doesn't have (e.g. removed before it was built) are ignored
+        self.assertTrue(self._grows(reactions=['rxn99999_c0', 'rxn00005_c0']))
+        self.condition.knock_out('rxn99999_c0')
+        self.assertTrue(self._grows())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests of LocalFBA and LocalFBACondition on the toy models of toy_models.py.
+
+The toy model's objectives are those of the fba_tools default formulation LocalFBA follows, worked out by hand. Run from
+the repository root:
+
+    python -m unittest discover -s test -p 'localfba_test.py'
+"""
+import unittest
+
+import numpy as np
+
+import toy_models
+from GrowthConditions import LocalFBACondition
+from localfba import LocalFBA, EXCHANGE_PREFIX, DRAIN_PREFIX
+
+
+def _toy_lp(knockouts=None):
+    return LocalFBA(toy_models.model(toy_models.toy_model_data()).stoichiometry(), toy_models.toy_media_data(),
+                    knockouts=knockouts)
+
+
+class LocalFBATest(unittest.TestCase):
+
+    def test_objective(self):
+        solution = _toy_lp().solve()
+        self.assertTrue(solution.is_optimal())
+        self.assertAlmostEqual(solution.objective, toy_models.TOY_OBJECTIVE)
+        self.assertAlmostEqual(solution.fluxes['bio1'], toy_models.TOY_OBJECTIVE)
+        # uptake is positive exchange flux, up to the media's maxFlux
+        self.assertAlmostEqual(solution.fluxes[EXCHANGE_PREFIX + 'cpd00027_e0'], toy_models.TOY_OBJECTIVE)
+
+    def test_knockouts(self):
+        self.assertEqual(_toy_lp(knockouts=['rxn00001_c0']).solve().objective, 0.0)
+        # glucose still reaches ATP through NAD
+        self.assertAlmostEqual(_toy_lp(knockouts=['rxn00002_c0']).solve().objective, toy_models.TOY_OBJECTIVE)
+        self.assertEqual(_toy_lp(knockouts=['rxn00002_c0', 'rxn00004_c0']).solve().objective, 0.0)
+
+    def test_set_bounds(self):
+        lp = _toy_lp()
+        self.assertEqual(lp.bounds('rxn00004_c0'), (-100.0, 100.0))
+        lp.set_bounds('rxn00001_c0', 0.0, 4.0)
+        self.assertAlmostEqual(lp.solve().objective, 4.0)
+        lp.set_bounds('rxn00001_c0', 0.0, 100.0)
+        self.assertAlmostEqual(lp.solve().objective, toy_models.TOY_OBJECTIVE)
+        self.assertRaises(KeyError, lp.set_bounds, 'rxn99999_c0', 0.0, 0.0)
+
+    def test_blocked(self):
+        self.assertEqual(_toy_lp().blocked(), ['rxn00005_c0'])
+        self.assertEqual(_toy_lp().blocked(['rxn00003_c0', 'rxn00005_c0']), ['rxn00005_c0'])
+        self.assertEqual(_toy_lp().flux_range('rxn00005_c0'), (0.0, 0.0))
+
+    def test_steady_state(self):
+        # on random models, the fluxes balance every compound and stay in their bounds
+        for seed in range(5):
+            fba_model = toy_models.model(toy_models.random_model_data(seed), object_id=10 + seed)
+            stoichiometry = fba_model.stoichiometry()
+            lp = LocalFBA(stoichiometry, toy_models.random_media_data())
+            solution = lp.solve()
+            self.assertTrue(solution.is_optimal())
+            self.assertAlmostEqual(solution.objective, solution.fluxes['bio1'])
+            balance = stoichiometry.matrix.dot(np.array([solution.fluxes[r] for r in stoichiometry.reactions]))
+            for i, compound in enumerate(stoichiometry.compounds):
+                balance[i] += solution.fluxes.get(EXCHANGE_PREFIX + compound, 0.0)
+                balance[i] -= solution.fluxes.get(DRAIN_PREFIX + compound, 0.0)
+                self.assertAlmostEqual(balance[i], 0.0)
+            for col_id in lp.columns:
+                lower, upper = lp.bounds(col_id)
+                self.assertTrue(lower - 1e-9 <= solution.fluxes[col_id] <= upper + 1e-9)
+
+
+class LocalFBAConditionTest(unittest.TestCase):
+
+    def test_evaluate(self):
+        condition = LocalFBACondition()
+        morph = toy_models.morph()
+        self.assertTrue(condition.evaluate({'morph': morph}))
+        self.assertAlmostEqual(condition.fba.objective, toy_models.TOY_OBJECTIVE)
+        self.assertFalse(condition.evaluate({'morph': morph, 'knockouts': ['rxn00001_c0']}))
+        self.assertEqual(condition.fba.objective, 0.0)
+
+    def test_evaluate_model(self):
+        data = toy_models.toy_model_data()
+        data['modelreactions'] = [r for r in data['modelreactions'] if r['id'] != 'rxn00001_c0']
+        condition = LocalFBACondition()
+        self.assertFalse(condition.evaluate({'morph': toy_models.morph(), 'model': toy_models.model(data, 3)}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""
+Tests of Morph.process_reactions strategies on the models of toy_models.py, saved in a MemoryWorkspace. Run from the
+repository root:
+
+    python -m unittest discover -s test -p 'morph_test.py'
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import toy_models
+from GrowthConditions import LocalFBACondition, KnockoutCondition
+from localfba import LocalFBA
+from morph import Morph
+
+
+def _process(model_data, media_data, growth_condition, **kwargs):
+    # (removed ids, essential ids, reaction ids of the final model) of process_reactions on a new morph
+    morph = toy_models.stored_morph(toy_models.service(), model_data, media_data)
+    rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+    morph.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=growth_condition, **kwargs)
+    return set(morph.removed_ids), set(morph.essential_ids), set([r['id'] for r in morph.model.data['modelreactions']])
+
+
+class BlockRemovalTest(unittest.TestCase):
+
+    def _assert_as_one_at_a_time(self, model_data, media_data):
+        removed, essential, reactions = _process(model_data, media_data, LocalFBACondition())
+        self.assertEqual(removed | essential, set([r['id'] for r in model_data['modelreactions']]))
+        self.assertEqual(reactions, essential)
+        final = toy_models.model(dict(model_data, modelreactions=[r for r in model_data['modelreactions']
+                                                                  if r['id'] in essential]), object_id=99)
+        self.assertTrue(LocalFBA(final.stoichiometry(), media_data).solve().objective > 0.0)
+        for block_size in [1, 2, 3, 8, 1000]:
+            for growth_condition in [LocalFBACondition(), KnockoutCondition()]:
+                self.assertEqual(_process(model_data, media_data, growth_condition, block_size=block_size),
+                                 (removed, essential, reactions), (block_size, growth_condition))
+
+    def test_toy(self):
+        self._assert_as_one_at_a_time(toy_models.toy_model_data(), toy_models.toy_media_data())
+
+    def test_random(self):
+        for seed in range(3):
+            self._assert_as_one_at_a_time(toy_models.random_model_data(seed), toy_models.random_media_data())
+
+    def test_log(self):
+        # one log entry per reaction, naming it
+        morph = toy_models.stored_morph(toy_models.service())
+        rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+        morph.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=LocalFBACondition(), block_size=8)
+        for action_type, ids in [('Removed Reaction', morph.removed_ids), ('Kept Reaction', morph.essential_ids)]:
+            notes = [a.notes for a in morph.log.actions if a.type == action_type]
+            self.assertEqual(sorted([n.split()[-1] for n in notes]), sorted(ids))
+
+    def test_flux_shortcut(self):
+        self.assertRaises(ValueError, _process, toy_models.toy_model_data(), toy_models.toy_media_data(),
+                          LocalFBACondition(), block_size=2, flux_shortcut=True)
+
+
+def _notes(morph, prefix):
+    # the removal_ids named by the notes of morph's log entries that start with prefix
+    return set([a.notes.split()[-1] for a in morph.log.actions if a.notes and a.notes.startswith(prefix)])
+
+
+class FluxShortcutTest(unittest.TestCase):
+
+    def test_as_one_at_a_time(self):
+        for model_data, media_data in [(toy_models.toy_model_data(), toy_models.toy_media_data()),
+                                       (toy_models.random_model_data(0), toy_models.random_media_data())]:
+            expected = _process(model_data, media_data, LocalFBACondition())
+            for growth_condition in [LocalFBACondition(), KnockoutCondition()]:
+                self.assertEqual(_process(model_data, media_data, growth_condition, flux_shortcut=True), expected,
+                                 growth_condition)
+
+    def test_log(self):
+        # the blocked reaction carries no flux, so it's removed without an evaluation
+        morph = toy_models.stored_morph(toy_models.service())
+        rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+        morph.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=LocalFBACondition(),
+                                flux_shortcut=True)
+        self.assertEqual(_notes(morph, 'flux shortcut'), set(['rxn00005_c0']))
+
+
+class RemoveBlockedTest(unittest.TestCase):
+
+    def test_as_one_at_a_time(self):
+        for model_data, media_data in [(toy_models.toy_model_data(), toy_models.toy_media_data()),
+                                       (toy_models.random_model_data(1), toy_models.random_media_data())]:
+            expected = _process(model_data, media_data, LocalFBACondition())
+            for growth_condition in [LocalFBACondition(), KnockoutCondition()]:
+                self.assertEqual(_process(model_data, media_data, growth_condition, remove_blocked=True), expected,
+                                 growth_condition)
+
+    def test_log(self):
+        morph = toy_models.stored_morph(toy_models.service())
+        rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+        morph.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=LocalFBACondition(),
+                                remove_blocked=True)
+        self.assertEqual(_notes(morph, 'blocked'), set(['rxn00005_c0']))
+
+
+class WorkingModelTest(unittest.TestCase):
+
+    def test_saved(self):
+        # the model kept in memory is the model saved, at the end and at each save point
+        model_data, media_data = toy_models.random_model_data(2), toy_models.random_media_data()
+        for save_interval in [None, 1, 4]:
+            service = toy_models.service()
+            morph = toy_models.stored_morph(service, model_data, media_data)
+            rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+            morph.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=LocalFBACondition(),
+                                    save_interval=save_interval)
+            versions = service.ws_client.objects[(morph.model.workspace_id, morph.model.object_id)]
+            self.assertEqual(versions[-1][0], morph.model.data)
+            self.assertEqual(set(morph.model.stoichiometry().reactions) & set(morph.removed_ids), set())
+            if save_interval is not None:
+                # each save but the last has save_interval more removals than the one before
+                sizes = [len(v[0]['modelreactions']) for v in versions]
+                self.assertEqual([a - b for a, b in zip(sizes, sizes[1:])][:-1],
+                                 [save_interval] * (len(sizes) - 2), save_interval)
+
+
+class _MediaCondition(LocalFBACondition):
+    # evaluated with its evaluate method, rather than on the worker LPs that LocalFBACondition itself is solved on
+    closed = 0
+
+    def close(self):
+        _MediaCondition.closed += 1
+
+
+class PrescreenTest(unittest.TestCase):
+
+    def test_same_removals(self):
+        for model_data, media_data in [(toy_models.toy_model_data(), toy_models.toy_media_data()),
+                                       (toy_models.random_model_data(0), toy_models.random_media_data())]:
+            self.assertEqual(_process(model_data, media_data, LocalFBACondition(), prescreen=True, processes=2),
+                             _process(model_data, media_data, LocalFBACondition()))
+
+    def test_other_conditions(self):
+        # the screen can't tell what a subclass evaluates
+        self.assertRaises(ValueError, _process, toy_models.toy_model_data(), toy_models.toy_media_data(),
+                          _MediaCondition(), prescreen=True)
+
+
+class SpeculativeTest(unittest.TestCase):
+
+    def test_as_one_at_a_time(self):
+        for model_data, media_data in [(toy_models.toy_model_data(), toy_models.toy_media_data()),
+                                       (toy_models.random_model_data(1), toy_models.random_media_data())]:
+            expected = _process(model_data, media_data, LocalFBACondition())
+            for speculate in [1, 3, 8]:
+                self.assertEqual(_process(model_data, media_data, LocalFBACondition(), speculate=speculate,
+                                          processes=2), expected, speculate)
+                self.assertEqual(_process(model_data, media_data, _MediaCondition(), speculate=speculate), expected,
+                                 speculate)
+
+    def test_copies_closed(self):
+        # one copy of the condition per slot of the window, for the whole run, each closed with the condition
+        _MediaCondition.closed = 0
+        _process(toy_models.random_model_data(2), toy_models.random_media_data(), _MediaCondition(), speculate=4)
+        self.assertEqual(_MediaCondition.closed, 5)
+
+
+class _Killed(Exception):
+    pass
+
+
+class _KilledCondition(LocalFBACondition):
+    # stops the run, as if the process were killed, at its evaluations-th evaluation
+    def __init__(self, evaluations):
+        LocalFBACondition.__init__(self)
+        self.evaluations = evaluations
+
+    def evaluate(self, arguments):
+        self.evaluations -= 1
+        if self.evaluations < 0:
+            raise _Killed()
+        return LocalFBACondition.evaluate(self, arguments)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _decisions(self, morph):
+        return [a for a in morph.log.actions if a.type in ('Removed Reaction', 'Kept Reaction')]
+
+    def test_resume(self):
+        model_data, media_data = toy_models.random_model_data(0), toy_models.random_media_data()
+        expected = _process(model_data, media_data, LocalFBACondition())
+        for kill_at, save_interval in [(0, None), (7, None), (40, 3), (95, 10)]:
+            service = toy_models.service()
+            morph = toy_models.stored_morph(service, model_data, media_data)
+            rxn_list = [(r.rxn_id(), r) for r in morph.model.get_reactions()]
+            self.assertRaises(_Killed, morph.process_reactions, rxn_list=rxn_list, name='morphed',
+                              growth_condition=_KilledCondition(kill_at), save_interval=save_interval,
+                              checkpoint=self.checkpoint)
+            decided = len(morph.removed_ids) + len(morph.essential_ids)
+            self.assertEqual(decided, kill_at)
+            resumed, rxn_list = Morph.load_checkpoint(self.checkpoint, service)
+            # every decision made before the kill was checkpointed, kept reactions included, with its log entry
+            self.assertEqual((set(resumed.removed_ids), set(resumed.essential_ids)),
+                             (set(morph.removed_ids), set(morph.essential_ids)))
+            self.assertEqual(len(rxn_list), len(model_data['modelreactions']) - decided)
+            self.assertEqual(len(self._decisions(resumed)), decided)
+            resumed.process_reactions(rxn_list=rxn_list, name='morphed', growth_condition=LocalFBACondition(),
+                                      save_interval=save_interval, checkpoint=self.checkpoint)
+            self.assertEqual((set(resumed.removed_ids), set(resumed.essential_ids),
+                              set([r['id'] for r in resumed.model.data['modelreactions']])), expected, kill_at)
+            self.assertEqual(len(self._decisions(resumed)), len(model_data['modelreactions']))
+            self.assertFalse(os.path.exists(self.checkpoint))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Tests of ObjectCache, alone and as the cache of a Service on a MemoryWorkspace (see toy_models.py). Run from the
+repository root:
+
+    python -m unittest discover -s test -p 'objectcache_test.py'
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import toy_models
+from objectcache import ObjectCache
+
+
+def _entries(directory):
+    return sorted([f for f in os.listdir(directory) if f.endswith('.json.gz')])
+
+
+class ObjectCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss(self):
+        cache = ObjectCache(os.path.join(self.directory, 'new'))
+        self.assertTrue(os.path.isdir(cache.directory))
+        self.assertEqual(cache.get(1, 2, 3), None)
+
+    def test_hit(self):
+        cache = ObjectCache(self.directory)
+        cache.put(1, 2, 3, {'id': 'model'}, [2, 'model'])
+        self.assertEqual(cache.get(1, 2, 3), ({'id': 'model'}, [2, 'model']))
+        # other versions, objects and subsets are other entries
+        self.assertEqual(cache.get(1, 2, 4), None)
+        self.assertEqual(cache.get(1, 3, 3), None)
+        self.assertEqual(cache.get(1, 2, 3, included=['id']), None)
+        cache.put(1, 2, 3, {'id': 'subset'}, [2, 'model'], included=['id'])
+        self.assertEqual(cache.get(1, 2, 3, included=['id']), ({'id': 'subset'}, [2, 'model']))
+        self.assertEqual(cache.get(1, 2, 3), ({'id': 'model'}, [2, 'model']))
+        self.assertEqual([f for f in os.listdir(self.directory) if f.endswith('.tmp')], [])
+
+    def test_corrupt_entry(self):
+        cache = ObjectCache(self.directory)
+        cache.put(1, 2, 3, {'id': 'model'}, [2, 'model'])
+        with open(os.path.join(self.directory, _entries(self.directory)[0]), 'wb') as f:
+            f.write('not gzip')
+        self.assertEqual(cache.get(1, 2, 3), None)
+
+    def test_eviction(self):
+        data = {'id': 'x' * 1000}
+        cache = ObjectCache(self.directory)
+        cache.put(1, 1, 1, data, [1])
+        size = os.path.getsize(os.path.join(self.directory, _entries(self.directory)[0]))
+        # room for two entries
+        cache.max_bytes = 2 * size + size // 2
+        cache.put(1, 2, 1, data, [2])
+        # reading the oldest marks it recently used, so the second is evicted for the third
+        self.assertNotEqual(cache.get(1, 1, 1), None)
+        cache.put(1, 3, 1, data, [3])
+        self.assertEqual(len(_entries(self.directory)), 2)
+        self.assertNotEqual(cache.get(1, 1, 1), None)
+        self.assertEqual(cache.get(1, 2, 1), None)
+        self.assertNotEqual(cache.get(1, 3, 1), None)
+
+    def test_eviction_existing(self):
+        # a cache on an existing directory evicts its entries by their modification times
+        data = {'id': 'x' * 1000}
+        cache = ObjectCache(self.directory)
+        for object_id in [1, 2, 3]:
+            cache.put(1, object_id, 1, data, [object_id])
+        size = os.path.getsize(os.path.join(self.directory, _entries(self.directory)[0]))
+        now = time.time()
+        for object_id, age in [(1, 100), (2, 300), (3, 200)]:
+            os.utime(cache._path(1, object_id, 1), (now - age, now - age))
+        cache = ObjectCache(self.directory, max_bytes=3 * size + size // 2)
+        cache.put(1, 4, 1, data, [4])
+        self.assertEqual(cache.get(1, 2, 1), None)
+        cache.put(1, 5, 1, data, [5])
+        self.assertEqual(cache.get(1, 3, 1), None)
+        for object_id in [1, 4, 5]:
+            self.assertNotEqual(cache.get(1, object_id, 1), None)
+
+    def test_put_doesnt_list(self):
+        cache = ObjectCache(self.directory, max_bytes=1)
+        listdir = os.listdir
+        listed = list()
+        os.listdir = lambda path: listed.append(path) or listdir(path)
+        try:
+            for object_id in range(5):
+                cache.put(1, object_id, 1, {'id': 'a'}, [object_id])
+                cache.put(1, object_id, 1, {'id': 'a'}, [object_id])
+        finally:
+            os.listdir = listdir
+        self.assertEqual(listed, [])
+        self.assertEqual(len(_entries(self.directory)), 1)
+        self.assertEqual(cache._total, os.path.getsize(os.path.join(self.directory, _entries(self.directory)[0])))
+
+    def test_eviction_keeps_newest(self):
+        # an entry bigger than the bound is still cached, alone
+        cache = ObjectCache(self.directory, max_bytes=1)
+        cache.put(1, 1, 1, {'id': 'a'}, [1])
+        cache.put(1, 2, 1, {'id': 'b'}, [2])
+        self.assertEqual(len(_entries(self.directory)), 1)
+
+
+class ServiceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.service = toy_models.service(cache_dir=self.directory)
+        self.workspace = self.service.ws_client
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _calls(self, method):
+        return len([c for c in self.workspace.calls if c[0] == method])
+
+    def test_get_object(self):
+        objid, wsid = self.service.save_object({'id': 'model'}, 'KBaseFBA.FBAModel', toy_models.WS_ID, name='model')
+        data, info = self.service.get_object(objid, wsid)
+        self.assertEqual(data, {'id': 'model'})
+        self.assertEqual(self._calls('get_objects2'), 1)
+        # a hit only looks up the current version
+        self.assertEqual(self.service.get_object(objid, wsid), (data, info))
+        self.assertEqual(self.service.get_object(None, wsid, name='model'), (data, info))
+        self.assertEqual(self._calls('get_objects2'), 1)
+        self.assertEqual(self._calls('get_object_info_new'), 3)
+        # a new version is a miss
+        self.service.save_object({'id': 'model 2'}, 'KBaseFBA.FBAModel', toy_models.WS_ID, name='model')
+        self.assertEqual(self.service.get_object(objid, wsid)[0], {'id': 'model 2'})
+        self.assertEqual(self._calls('get_objects2'), 2)
+
+    def test_get_objects(self):
+        saved = [self.service.save_object({'id': str(i)}, 'KBaseFBA.FBAModel', toy_models.WS_ID, name=str(i))
+                 for i in range(3)]
+        self.service.get_object(*saved[1])
+        results = self.service.get_objects(saved)
+        self.assertEqual([r[0] for r in results], [{'id': '0'}, {'id': '1'}, {'id': '2'}])
+        # the cached one isn't downloaded again
+        self.assertEqual(self.workspace.calls[-1], ('get_objects2', 2))
+        self.service.get_objects(saved)
+        self.assertEqual(self.workspace.calls[-1], ('get_object_info_new', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Tests of Pipeline. Run from the repository root:
+
+    python -m unittest discover -s test -p 'pipeline_test.py'
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+from pipeline import Pipeline
+
+# seconds a stage waits for another before the test gives up on it
+TIMEOUT = 5.0
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = list()
+        self._lock = threading.Lock()
+
+    def _record(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def _stage(self, name, work=None):
+        def stage():
+            self._record(('start', name))
+            if work is not None:
+                work()
+            self._record(('end', name))
+        return stage
+
+    def test_order(self):
+        # the prepare_supermodel graph
+        pipeline = Pipeline()
+        pipeline.add('fill_src', self._stage('fill_src'))
+        pipeline.add('translate', self._stage('translate', lambda: time.sleep(0.05)), requires=['fill_src'])
+        pipeline.add('reconstruct', self._stage('reconstruct'))
+        pipeline.add('label', self._stage('label'), requires=['translate', 'reconstruct'])
+        pipeline.add('supermodel', self._stage('supermodel'), requires=['label'])
+        pipeline.run()
+        self.assertEqual(len(self.events), 10)
+        for stage, requires in [('translate', 'fill_src'), ('label', 'translate'), ('label', 'reconstruct'),
+                                ('supermodel', 'label')]:
+            self.assertLess(self.events.index(('end', requires)), self.events.index(('start', stage)))
+
+    def test_concurrent(self):
+        # each of these stages waits for the other to start, so they only finish if they run at once
+        started = dict([(name, threading.Event()) for name in ['a', 'b']])
+
+        def meet(name, other):
+            def work():
+                started[name].set()
+                self.assertTrue(started[other].wait(TIMEOUT))
+            return work
+        pipeline = Pipeline()
+        pipeline.add('a', self._stage('a', meet('a', 'b')))
+        pipeline.add('b', self._stage('b', meet('b', 'a')))
+        pipeline.run()
+        self.assertEqual(set(self.events[:2]), set([('start', 'a'), ('start', 'b')]))
+
+    def test_sequential(self):
+        pipeline = Pipeline()
+        pipeline.add('a', self._stage('a'))
+        pipeline.add('b', self._stage('b'))
+        pipeline.add('c', self._stage('c'), requires=['a'])
+        pipeline.run(processes=1)
+        self.assertEqual(self.events, [('start', 'a'), ('end', 'a'), ('start', 'b'), ('end', 'b'),
+                                       ('start', 'c'), ('end', 'c')])
+
+    def test_error(self):
+        def fail():
+            raise KeyError('translate failed')
+        pipeline = Pipeline()
+        pipeline.add('translate', self._stage('translate', fail))
+        pipeline.add('reconstruct', self._stage('reconstruct', lambda: time.sleep(0.1)))
+        pipeline.add('label', self._stage('label'), requires=['translate', 'reconstruct'])
+        try:
+            pipeline.run()
+            self.fail('the error of translate was not raised')
+        except KeyError as e:
+            self.assertEqual(e.args, ('translate failed',))
+            # with the stage's traceback
+            self.assertIsNotNone(sys.exc_info()[2].tb_next)
+        # the running stage finishes, and the stage that needs the failed one never starts
+        self.assertIn(('end', 'reconstruct'), self.events)
+        self.assertNotIn(('start', 'label'), self.events)
+        self.assertNotIn(('end', 'translate'), self.events)
+
+    def test_first_error(self):
+        def fail(message, delay):
+            def work():
+                time.sleep(delay)
+                raise ValueError(message)
+            return work
+        pipeline = Pipeline()
+        pipeline.add('a', fail('a', 0.0))
+        pipeline.add('b', fail('b', 0.1))
+        self.assertRaisesRegexp(ValueError, '^a$', pipeline.run)
+
+    def test_add(self):
+        pipeline = Pipeline()
+        pipeline.run()
+        pipeline.add('a', self._stage('a'))
+        self.assertRaises(ValueError, pipeline.add, 'a', self._stage('a'))
+        self.assertRaises(ValueError, pipeline.add, 'b', self._stage('b'), requires=['c'])
+        self.assertEqual(pipeline.stages, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
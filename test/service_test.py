@@ -0,0 +1,267 @@
+"""
+Tests of Service on a MemoryWorkspace (see toy_models.py): its batched saves (save_object_later, save_object and close),
+and the StoredObjects it fetches and interns. Run from the repository root:
+
+    python -m unittest discover -s test -p 'service_test.py'
+"""
+import gc
+import threading
+import time
+import unittest
+
+import toy_models
+from objects import FBA, FBAModel, Media, StoredObject
+
+MODEL = 'KBaseFBA.FBAModel'
+# seconds a test waits for a save before giving up on it
+TIMEOUT = 5.0
+
+
+class SaveBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        # long enough that only the tests of save_delay reach it
+        self.service = toy_models.service(save_batch_size=3, save_delay=60)
+        self.workspace = self.service.ws_client
+
+    def tearDown(self):
+        self.service.close()
+
+    def _later(self, name, wsid=toy_models.WS_ID):
+        return self.service.save_object_later({'id': name}, MODEL, wsid, name=name)
+
+    def _saves(self):
+        return [c[1] for c in self.workspace.calls if c[0] == 'save_objects']
+
+    def test_flush(self):
+        futures = [self._later(name) for name in ['a', 'b']]
+        time.sleep(0.05)
+        self.assertEqual(self._saves(), [])
+        self.assertFalse(futures[0].done())
+        self.service.flush_saves()
+        results = [f.result(TIMEOUT) for f in futures]
+        self.assertEqual(self._saves(), [2])
+        self.assertEqual([self.workspace.get_objects2({'objects': [{'objid': r[0], 'workspace': r[1]}]})
+                          ['data'][0]['data'] for r in results], [{'id': 'a'}, {'id': 'b'}])
+
+    def test_batch_size(self):
+        futures = [self._later(name) for name in ['a', 'b', 'c', 'd']]
+        for f in futures[:3]:
+            f.result(TIMEOUT)
+        self.assertEqual(self._saves(), [3])
+        self.assertFalse(futures[3].done())
+        self.service.flush_saves()
+        futures[3].result(TIMEOUT)
+        self.assertEqual(self._saves(), [3, 1])
+
+    def test_save_delay(self):
+        self.service.save_delay = 0.05
+        futures = [self._later(name) for name in ['a', 'b']]
+        for f in futures:
+            f.result(TIMEOUT)
+        self.assertEqual(self._saves(), [2])
+
+    def test_save_object(self):
+        # saved at once, after the saves queued for the workspace
+        futures = [self._later(name) for name in ['a', 'b']]
+        info = self.service.save_object({'id': 'c'}, MODEL, toy_models.WS_ID, name='c')
+        self.assertEqual(self._saves(), [2, 1])
+        self.assertTrue(all([f.done() for f in futures]))
+        self.assertEqual(info, (self.workspace.names[(toy_models.WS_ID, 'c')], toy_models.WS_ID))
+        # with nothing queued, no thread is involved
+        self.service.close()
+        self.service.save_object({'id': 'd'}, MODEL, toy_models.WS_ID, name='d')
+        self.assertEqual(self._saves(), [2, 1, 1])
+        self.assertIsNone(self.service._saver)
+
+    def test_save_object_versions(self):
+        # a queued version of an object is saved before the one save_object saves
+        future = self._later('a')
+        self.service.save_object({'id': 'a2'}, MODEL, toy_models.WS_ID, name='a')
+        objid, wsid = future.result(TIMEOUT)
+        self.assertEqual([v[0] for v in self.workspace.objects[(wsid, objid)]], [{'id': 'a'}, {'id': 'a2'}])
+
+    def test_close(self):
+        futures = [self._later(name) for name in ['a', 'b']]
+        self.service.close()
+        self.assertTrue(all([f.done() for f in futures]))
+        self.assertEqual(self._saves(), [2])
+        self.assertEqual([t for t in threading.enumerate() if t.name == 'save batches'], [])
+        self.assertIsNone(self.service._save_timer)
+        # the service still saves, on a new thread
+        future = self._later('c')
+        self.service.flush_saves()
+        self.assertEqual(future.result(TIMEOUT), (self.workspace.names[(toy_models.WS_ID, 'c')], toy_models.WS_ID))
+        self.assertEqual(self._saves(), [2, 1])
+
+    def test_workspaces(self):
+        futures = [self._later('a', wsid=1), self._later('b', wsid=2), self._later('c', wsid=1)]
+        self.service.flush_saves(wsid=1)
+        futures[0].result(TIMEOUT)
+        self.assertEqual(self._saves(), [2])
+        self.assertFalse(futures[1].done())
+        self.service.flush_saves()
+        self.assertEqual(futures[1].result(TIMEOUT)[1], 2)
+
+    def test_versions(self):
+        # a second version of a queued object starts a new batch, saved after the first
+        futures = [self.service.save_object_later({'id': str(v)}, MODEL, toy_models.WS_ID, name='a')
+                   for v in range(2)]
+        self.service.flush_saves()
+        results = [f.result(TIMEOUT) for f in futures]
+        self.assertEqual(self._saves(), [1, 1])
+        self.assertEqual(results[0], results[1])
+        versions = self.workspace.objects[(toy_models.WS_ID, results[0][0])]
+        self.assertEqual([v[0] for v in versions], [{'id': '0'}, {'id': '1'}])
+
+    def test_failure(self):
+        futures = [self._later(name) for name in ['a', 'b']]
+        self.workspace.fail = True
+        self.service.flush_saves()
+        for f in futures:
+            self.assertRaises(IOError, f.result, TIMEOUT)
+        self.assertRaises(IOError, self.service.save_object, {'id': 'c'}, MODEL, toy_models.WS_ID, name='c')
+        # later saves still go through
+        self.workspace.fail = False
+        self.service.save_object({'id': 'c'}, MODEL, toy_models.WS_ID, name='c')
+        future = self._later('d')
+        self.service.flush_saves()
+        self.assertEqual(future.result(TIMEOUT), (self.workspace.names[(toy_models.WS_ID, 'd')], toy_models.WS_ID))
+        self.assertEqual(self._saves(), [1, 1])
+
+    def test_forget(self):
+        # a saved object's interned instance is dropped, so its new version is read
+        objid, wsid = self.service.save_object({'id': '0'}, MODEL, toy_models.WS_ID, name='a')
+        model = FBAModel(objid, wsid, service=self.service)
+        self.assertEqual(model.data, {'id': '0'})
+        future = self._later('a')
+        self.service.flush_saves()
+        future.result(TIMEOUT)
+        self.assertEqual(FBAModel(objid, wsid, service=self.service).data, {'id': 'a'})
+
+    def test_remove_reactions_later(self):
+        morph = toy_models.stored_morph(self.service)
+        future = self.service.remove_reactions_later(morph.model, ['rxn00002_c0', 'rxn00005_c0'], 'candidate')
+        self.service.flush_saves()
+        objid, wsid = future.result(TIMEOUT)
+        candidate = FBAModel(objid, wsid, service=self.service)
+        self.assertEqual([r['id'] for r in candidate.data['modelreactions']],
+                         ['rxn00001_c0', 'rxn00003_c0', 'rxn00004_c0'])
+        self.assertEqual(len(morph.model.data['modelreactions']), 5)
+
+
+class StoredObjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = toy_models.service()
+        self.workspace = self.service.ws_client
+
+    def tearDown(self):
+        self.service.close()
+
+    def _save(self, data, name, typestr=MODEL):
+        # saved through the service only, so that no instance is interned with the data
+        return self.service.save_object(data, typestr, toy_models.WS_ID, name=name)
+
+    def _calls(self, method):
+        return [c[1] for c in self.workspace.calls if c[0] == method]
+
+    def test_stoichiometry(self):
+        model = FBAModel(*self._save(toy_models.toy_model_data(), 'model'), service=self.service)
+        stoichiometry = model.stoichiometry()
+        self.assertIs(model.stoichiometry(), stoichiometry)
+        self.assertIn('rxn00005_c0', stoichiometry.reactions)
+        # a new version of the model is built from its own data
+        self.service.remove_reactions_in_place(model, ['rxn00005_c0'])
+        saved = FBAModel(model.object_id, model.workspace_id, service=self.service)
+        self.assertEqual(saved.stoichiometry().reactions,
+                         ['rxn00001_c0', 'rxn00002_c0', 'rxn00003_c0', 'rxn00004_c0', 'bio1'])
+        without = toy_models.model(self.service.without_reactions(saved, ['rxn00001_c0']), object_id=99)
+        self.assertEqual(without.stoichiometry().reactions, ['rxn00002_c0', 'rxn00003_c0', 'rxn00004_c0', 'bio1'])
+        # as is a version fetched again
+        self._save(toy_models.toy_model_data(), 'model')
+        saved.get_object()
+        self.assertIn('rxn00005_c0', saved.stoichiometry().reactions)
+        # and data edited in place, once invalidated
+        del saved.data['modelreactions'][4]
+        saved.invalidate_stoichiometry()
+        self.assertNotIn('rxn00005_c0', saved.stoichiometry().reactions)
+
+    def test_interned(self):
+        objid, wsid = self._save(toy_models.toy_model_data(), 'model')
+        model = FBAModel(objid, wsid, service=self.service)
+        self.assertIs(self.service.interned(FBAModel, objid, wsid), model)
+        self.assertIs(FBAModel(str(objid), wsid, service=self.service), model)
+        model.data
+        self.assertEqual(FBAModel(objid, wsid, service=self.service).data, toy_models.toy_model_data())
+        self.assertEqual(self._calls('get_objects2'), [1])
+        # interned per class, and not without a service
+        self.assertIsNot(Media(objid, wsid, service=self.service), model)
+        self.assertIsNot(FBAModel(objid, wsid), model)
+        # saving over the object forgets it, leaving the old instance its data
+        self._save({'modelreactions': []}, 'model')
+        self.assertIsNone(self.service.interned(FBAModel, objid, wsid))
+        self.assertIsNot(FBAModel(objid, wsid, service=self.service), model)
+        self.assertEqual(len(model.data['modelreactions']), 5)
+        # and instances no longer referenced are dropped
+        model = FBAModel(objid, wsid, service=self.service)
+        self.service.forget(objid, wsid)
+        self.assertIsNone(self.service.interned(FBAModel, objid, wsid))
+        self.service.intern(model)
+        del model
+        gc.collect()
+        self.assertIsNone(self.service.interned(FBAModel, objid, wsid))
+
+    def test_info(self):
+        # the name and version are read from the object's info, without its data
+        objid, wsid = self._save(toy_models.toy_model_data(), 'model')
+        model = FBAModel(objid, wsid, service=self.service)
+        self.assertEqual(model.name, 'model')
+        self.assertEqual(model.reference()['version'], 1)
+        self.assertEqual(self._calls('get_objects2'), [])
+        self.assertEqual(self._calls('get_object_info_new'), [1])
+        # the version stays that of the loaded data
+        model.data
+        self._save(toy_models.toy_model_data(), 'model')
+        self.assertEqual(model.get_info()[4], 2)
+        self.assertEqual(model.reference()['version'], 1)
+
+    def test_prefetch(self):
+        models = [FBAModel(*self._save({'id': str(i)}, str(i)), service=self.service) for i in range(3)]
+        StoredObject.prefetch(models + [None])
+        self.assertEqual(self._calls('get_objects2'), [3])
+        self.assertEqual([(m.data, m.name, m.reference()['version']) for m in models],
+                         [({'id': str(i)}, str(i), 1) for i in range(3)])
+        # loaded objects aren't fetched again
+        StoredObject.prefetch(models)
+        self.assertEqual(self._calls('get_objects2'), [3])
+        self.assertEqual(self._calls('get_object_info_new'), [])
+        self.assertEqual(self.service.get_objects([]), [])
+
+    def test_included(self):
+        variables = [{'modelreaction_ref': '~/modelreactions/id/rxn0000%d_c0' % i, 'value': float(i), 'min': 0.0,
+                      'max': 10.0, 'class': 'Variable'} for i in range(1, 3)]
+        objid, wsid = self._save({'objectiveValue': 10.0, 'FBAReactionVariables': variables,
+                                  'FBACompoundVariables': [{'modelcompound_ref': 'cpd00027_e0', 'value': -10.0}]},
+                                 'fba', typestr='KBaseFBA.FBA')
+        fba = FBA(objid, wsid, service=self.service)
+        # only the paths of the projection are fetched
+        self.assertEqual(fba.objective, 10.0)
+        self.assertEqual(fba.get_subset(FBA.objective_only), {'objectiveValue': 10.0})
+        self.assertEqual(fba.reaction_fluxes(), {'rxn00001_c0': 1.0, 'rxn00002_c0': 2.0})
+        self.assertEqual(fba.get_subset(FBA.fluxes_only),
+                         {'FBAReactionVariables': [{'modelreaction_ref': v['modelreaction_ref'], 'value': v['value']}
+                                                   for v in variables]})
+        self.assertEqual(self._calls('get_objects2'), [1, 1])
+        self.assertIsNone(fba._data)
+        model = FBAModel(*self._save(toy_models.toy_model_data(), 'model'), service=self.service)
+        self.assertEqual([r.rxn_id() for r in model.get_reactions()],
+                         [r['id'] for r in toy_models.toy_model_data()['modelreactions']])
+        self.assertEqual(model.get_subset(FBAModel.reactions_only).keys(), ['modelreactions'])
+        # the loaded data serves every projection
+        self.assertEqual(len(model.data['modelcompounds']), 6)
+        self.assertIs(model.get_subset(FBAModel.reactions_only), model.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Small FBAModel and Media data for the unit tests, loaded straight into objects or saved through a Service.
+
+The toy model takes up glucose (cpd00027) and makes ATP (cpd00002), which its biomass consumes:
+
+    rxn00001_c0  glucose[e0] -> glucose[c0]          (g1)
+    rxn00002_c0  glucose[c0] -> ATP[c0]              (g2 and g3)
+    rxn00003_c0  glucose[c0] -> NAD[c0]              (no genes)
+    rxn00004_c0  NAD[c0] <=> ATP[c0]                 (g4)
+    rxn00005_c0  phosphate[c0] -> ATP[c0]            (g5, blocked: nothing makes phosphate)
+
+On toy_media, which lets 10 glucose in, the biomass flux is 10.
+
+MemoryWorkspace stands in for the workspace service, so that a Service (see service()) can save and fetch objects,
+whole or projected onto included paths.
+"""
+import copy
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'mightymorphingmodels'))
+from objects import FBAModel, Media
+from morph import Morph
+from service import Service
+
+TOY_OBJECTIVE = 10.0
+WS_ID = 1
+
+
+def _reagent(compound, coefficient):
+    return {'modelcompound_ref': '~/modelcompounds/id/' + compound, 'coefficient': coefficient}
+
+
+def _reaction(rxn_id, direction, reagents, proteins=None):
+    # proteins: list of proteins, each a list of subunits, each a list of feature ids
+    proteins = [{'note': '', 'modelReactionProteinSubunits': [
+        {'feature_refs': ['~/genome/features/id/' + f for f in sub]} for sub in protein]} for protein in proteins or []]
+    return {'id': rxn_id, 'direction': direction, 'reaction_ref': '489/6/6/reactions/id/' + rxn_id.split('_')[0],
+            'modelcompartment_ref': '~/modelcompartments/id/c0',
+            'modelReactionReagents': [_reagent(c, k) for c, k in reagents], 'modelReactionProteins': proteins}
+
+
+def toy_model_data():
+    compounds = ['cpd00027_e0', 'cpd00027_c0', 'cpd00002_c0', 'cpd00003_c0', 'cpd11416_c0', 'cpd00009_c0']
+    return {'modelcompounds': [{'id': c} for c in compounds],
+            'modelreactions': [
+                _reaction('rxn00001_c0', '>', [('cpd00027_e0', -1), ('cpd00027_c0', 1)], [[['g1']]]),
+                _reaction('rxn00002_c0', '>', [('cpd00027_c0', -1), ('cpd00002_c0', 1)], [[['g2'], ['g3']]]),
+                _reaction('rxn00003_c0', '>', [('cpd00027_c0', -1), ('cpd00003_c0', 1)]),
+                _reaction('rxn00004_c0', '=', [('cpd00003_c0', -1), ('cpd00002_c0', 1)], [[['g4']]]),
+                _reaction('rxn00005_c0', '>', [('cpd00009_c0', -1), ('cpd00002_c0', 1)], [[['g5']]]),
+            ],
+            'biomasses': [{'id': 'bio1', 'biomasscompounds': [_reagent('cpd00002_c0', -1),
+                                                               _reagent('cpd11416_c0', 1)]}]}
+
+
+def toy_media_data():
+    return {'mediacompounds': [{'compound_ref': '489/6/6/compounds/id/cpd00027', 'minFlux': -100, 'maxFlux': 10}]}
+
+
+def random_model_data(seed, compounds=30, reactions=120):
+    """
+    returns a model of random one to one reactions among compounds, fed by cpd00000 (see random_media_data)
+    """
+    rand = random.Random(seed)
+    cpds = ['cpd%05d_c0' % i for i in range(1, compounds)]
+    rxns = [_reaction('rxn00001_c0', '>', [('cpd00000_e0', -1), ('cpd00001_c0', 1)])]
+    for k in range(2, reactions):
+        a, b = rand.sample(cpds, 2)
+        proteins = [[['g%d' % k]]] if rand.random() < 0.5 else None
+        rxns.append(_reaction('rxn%05d_c0' % k, rand.choice(['>', '>', '=']), [(a, -1), (b, 1)], proteins))
+    biomass = [_reagent(c, -1) for c in rand.sample(cpds, 4)] + [_reagent('cpd11416_c0', 1)]
+    return {'modelcompounds': [{'id': c} for c in cpds + ['cpd00000_e0', 'cpd11416_c0']], 'modelreactions': rxns,
+            'biomasses': [{'id': 'bio1', 'biomasscompounds': biomass}]}
+
+
+def random_media_data():
+    return {'mediacompounds': [{'compound_ref': '489/6/6/compounds/id/cpd00000', 'minFlux': -100, 'maxFlux': 10}]}
+
+
+def model(data, object_id=1):
+    """
+    returns an FBAModel with data, without a service
+    """
+    fba_model = FBAModel(object_id, WS_ID)
+    fba_model._data = data
+    return fba_model
+
+
+def media(data, object_id=2):
+    """
+    returns a Media with data, without a service
+    """
+    fba_media = Media(object_id, WS_ID)
+    fba_media._data = data
+    return fba_media
+
+
+def morph(model_data=None, media_data=None):
+    """
+    returns a Morph of a model and media (default the toy ones), without a service
+    """
+    return Morph(model=model(model_data or toy_model_data()), media=media(media_data or toy_media_data()),
+                 ws_id=WS_ID)
+
+
+def _project(data, path):
+    # the part of data at a path, e.g. ['modelreactions', '[*]', 'id'], as the workspace's included paths select it
+    if len(path) == 0:
+        return copy.deepcopy(data)
+    if path[0] == '[*]':
+        return [_project(item, path[1:]) for item in data]
+    if path[0] not in data:
+        return {}
+    return {path[0]: _project(data[path[0]], path[1:])}
+
+
+def _merge(a, b):
+    # the union of two projections of an object
+    if isinstance(a, dict) and isinstance(b, dict):
+        merged = dict(a)
+        for key in b:
+            merged[key] = _merge(a[key], b[key]) if key in a else b[key]
+        return merged
+    if isinstance(a, list) and isinstance(b, list):
+        return [_merge(x, y) for x, y in zip(a, b)]
+    return b
+
+
+class MemoryWorkspace(object):
+    """
+    the workspace calls Service makes, on objects kept in memory. calls lists the (method, number of objects) of each
+    call, and fail makes calls raise
+    """
+
+    def __init__(self):
+        self.objects = dict()  # (wsid, objid) -> list of (data, info), one per version
+        self.names = dict()  # (wsid, name) -> objid
+        self.calls = list()
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def _call(self, method, objects):
+        if self.fail:
+            raise IOError('workspace ' + method + ' failed')
+        with self._lock:
+            self.calls.append((method, len(objects)))
+
+    def _objid(self, spec):
+        if 'ref' in spec:
+            return tuple([int(i) for i in spec['ref'].split('/')])
+        if spec.get('objid') is not None:
+            return spec['workspace'], int(spec['objid'])
+        return spec['workspace'], self.names[(spec['workspace'], spec['name'])]
+
+    def _version(self, spec):
+        key = self._objid(spec)
+        versions = self.objects[key[:2]]
+        return versions[key[2] - 1] if len(key) > 2 else versions[-1]
+
+    def save_objects(self, params):
+        self._call('save_objects', params['objects'])
+        infos = list()
+        with self._lock:
+            wsid = params['workspace']
+            for sv in params['objects']:
+                objid = sv.get('objid')
+                if objid is None:
+                    objid = self.names.get((wsid, sv.get('name')), len(self.objects) + 1)
+                versions = self.objects.setdefault((wsid, objid), [])
+                name = sv.get('name') or str(objid)
+                info = [objid, name, sv['type'], '', len(versions) + 1, 'user', wsid, wsid, '', 0, {}]
+                versions.append((copy.deepcopy(sv['data']), info))
+                self.names[(wsid, name)] = objid
+                infos.append(list(info))
+        return infos
+
+    def get_objects2(self, params):
+        self._call('get_objects2', params['objects'])
+        objects = list()
+        for spec in params['objects']:
+            data, info = self._version(spec)
+            if 'included' in spec:
+                data = reduce(_merge, [_project(data, path.split('/')) for path in spec['included']], {})
+            else:
+                data = copy.deepcopy(data)
+            objects.append({'data': data, 'info': list(info)})
+        return {'data': objects}
+
+    def get_object_info_new(self, params):
+        self._call('get_object_info_new', params['objects'])
+        return [list(self._version(spec)[1]) for spec in params['objects']]
+
+
+def service(**kwargs):
+    """
+    returns a Service on a MemoryWorkspace (service.ws_client), with no FBA service. kwargs are passed to Service
+    """
+    memory_service = Service('http://localhost/fba', 'http://localhost/ws', {'token': None}, **kwargs)
+    memory_service.ws_client = MemoryWorkspace()
+    return memory_service
+
+
+def stored_morph(memory_service, model_data=None, media_data=None):
+    """
+    returns a Morph of a model and media (default the toy ones) saved in memory_service
+    """
+    saved_model = FBAModel.save(model_data or toy_model_data(), WS_ID, memory_service, name='model')
+    saved_media = Media.save(media_data or toy_media_data(), WS_ID, memory_service, name='media')
+    return Morph(model=saved_model, media=saved_media, ws_id=WS_ID, service=memory_service)